@@ -0,0 +1,173 @@
+# benchmarks/carga_http.py
+"""
+Carga HTTP contra a interface web: servidor de desenvolvimento vs. modo de produção.
+
+Para cada modo, arranca o app num processo à parte (para os clientes não
+disputarem o GIL com o servidor) com um inventário sintético num SQLite
+temporário e dispara pedidos de N clientes em paralelo às rotas mais usadas
+pelas estações de operação. No fim mostra pedidos/s e latência p50/p95/p99.
+
+- desenvolvimento: o que run.py usa hoje (servidor do Werkzeug com debug=True)
+- producao: o que run_producao.py usa (waitress multi-thread)
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.carga_http --clientes 32 --requisicoes 3000 --clps 5000
+    python -m benchmarks.carga_http --modo producao --threads 16 --escritas 0.05
+
+Com --escritas > 0, essa fração dos pedidos acrescenta uma porta a um CLP
+(POST /clp/<ip>/add_port), exercitando as gravações concorrentes. O histórico
+desses CLPs é gravado no logs/historico.db do projeto.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MODOS = ("desenvolvimento", "producao")
+PORTA_BASE = 5080
+ROTAS_LEITURA = (
+    "/",
+    "/api/clps?per_page=100",
+    "/api/clps?tag=linha{linha}&page=2",
+    "/clp/{ip}/info",
+    "/clp/scanner/status",
+)
+
+
+def _ip(i: int) -> str:
+    return f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"
+
+
+# --- Processo servidor ---
+
+def _servir(modo: str, porta: int, clps: int, threads: int):
+    """Corre no processo filho: inventário sintético num SQLite temporário e o servidor do modo pedido."""
+    from utils import CLP as clp_manager
+    from utils.armazenamento import ArmazenamentoSQLite
+
+    diretorio = tempfile.mkdtemp(prefix="carga_http_")
+    clp_manager.configurar_armazenamento(ArmazenamentoSQLite(os.path.join(diretorio, "clps.db")))
+    clp_manager.importar_clps(
+        (i, {"IP": _ip(i), "PORTAS": [502], "tags": [f"linha{i % 20}"], "nome": f"CLP linha {i % 20} n{i}"})
+        for i in range(clps))
+
+    from clp_app.server import server
+    if modo == "producao":
+        server.iniciar_producao(host="127.0.0.1", porta=porta, threads=threads)
+    else:
+        # Equivalente a server.iniciar_web(), noutra porta
+        server.app.run(host="127.0.0.1", port=porta, debug=True, use_reloader=False)
+
+
+def _aguardar_porta(porta: int, timeout: float = 60.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(("127.0.0.1", porta), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"O servidor não abriu a porta {porta} em {timeout:.0f}s")
+
+
+# --- Clientes ---
+
+def _pedido(porta: int, clps: int, escritas: float, gerador: random.Random):
+    """Um pedido numa ligação nova (o servidor de desenvolvimento fecha-a a cada resposta)."""
+    i = gerador.randrange(clps)
+    conexao = http.client.HTTPConnection("127.0.0.1", porta, timeout=30)
+    inicio = time.perf_counter()
+    try:
+        if gerador.random() < escritas:
+            corpo = json.dumps({"porta": gerador.randrange(1, 65536)})
+            conexao.request("POST", f"/clp/{_ip(i)}/add_port", body=corpo,
+                            headers={"Content-Type": "application/json"})
+        else:
+            rota = gerador.choice(ROTAS_LEITURA).format(ip=_ip(i), linha=i % 20)
+            conexao.request("GET", rota)
+        resposta = conexao.getresponse()
+        resposta.read()
+        return time.perf_counter() - inicio, resposta.status < 500
+    except OSError:
+        return time.perf_counter() - inicio, False
+    finally:
+        conexao.close()
+
+
+def _percentil(ordenados: list, fracao: float) -> float:
+    return ordenados[min(len(ordenados) - 1, int(fracao * len(ordenados)))]
+
+
+def _carga(porta: int, clientes: int, requisicoes: int, clps: int, escritas: float) -> dict:
+    por_cliente = max(1, requisicoes // clientes)
+
+    def cliente(semente):
+        gerador = random.Random(semente)
+        return [_pedido(porta, clps, escritas, gerador) for _ in range(por_cliente)]
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clientes) as executor:
+        resultados = [r for lote in executor.map(cliente, range(clientes)) for r in lote]
+    duracao = time.perf_counter() - inicio
+
+    latencias = sorted(r[0] for r in resultados)
+    return {
+        "pedidos": len(resultados),
+        "erros": sum(1 for r in resultados if not r[1]),
+        "pedidos_s": len(resultados) / duracao,
+        "p50_ms": _percentil(latencias, 0.50) * 1000,
+        "p95_ms": _percentil(latencias, 0.95) * 1000,
+        "p99_ms": _percentil(latencias, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modo", choices=MODOS + ("ambos",), default="ambos")
+    parser.add_argument("--clientes", type=int, default=32, help="Clientes a fazer pedidos em paralelo")
+    parser.add_argument("--requisicoes", type=int, default=3000, help="Total de pedidos por modo")
+    parser.add_argument("--clps", type=int, default=5000, help="CLPs no inventário sintético")
+    parser.add_argument("--threads", type=int, default=None, help="Threads do waitress (padrão: WSGI_THREADS)")
+    parser.add_argument("--escritas", type=float, default=0.0, help="Fração de pedidos que gravam (add_port)")
+    parser.add_argument("--aquecimento", type=int, default=100, help="Pedidos descartados antes de medir")
+    parser.add_argument("--servir", choices=MODOS, help=argparse.SUPPRESS)
+    parser.add_argument("--porta", type=int, default=PORTA_BASE, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        from clp_app.server import server
+        _servir(args.servir, args.porta, args.clps, args.threads or server.WSGI_THREADS)
+        return
+
+    modos = MODOS if args.modo == "ambos" else (args.modo,)
+    resultados = {}
+    for deslocamento, modo in enumerate(modos):
+        porta = PORTA_BASE + deslocamento
+        comando = [sys.executable, "-m", "benchmarks.carga_http", "--servir", modo, "--porta", str(porta),
+                   "--clps", str(args.clps)]
+        if args.threads:
+            comando += ["--threads", str(args.threads)]
+        servidor = subprocess.Popen(comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _aguardar_porta(porta)
+            _carga(porta, min(args.clientes, args.aquecimento), args.aquecimento, args.clps, 0.0)
+            resultados[modo] = _carga(porta, args.clientes, args.requisicoes, args.clps, args.escritas)
+        finally:
+            servidor.terminate()
+            servidor.wait(10)
+
+    print(f"{args.clientes} clientes, {args.clps} CLPs, {args.escritas:.0%} escritas\n")
+    for modo, r in resultados.items():
+        print(f"{modo:>15}: {r['pedidos']} pedidos, {r['erros']} erros, {r['pedidos_s']:.0f} pedidos/s, "
+              f"p50={r['p50_ms']:.1f} ms p95={r['p95_ms']:.1f} ms p99={r['p99_ms']:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
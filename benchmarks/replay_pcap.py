@@ -0,0 +1,51 @@
+# benchmarks/replay_pcap.py
+"""
+Reproduz uma captura (.pcap ou diretório de pcaps) pelo pipeline do coletor e
+imprime pacotes/s, IPs únicos/s, descartes da fila e latência de descoberta.
+Serve para dimensionar QUEUE_MAXSIZE e WORKER_THREADS a partir de capturas reais.
+
+O inventário e o histórico são gravados num diretório temporário, sem tocar em logs/.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.replay_pcap captura.pcap --velocidade 0 --scan simulado --atraso 0.2
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from clp_app.scanner import rede, replay
+from utils import CLP as clp_manager, historico
+from utils.armazenamento import ArmazenamentoSQLite
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pcap", help="arquivo .pcap ou diretório com pcaps")
+    parser.add_argument("--velocidade", type=float, default=0.0,
+                        help="1 = tempo gravado, N = N vezes mais rápido, 0 = o mais rápido possível")
+    parser.add_argument("--scan", default="simulado", help="simulado, nmap ou async")
+    parser.add_argument("--atraso", type=float, default=0.1, help="segundos por lote no scan simulado")
+    parser.add_argument("--workers", type=int, default=rede.WORKER_THREADS)
+    parser.add_argument("--fila", type=int, default=rede.QUEUE_MAXSIZE, help="tamanho máximo da fila de IPs")
+    parser.add_argument("--captura", choices=("scapy", "raw"), default=rede.CAPTURA_BACKEND,
+                        help="caminho de análise dos frames")
+    args = parser.parse_args()
+
+    rede.WORKER_THREADS = args.workers
+    rede._fila_ips.capacidade = args.fila
+    rede.CAPTURA_BACKEND = args.captura
+    rede.IGNORE_LOCAL = False
+
+    scan = replay.scan_simulado(atraso=args.atraso) if args.scan == "simulado" else args.scan
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clp_manager.configurar_armazenamento(ArmazenamentoSQLite(os.path.join(tmp, "clps.db")))
+        historico.configurar(historico.HistoricoSQLite(os.path.join(tmp, "historico.db")))
+        relatorio = rede.executar_replay(args.pcap, velocidade=args.velocidade or None, scan=scan)
+
+    print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
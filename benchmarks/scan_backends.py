@@ -0,0 +1,73 @@
+# benchmarks/scan_backends.py
+"""
+Compara o motor async (varredura_async) com o caminho do nmap usando
+listeners TCP locais, sem precisar de rede real nem de root.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.scan_backends --hosts 20 --portas 200 --abertas 5
+"""
+import argparse
+import random
+import shutil
+import socket
+import time
+
+from clp_app.scanner import portas
+
+
+def _abrir_listeners(ips, quantidade):
+    """Abre `quantidade` portas em escuta em cada IP de loopback. Retorna (sockets, {ip: [portas]})."""
+    sockets, esperado = [], {}
+    for ip in ips:
+        esperado[ip] = []
+        for _ in range(quantidade):
+            s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            s.bind((ip, 0))
+            s.listen(128)
+            sockets.append(s)
+            esperado[ip].append(s.getsockname()[1])
+    return sockets, esperado
+
+
+def _medir(backend, ips, lista_portas, repeticoes):
+    tempos, resultado = [], {}
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = portas.escanear_portas_lote(ips, portas_alvo=lista_portas, backend=backend)
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos), resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hosts", type=int, default=20, help="IPs de loopback (127.0.0.x) a escanear")
+    parser.add_argument("--portas", type=int, default=200, help="portas fechadas extra por host")
+    parser.add_argument("--abertas", type=int, default=5, help="listeners abertos por host")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    args = parser.parse_args()
+
+    ips = [f"127.0.0.{i}" for i in range(1, args.hosts + 1)]
+    sockets, esperado = _abrir_listeners(ips, args.abertas)
+    try:
+        abertas = sorted({p for lista in esperado.values() for p in lista})
+        fechadas = random.sample([p for p in range(20000, 30000) if p not in abertas], args.portas)
+        lista_portas = sorted(abertas + fechadas)
+        pares = len(ips) * len(lista_portas)
+        print(f"{len(ips)} hosts x {len(lista_portas)} portas = {pares} pares (ip, porta)")
+
+        backends = ["async"] + (["nmap"] if shutil.which("nmap") else [])
+        if "nmap" not in backends:
+            print("nmap não encontrado no PATH: apenas o backend async será medido.")
+
+        for backend in backends:
+            tempo, resultado = _medir(backend, ips, lista_portas, args.repeticoes)
+            corretos = all(set(esperado[ip]) <= set(resultado.get(ip, [])) for ip in ips)
+            print(f"{backend:>6}: {tempo:8.3f} s  ({pares / tempo:10.0f} pares/s)  resultado correto: {corretos}")
+    finally:
+        for s in sockets:
+            s.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# benchmarks/sniffer_fastpath.py
+"""
+Pacotes/s do callback do sniffer: dissecação Scapy (Ether(frame) + _analisar_pacote)
+contra o caminho rápido (captura_rapida.extrair_candidato + _enfileirar_ip).
+
+Os frames (ARP e TCP SYN) são gerados em memória; não precisa de root nem de rede.
+
+Uso (a partir da raiz do projeto):
+    python -m benchmarks.sniffer_fastpath --pacotes 200000 --ips 5000
+"""
+import argparse
+import socket
+import struct
+import time
+
+from clp_app.scanner import captura_rapida
+
+try:
+    from clp_app.scanner import rede
+except ImportError as e:  # Scapy ausente: mede apenas o parser
+    rede = None
+    _ERRO_IMPORT = e
+
+
+def _frame_syn(ip_src: str) -> bytes:
+    eth = b"\xff" * 6 + b"\x00\x11\x22\x33\x44\x55" + struct.pack("!H", 0x0800)
+    ip = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 40, 1, 0, 64, 6, 0,
+                     socket.inet_aton(ip_src), socket.inet_aton("10.0.0.1"))
+    tcp = struct.pack("!HHIIBBHHH", 40000, 502, 1, 0, 0x50, 0x02, 1024, 0, 0)
+    return eth + ip + tcp
+
+
+def _frame_arp(ip_src: str) -> bytes:
+    eth = b"\xff" * 6 + b"\x00\x11\x22\x33\x44\x55" + struct.pack("!H", 0x0806)
+    arp = struct.pack("!HHBBH6s4s6s4s", 1, 0x0800, 6, 4, 1, b"\x00\x11\x22\x33\x44\x55",
+                      socket.inet_aton(ip_src), b"\x00" * 6, socket.inet_aton("10.0.0.1"))
+    return eth + arp
+
+
+def _gerar_frames(quantidade: int, ips_distintos: int) -> list[bytes]:
+    frames = []
+    for i in range(quantidade):
+        ip = f"10.{(i % ips_distintos) // 65536 % 256}.{(i % ips_distintos) // 256 % 256}.{i % ips_distintos % 256}"
+        frames.append(_frame_syn(ip) if i % 2 else _frame_arp(ip))
+    return frames
+
+
+def _reiniciar_estado():
+    rede._cache_ips.limpar()
+    rede._fila_ips.limpar()
+
+
+def _medir(nome, funcao, frames):
+    inicio = time.perf_counter()
+    for frame in frames:
+        funcao(frame)
+    duracao = time.perf_counter() - inicio
+    print(f"{nome:>28}: {len(frames) / duracao:12.0f} pacotes/s ({duracao:.3f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pacotes", type=int, default=200000)
+    parser.add_argument("--ips", type=int, default=5000, help="IPs de origem distintos")
+    args = parser.parse_args()
+
+    frames = _gerar_frames(args.pacotes, args.ips)
+
+    if rede is None:
+        print(f"Não foi possível importar o coletor ({_ERRO_IMPORT}); medindo só o parser.")
+        _medir("parser por offsets", captura_rapida.extrair_candidato, frames)
+        return
+
+    from scapy.all import Ether
+
+    def caminho_rapido(frame):
+        candidato = captura_rapida.extrair_candidato(frame)
+        if candidato is not None:
+            rede._enfileirar_ip(*candidato)
+
+    def caminho_scapy(frame):
+        rede._analisar_pacote(Ether(frame))
+
+    _reiniciar_estado()
+    _medir("scapy (Ether + callback)", caminho_scapy, frames)
+    _reiniciar_estado()
+    _medir("rápido (offsets + fila)", caminho_rapido, frames)
+    _reiniciar_estado()
+
+
+if __name__ == "__main__":
+    main()
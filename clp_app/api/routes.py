@@ -1,12 +1,14 @@
 # clp_app/api/routes.py
 from flask import Blueprint, jsonify, request, redirect, url_for
 import logging
+import time
 
 # NOVO: Imports atualizados para a abordagem funcional
-from utils import CLP as clp_manager, clp_functions
+from utils import CLP as clp_manager, clp_functions, historico, modbus_lote, modbus_pool, series
 from threading import Thread
 from clp_app.scanner.service import scanner_service
-from utils.log import caminho_coleta, caminho_app
+from clp_app.polling.service import polling_service
+from utils.log import caminho_coleta, caminho_app, limpar_logs as limpar_arquivo_log
 
 def _run_in_thread(target, *args, **kwargs):
     """Executa target(...) em uma Thread daemon e retorna o objeto Thread."""
@@ -34,10 +36,11 @@ def clp_connect(ip):
             clp_functions.conectar(clp_dict, port=porta_selecionada)
             clp_functions.adicionar_log(clp_dict, f"Estado após tentar conectar: {clp_dict.get('conectado')}")
             # Salva o estado atualizado no arquivo JSON
-            clp_manager.salvar_clps()
+            clp_manager.salvar_clps(clp_dict)
         except Exception as e:
             clp_functions.adicionar_log(clp_dict, f"Erro durante conectar: {e}")
-            clp_manager.salvar_clps()
+            clp_manager.salvar_clps(clp_dict)
+        clp_manager.notificar_clp(clp_dict)
 
     _run_in_thread(job)
     return jsonify({"ok": True, "messageCLP": "Conexão iniciada em background"})
@@ -54,14 +57,10 @@ def add_tag(ip):
     if not new_tag:
         return jsonify({"success": False, "message": "A tag não pode estar vazia"}), 400
 
-    # Garante que a lista de tags existe
-    if 'tags' not in clp_dict:
-        clp_dict['tags'] = []
-
-    # Adiciona a tag apenas se ela ainda não existir
-    if new_tag not in clp_dict['tags']:
-        clp_dict['tags'].append(new_tag)
-        clp_manager.salvar_clps()
+    # Adiciona a tag apenas se ela ainda não existir (verificação e acréscimo sob o lock das listas)
+    if clp_functions.adicionar_tag(clp_dict, new_tag):
+        clp_manager.salvar_clps(clp_dict)
+        clp_manager.notificar_clp(clp_dict)
         return jsonify({"success": True, "message": "Tag adicionada com sucesso", "tags": clp_dict['tags']})
     else:
         return jsonify({"success": False, "message": "Esta tag já existe", "tags": clp_dict['tags']})
@@ -74,7 +73,8 @@ def clp_disconnect(ip):
 
     try:
         clp_functions.desconectar(clp_dict)
-        clp_manager.salvar_clps()
+        clp_manager.salvar_clps(clp_dict)
+        clp_manager.notificar_clp(clp_dict)
         # Usa get_info para obter o status atualizado
         status_info = clp_functions.get_info(clp_dict)["status"]
         return jsonify({"ok": True, "message": "Desconectado", "status": status_info})
@@ -82,6 +82,19 @@ def clp_disconnect(ip):
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
+@clp_bp.route("/<ip>", methods=["DELETE"])
+def clp_remover(ip):
+    clp_dict = clp_manager.buscar_por_ip(ip)
+    if not clp_dict:
+        return jsonify({"ok": False, "error": "CLP não encontrado"}), 404
+
+    polling_service.atualizar_grupo(ip, None)
+    if clp_dict.get("conectado"):
+        clp_functions.desconectar(clp_dict)
+    clp_manager.remover_clp(ip)
+    return jsonify({"ok": True})
+
+
 @clp_bp.route("/<ip>/info", methods=["GET"])
 def clp_info(ip):
     clp_dict = clp_manager.buscar_por_ip(ip)
@@ -90,6 +103,18 @@ def clp_info(ip):
     return jsonify({"ok": True, "clp": clp_functions.get_info(clp_dict)})
 
 
+@clp_bp.route("/<ip>/logs", methods=["GET"])
+def clp_logs(ip):
+    """Histórico paginado do CLP: ?before=<id>&limit=<n>, do mais recente para o mais antigo."""
+    if not clp_manager.buscar_por_ip(ip):
+        return jsonify({"ok": False, "error": "CLP não encontrado"}), 404
+
+    antes = request.args.get("before", type=int)
+    limite = request.args.get("limit", historico.LIMITE_PAGINA_PADRAO, type=int)
+    entradas, proximo = historico.listar(ip, antes=antes, limite=limite)
+    return jsonify({"ok": True, "logs": entradas, "before": proximo})
+
+
 @clp_bp.route("/<ip>/add_port", methods=["POST"])
 def clp_add_port(ip):
     clp_dict = clp_manager.buscar_por_ip(ip)
@@ -103,7 +128,8 @@ def clp_add_port(ip):
 
     try:
         clp_functions.adicionar_porta(clp_dict, int(porta))
-        clp_manager.salvar_clps()
+        clp_manager.salvar_clps(clp_dict)
+        clp_manager.notificar_clp(clp_dict)
         return jsonify({"ok": True, "message": "Porta adicionada", "portas": clp_dict["PORTAS"]})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
@@ -112,10 +138,8 @@ def clp_add_port(ip):
 @clp_bp.route("/<ip>/read_register", methods=["POST"])
 def clp_read_register(ip):
     clp_dict = clp_manager.buscar_por_ip(ip)
-    # Obtém o cliente de conexão a partir do módulo de funções
-    client = clp_functions.get_client(ip)
 
-    if not clp_dict or not client or not client.is_socket_open():
+    if not clp_dict or not modbus_pool.pool.conectado(ip):
         return jsonify({"ok": False, "error": "CLP não conectado"}), 400
 
     data = request.json
@@ -125,8 +149,9 @@ def clp_read_register(ip):
 
     try:
         address = int(address)
-        # unit=1 é o ID do escravo Modbus, padrão para muitas aplicações
-        result = client.read_holding_registers(address, 1, unit=1)
+        # slave=1 é o ID do escravo Modbus, padrão para muitas aplicações (pymodbus 3.x, como em utils/modbus_lote)
+        result = clp_functions.executar_modbus(
+            ip, lambda client: client.read_holding_registers(address, count=1, slave=1))
 
         if result.isError():
             return jsonify({"ok": False, "error": "Erro Modbus ao ler registrador"})
@@ -134,14 +159,130 @@ def clp_read_register(ip):
         value = result.registers[0]
         return jsonify({"ok": True, "address": address, "value": value})
 
+    except modbus_pool.ConexaoIndisponivel as e:
+        return jsonify({"ok": False, "error": str(e)}), 503
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
+
+
+@clp_bp.route("/<ip>/read_registers", methods=["POST"])
+def clp_read_registers(ip):
+    """
+    Leitura em lote. Body: {"reads": [{"address": 10, "type": "holding"}, 11, ...], "gap": 8, "unit": 1}
+    Tipos: holding, input, coil, discrete. Os valores voltam na ordem do pedido.
+    """
+    clp_dict = clp_manager.buscar_por_ip(ip)
+
+    if not clp_dict or not modbus_pool.pool.conectado(ip):
+        return jsonify({"ok": False, "error": "CLP não conectado"}), 400
+
+    data = request.json or {}
+    try:
+        pedidos = modbus_lote.normalizar_pedidos(data.get("reads"))
+        tolerancia = max(0, int(data.get("gap", modbus_lote.TOLERANCIA_LACUNA_PADRAO)))
+        unidade = int(data.get("unit", 1))
+    except (TypeError, ValueError) as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    try:
+        resultado = modbus_lote.ler_lote(ip, pedidos, tolerancia=tolerancia, unidade=unidade)
+    except modbus_pool.ConexaoIndisponivel as e:
+        return jsonify({"ok": False, "error": str(e)}), 503
+    except Exception as e:
+        return jsonify({"ok": False, "error": str(e)}), 500
+
+    valores = []
+    for tipo, endereco in pedidos:
+        item = {"address": endereco, "type": tipo}
+        if (tipo, endereco) in resultado["valores"]:
+            item["value"] = resultado["valores"][(tipo, endereco)]
+        else:
+            item["error"] = resultado["erros"].get((tipo, endereco))
+        valores.append(item)
+    return jsonify({
+        "ok": not resultado["erros"],
+        "values": valores,
+        "transacoes": resultado["transacoes"],
+    })
         
 
+@clp_bp.route("/<ip>/polling", methods=["GET"])
+def clp_polling_info(ip):
+    """Grupo de polling do CLP, últimos valores amostrados e estatísticas do dispositivo."""
+    clp_dict = clp_manager.buscar_por_ip(ip)
+    if not clp_dict:
+        return jsonify({"ok": False, "error": "CLP não encontrado"}), 404
+    return jsonify({
+        "ok": True,
+        "polling": clp_dict.get("polling"),
+        "ultimos": polling_service.ultimos_valores(ip),
+        "estatisticas": polling_service.get_metricas()["clps"].get(ip),
+    })
+
+
+@clp_bp.route("/<ip>/polling", methods=["PUT", "POST"])
+def clp_polling_definir(ip):
+    clp_dict = clp_manager.buscar_por_ip(ip)
+    if not clp_dict:
+        return jsonify({"ok": False, "error": "CLP não encontrado"}), 404
+
+    try:
+        grupo = clp_functions.definir_grupo_polling(clp_dict, request.json or {})
+    except (TypeError, ValueError) as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    clp_manager.salvar_clps(clp_dict)
+    clp_manager.notificar_clp(clp_dict)
+    polling_service.atualizar_grupo(ip, grupo)
+    return jsonify({"ok": True, "polling": grupo})
+
+
+@clp_bp.route("/<ip>/polling", methods=["DELETE"])
+def clp_polling_remover(ip):
+    clp_dict = clp_manager.buscar_por_ip(ip)
+    if not clp_dict:
+        return jsonify({"ok": False, "error": "CLP não encontrado"}), 404
+
+    if clp_functions.remover_grupo_polling(clp_dict):
+        clp_manager.salvar_clps(clp_dict)
+        clp_manager.notificar_clp(clp_dict)
+    polling_service.atualizar_grupo(ip, None)
+    return jsonify({"ok": True})
+
+
+@clp_bp.route("/<ip>/series", methods=["GET"])
+def clp_series(ip):
+    """
+    Histórico de um registrador: ?addr=holding:10&from=<epoch>&to=<epoch>&step=<s>.
+    Sem addr, lista as séries disponíveis. Por omissão: última hora, ~500 pontos.
+    """
+    if not clp_manager.buscar_por_ip(ip):
+        return jsonify({"ok": False, "error": "CLP não encontrado"}), 404
+
+    armazem = series.obter()
+    endereco = request.args.get("addr", "").strip()
+    if not endereco:
+        return jsonify({"ok": True, "series": armazem.chaves(ip)})
+    if ":" not in endereco:
+        endereco = f"holding:{endereco}"
+
+    try:
+        tipo, numero = endereco.split(":", 1)
+        chave = series.chave_endereco(tipo, int(numero))
+        ate = request.args.get("to", type=float) or time.time()
+        de = request.args.get("from", type=float) or ate - 3600
+        passo = request.args.get("step", type=float) or max(1.0, (ate - de) / 500)
+    except ValueError:
+        return jsonify({"ok": False, "error": "addr inválido (use tipo:endereço)"}), 400
+    if de > ate:
+        return jsonify({"ok": False, "error": "from deve ser anterior a to"}), 400
+
+    resultado = armazem.consultar(ip, chave, de, ate, passo)
+    return jsonify({"ok": True, "addr": chave, "from": de, "to": ate, "step": passo, **resultado})
+
+
 @clp_bp.route("/limpar_coleta_ip", methods=['POST'])
 def limpar_coleta_ip():
-    with open(caminho_coleta, "w", encoding="UTF-8"):
-        pass
+    limpar_arquivo_log(caminho_coleta)
 
     
     return redirect(url_for("coleta_de_ips"))
@@ -149,8 +290,7 @@ def limpar_coleta_ip():
 
 @clp_bp.route("/limpar_logs", methods=['POST'])
 def limpar_logs():
-    with open(caminho_app, "w", encoding="UTF-8"):
-        pass
+    limpar_arquivo_log(caminho_app)
 
     
     return redirect(url_for("logs_geral"))
@@ -170,7 +310,8 @@ def rename_clp():
         clp_alvo = clp_manager.buscar_por_ip(ip)
         if clp_alvo:
             clp_alvo['nome'] = novo_nome
-            clp_manager.salvar_clps()
+            clp_manager.salvar_clps(clp_alvo)
+            clp_manager.notificar_clp(clp_alvo)
             return jsonify({'success': True, 'message': 'Nome atualizado com sucesso!'})
         else:
             return jsonify({'success': False, 'message': 'CLP não encontrado.'}), 404
@@ -194,6 +335,53 @@ def stop_scanner():
     success = scanner_service.stop()
     return jsonify({'ok': success, 'status': scanner_service.get_status()})
 
+@clp_bp.route('/scanner/metricas', methods=['GET'])
+def get_scanner_metricas():
+    return jsonify({'ok': True, 'metricas': scanner_service.get_metricas()})
+
+# --- Rotas do motor de polling ---
+@clp_bp.route('/polling/status', methods=['GET'])
+def get_polling_status():
+    return jsonify({'status': polling_service.get_status()})
+
+@clp_bp.route('/polling/start', methods=['POST'])
+def start_polling():
+    success = polling_service.start()
+    return jsonify({'ok': success, 'status': polling_service.get_status()})
+
+@clp_bp.route('/polling/stop', methods=['POST'])
+def stop_polling():
+    success = polling_service.stop()
+    return jsonify({'ok': success, 'status': polling_service.get_status()})
+
+@clp_bp.route('/polling/metricas', methods=['GET'])
+def get_polling_metricas():
+    return jsonify({'ok': True, 'metricas': polling_service.get_metricas()})
+
+@clp_bp.route('/scanner/varredura/start', methods=['POST'])
+def start_varredura():
+    """Body: {"cidrs": ["192.168.0.0/24"], "taxa": 200, "metodos": ["arp", "icmp", "tcp"], "recomecar": false}"""
+    data = request.get_json() or {}
+    cidrs = data.get('cidrs') or []
+    if isinstance(cidrs, str):
+        cidrs = cidrs.split(',')
+    try:
+        success = scanner_service.iniciar_varredura(
+            cidrs, taxa=data.get('taxa'), metodos=data.get('metodos'), recomecar=bool(data.get('recomecar'))
+        )
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    return jsonify({'ok': success, 'varredura': scanner_service.status_varredura()})
+
+@clp_bp.route('/scanner/varredura/stop', methods=['POST'])
+def stop_varredura():
+    success = scanner_service.parar_varredura()
+    return jsonify({'ok': success, 'varredura': scanner_service.status_varredura()})
+
+@clp_bp.route('/scanner/varredura/status', methods=['GET'])
+def get_varredura_status():
+    return jsonify({'ok': True, 'varredura': scanner_service.status_varredura()})
+
 # NOTA: A rota 'baixar_codigo' foi removida pois dependia da subclasse CLPGen,
 # que foi eliminada na refatoração. Ela pode ser recriada como uma função em
 # 'clp_functions.py' se a funcionalidade for necessária.
\ No newline at end of file
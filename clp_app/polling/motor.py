@@ -0,0 +1,286 @@
+# clp_app/polling/motor.py
+"""
+Motor de polling contínuo: amostra os grupos de registradores de muitos CLPs
+num único event loop asyncio, com o cliente assíncrono do pymodbus.
+
+- Cada CLP com grupo de polling tem uma tarefa própria e uma conexão própria.
+- Os endereços do grupo são agrupados em leituras contíguas (utils/modbus_lote).
+- Os ciclos seguem uma grade fixa (fase + k * intervalo). A fase é derivada do
+  IP, para que grupos com o mesmo intervalo não disparem todos ao mesmo tempo.
+- Um ciclo que termina depois do início do seguinte conta como overrun; os
+  ciclos perdidos são saltados (não se acumulam leituras atrasadas).
+- Por CLP são contados ciclos, falhas, overruns e a latência de cada ciclo.
+"""
+import asyncio
+import logging
+import time
+import zlib
+from collections import deque
+from threading import Event, Lock, Thread
+
+from utils import log, modbus_lote
+
+try:
+    from pymodbus.client import AsyncModbusTcpClient
+except ImportError:  # pymodbus 2.x não tem o cliente assíncrono com esta API
+    AsyncModbusTcpClient = None
+
+# --- Configurações do Módulo ---
+TIMEOUT_LEITURA = 1.0        # Segundos por pedido Modbus
+BACKOFF_INICIAL = 1.0        # Espera antes de reconectar após falha de conexão
+BACKOFF_MAXIMO = 30.0
+AMOSTRAS_LATENCIA = 200      # Latências guardadas por CLP para média/percentis
+LOG_PREFIX = "[Polling]"
+
+
+class _EstadoDispositivo:
+    """Contadores e últimos valores de um CLP (alterados só dentro do event loop)."""
+
+    def __init__(self, grupo):
+        self.grupo = grupo
+        self.conectado = False
+        self.ciclos = 0
+        self.falhas = 0
+        self.overruns = 0
+        self.ciclos_perdidos = 0
+        self.latencias = deque(maxlen=AMOSTRAS_LATENCIA)
+        self.ultimo_erro = None
+        self.ultima_amostra = None
+        self.valores = {}
+
+
+def _percentil(valores, p):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def fase_do_ip(ip: str, intervalo: float) -> float:
+    """Deslocamento estável em [0, intervalo) para espalhar os ciclos dos CLPs."""
+    return (zlib.crc32(ip.encode()) / 2**32) * intervalo
+
+
+class MotorPolling:
+    """Executa os grupos de polling numa thread com o seu próprio event loop."""
+
+    def __init__(self, fabrica_cliente=None):
+        self._fabrica = fabrica_cliente or AsyncModbusTcpClient
+        self._thread = None
+        self._loop = None
+        self._parar = None            # asyncio.Event, criado dentro do loop
+        self._pronto = Event()
+        self._tarefas = {}            # ip -> asyncio.Task
+        self._estados = {}            # ip -> _EstadoDispositivo
+        self._lock = Lock()           # protege _estados e os contadores lidos por outras threads
+        self._assinantes = []
+
+    # --- Controle ---
+
+    def iniciar(self, grupos: dict) -> bool:
+        """Inicia o motor com {ip: grupo}. Retorna False se já estiver em execução."""
+        if self.em_execucao():
+            return False
+        if self._fabrica is None:
+            log.log_coleta(f"{LOG_PREFIX} pymodbus sem AsyncModbusTcpClient; polling indisponível.",
+                           level=logging.ERROR)
+            return False
+        self._pronto.clear()
+        self._thread = Thread(target=self._executar, args=(dict(grupos),), name="PollingThread", daemon=True)
+        self._thread.start()
+        self._pronto.wait(timeout=5.0)
+        log.log_coleta(f"{LOG_PREFIX} Motor iniciado com {len(grupos)} grupo(s).")
+        return True
+
+    def parar(self, timeout: float = 5.0) -> bool:
+        if not self.em_execucao():
+            return False
+        self._loop.call_soon_threadsafe(self._parar.set)
+        self._thread.join(timeout=timeout)
+        log.log_coleta(f"{LOG_PREFIX} Motor parado.")
+        return True
+
+    def em_execucao(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def atualizar_grupo(self, ip: str, grupo):
+        """Substitui (ou remove, com grupo=None) o grupo de um CLP com o motor em execução."""
+        if self.em_execucao():
+            self._loop.call_soon_threadsafe(self._aplicar_grupo, ip, grupo)
+
+    def assinar(self, callback):
+        """Regista `callback(ip, instante, valores)`, chamado no event loop após cada ciclo bem-sucedido."""
+        self._assinantes.append(callback)
+
+    # --- Event loop ---
+
+    def _executar(self, grupos):
+        try:
+            asyncio.run(self._principal(grupos))
+        except Exception as e:
+            log.log_coleta(f"{LOG_PREFIX} Erro no motor de polling: {e}", level=logging.ERROR)
+        finally:
+            self._pronto.set()
+
+    async def _principal(self, grupos):
+        self._loop = asyncio.get_running_loop()
+        self._parar = asyncio.Event()
+        for ip, grupo in grupos.items():
+            self._aplicar_grupo(ip, grupo)
+        self._pronto.set()
+
+        await self._parar.wait()
+        tarefas = list(self._tarefas.values())
+        for tarefa in tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*tarefas, return_exceptions=True)
+        self._tarefas.clear()
+
+    def _aplicar_grupo(self, ip, grupo):
+        anterior = self._tarefas.pop(ip, None)
+        if anterior:
+            anterior.cancel()
+        if not grupo or not grupo.get("ativo", True) or not grupo.get("enderecos"):
+            with self._lock:
+                self._estados.pop(ip, None)
+            return
+        estado = _EstadoDispositivo(grupo)
+        with self._lock:
+            self._estados[ip] = estado
+        self._tarefas[ip] = asyncio.ensure_future(self._consultar_dispositivo(ip, grupo, estado))
+
+    async def _conectar(self, ip, grupo):
+        cliente = self._fabrica(ip, port=int(grupo.get("porta", 502)), timeout=TIMEOUT_LEITURA)
+        await cliente.connect()
+        if not cliente.connected:
+            cliente.close()
+            raise ConnectionError(f"sem resposta em {ip}:{grupo.get('porta', 502)}")
+        return cliente
+
+    async def _ler_blocos(self, cliente, blocos, pedidos_por_tipo, unidade):
+        valores = {}
+        for tipo, inicio, quantidade in blocos:
+            metodo, atributo, _ = modbus_lote.TIPOS[tipo]
+            # O cliente assíncrono só existe no pymodbus 3.x, onde o escravo é passado como "slave"
+            resultado = await getattr(cliente, metodo)(inicio, count=quantidade, slave=unidade)
+            if resultado.isError():
+                raise RuntimeError(f"Erro Modbus ao ler {tipo} {inicio}..{inicio + quantidade - 1}: {resultado}")
+            lidos = getattr(resultado, atributo)
+            for endereco in pedidos_por_tipo[tipo]:
+                if inicio <= endereco < inicio + quantidade:
+                    valores[(tipo, endereco)] = lidos[endereco - inicio]
+        return valores
+
+    async def _consultar_dispositivo(self, ip, grupo, estado):
+        pedidos = modbus_lote.normalizar_pedidos(grupo["enderecos"])
+        pedidos_por_tipo = {}
+        for tipo, endereco in pedidos:
+            pedidos_por_tipo.setdefault(tipo, set()).add(endereco)
+        blocos = modbus_lote.planear_leituras(pedidos, grupo.get("tolerancia", modbus_lote.TOLERANCIA_LACUNA_PADRAO))
+        intervalo = float(grupo["intervalo"])
+        unidade = int(grupo.get("unidade", 1))
+
+        loop = asyncio.get_running_loop()
+        proximo = loop.time() + fase_do_ip(ip, intervalo)
+        cliente = None
+        backoff = BACKOFF_INICIAL
+        try:
+            while True:
+                atraso = proximo - loop.time()
+                if atraso > 0:
+                    await asyncio.sleep(atraso)
+
+                if cliente is None:
+                    try:
+                        cliente = await self._conectar(ip, grupo)
+                        backoff = BACKOFF_INICIAL
+                        estado.conectado = True
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        # Qualquer falha (incl. ModbusException) mantém o CLP no ciclo de backoff
+                        with self._lock:
+                            estado.falhas += 1
+                            estado.ultimo_erro = str(e)
+                        estado.conectado = False
+                        proximo = loop.time() + backoff
+                        backoff = min(backoff * 2, BACKOFF_MAXIMO)
+                        continue
+
+                inicio = loop.time()
+                try:
+                    valores = await asyncio.wait_for(
+                        self._ler_blocos(cliente, blocos, pedidos_por_tipo, unidade),
+                        timeout=max(intervalo, TIMEOUT_LEITURA),
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    with self._lock:
+                        estado.falhas += 1
+                        estado.ultimo_erro = str(e)
+                    estado.conectado = False
+                    cliente.close()
+                    cliente = None
+                else:
+                    latencia = loop.time() - inicio
+                    instante = time.time()
+                    with self._lock:
+                        estado.ciclos += 1
+                        estado.latencias.append(latencia)
+                        estado.ultima_amostra = instante
+                        estado.valores = valores
+                    for callback in self._assinantes:
+                        try:
+                            callback(ip, instante, valores)
+                        except Exception as e:
+                            log.log_coleta(f"{LOG_PREFIX} Erro no assinante do polling: {e}", level=logging.ERROR)
+
+                # Próximo ciclo na grade fixa; se já passou, conta o overrun e salta os ciclos perdidos
+                proximo += intervalo
+                agora = loop.time()
+                if agora > proximo:
+                    perdidos = int((agora - proximo) // intervalo) + 1
+                    with self._lock:
+                        estado.overruns += 1
+                        estado.ciclos_perdidos += perdidos
+                    proximo += perdidos * intervalo
+        finally:
+            estado.conectado = False
+            if cliente is not None:
+                cliente.close()
+
+    # --- Estado ---
+
+    def ultimos_valores(self, ip: str) -> dict:
+        """Últimos valores lidos do CLP: {"tipo:endereço": valor} e o instante da amostra."""
+        with self._lock:
+            estado = self._estados.get(ip)
+            if estado is None:
+                return {}
+            return {
+                "instante": estado.ultima_amostra,
+                "valores": {f"{tipo}:{endereco}": valor for (tipo, endereco), valor in estado.valores.items()},
+            }
+
+    def estatisticas(self) -> dict:
+        """Por CLP: ciclos, falhas, overruns, ciclos perdidos e latência (ms) média/p95/máxima."""
+        por_clp = {}
+        with self._lock:
+            for ip, estado in self._estados.items():
+                latencias = [l * 1000 for l in estado.latencias]
+                por_clp[ip] = {
+                    "intervalo": estado.grupo.get("intervalo"),
+                    "enderecos": len(estado.grupo.get("enderecos", [])),
+                    "conectado": estado.conectado,
+                    "ciclos": estado.ciclos,
+                    "falhas": estado.falhas,
+                    "overruns": estado.overruns,
+                    "ciclos_perdidos": estado.ciclos_perdidos,
+                    "latencia_media_ms": sum(latencias) / len(latencias) if latencias else None,
+                    "latencia_p95_ms": _percentil(latencias, 95),
+                    "latencia_max_ms": max(latencias) if latencias else None,
+                    "ultimo_erro": estado.ultimo_erro,
+                    "ultima_amostra": estado.ultima_amostra,
+                }
+        return {"em_execucao": self.em_execucao(), "clps": por_clp}
@@ -0,0 +1,72 @@
+# clp_app/polling/service.py
+from clp_app.polling.motor import MotorPolling
+from utils import CLP as clp_manager, metricas, series
+
+
+class PollingService:
+    def __init__(self):
+        self._motor = MotorPolling()
+        # Cada ciclo de leitura alimenta as séries temporais (/clp/<ip>/series)
+        self._motor.assinar(lambda ip, instante, valores: series.obter().adicionar_amostras(ip, instante, valores))
+        metricas.registar_coletor(self._coletar_metricas)
+
+    def _grupos_configurados(self) -> dict:
+        """Grupos de polling ativos guardados nos registros dos CLPs."""
+        grupos = {}
+        for clp in clp_manager.listar_clps():
+            grupo = clp.get("polling")
+            if grupo and grupo.get("ativo", True) and grupo.get("enderecos"):
+                grupos[clp["IP"]] = grupo
+        return grupos
+
+    def start(self):
+        """Inicia o motor de polling com os grupos de todos os CLPs."""
+        iniciado = self._motor.iniciar(self._grupos_configurados())
+        if iniciado:
+            series.obter().iniciar_gravacao_periodica()
+        return iniciado
+
+    def stop(self):
+        """Para o motor de polling, fecha as conexões e grava o segmento das séries."""
+        parado = self._motor.parar()
+        if parado:
+            series.obter().parar_gravacao_periodica()
+        return parado
+
+    def get_status(self):
+        return "ativado" if self._motor.em_execucao() else "desativado"
+
+    def get_metricas(self):
+        """Ciclos, falhas, overruns e latência por CLP."""
+        return self._motor.estatisticas()
+
+    def _coletar_metricas(self):
+        """Contadores do motor por CLP, no formato dos coletores de utils.metricas."""
+        clps = self._motor.estatisticas()["clps"]
+        familias = [
+            ("clp_polling_ciclos_total", "counter", "Ciclos de leitura concluídos por CLP.", "ciclos"),
+            ("clp_polling_falhas_total", "counter", "Ciclos de leitura falhados por CLP.", "falhas"),
+            ("clp_polling_overruns_total", "counter", "Ciclos que excederam o intervalo, por CLP.", "overruns"),
+            ("clp_polling_ciclos_perdidos_total", "counter", "Ciclos saltados após overrun, por CLP.",
+             "ciclos_perdidos"),
+        ]
+        amostras = [(nome, tipo, ajuda, [({"clp": ip}, e[campo]) for ip, e in clps.items()])
+                    for nome, tipo, ajuda, campo in familias]
+        amostras.append(("clp_polling_latencia_p95_segundos", "gauge", "Percentil 95 da duração do ciclo, por CLP.",
+                         [({"clp": ip}, None if e["latencia_p95_ms"] is None else e["latencia_p95_ms"] / 1000)
+                          for ip, e in clps.items()]))
+        return amostras
+
+    def atualizar_grupo(self, ip, grupo):
+        """Aplica de imediato um grupo alterado (ou removido) se o motor estiver em execução."""
+        self._motor.atualizar_grupo(ip, grupo)
+
+    def ultimos_valores(self, ip):
+        return self._motor.ultimos_valores(ip)
+
+    def assinar(self, callback):
+        """Recebe callback(ip, instante, valores) após cada ciclo de leitura bem-sucedido."""
+        self._motor.assinar(callback)
+
+# Instância única para ser usada em toda a aplicação
+polling_service = PollingService()
@@ -0,0 +1,154 @@
+# clp_app/scanner/captura_rapida.py
+"""
+Caminho rápido de captura: lê frames brutos de um socket AF_PACKET (Linux) e
+extrai o IP de origem por offsets fixos, sem dissecar o pacote com o Scapy.
+
+Só reconhece o que o BPF_FILTER do coletor deixa passar:
+- ARP sobre Ethernet/IPv4 -> IP do remetente (spa)
+- IPv4/TCP com a flag SYN  -> IP de origem
+Frames com tag VLAN (802.1Q / 802.1ad) também são tratados.
+"""
+import logging
+import socket
+import struct
+
+from utils import log
+
+ETH_P_ALL = 0x0003
+TAMANHO_BUFFER = 65536
+LOG_PREFIX = "[Coletor]"
+FRAMES_POR_LEITURA_ESTATISTICAS = 4096  # Frequência da leitura dos descartes do kernel (além de cada timeout)
+
+# getsockopt(SOL_PACKET, PACKET_STATISTICS) -> struct tpacket_stats {tp_packets, tp_drops}, zerada a cada leitura
+_SOL_PACKET = 263
+_PACKET_STATISTICS = 6
+_TPACKET_STATS = struct.Struct("II")
+
+_ETH_IPV4 = 0x0800
+_ETH_ARP = 0x0806
+_ETH_VLAN = (0x8100, 0x88A8)
+_PROTO_TCP = 6
+_TCP_SYN = 0x02
+_IP_NAO_ESPECIFICADO = b"\x00\x00\x00\x00"  # sondas ARP (RFC 5227) e DHCP usam 0.0.0.0 como origem
+
+
+def extrair_candidato(frame, tamanho: int = None):
+    """
+    Devolve (ip_origem, porta_destino) de um frame Ethernet TCP-SYN, (ip_remetente, None)
+    de um ARP, ou None. `frame` pode ser bytes, bytearray ou memoryview; `tamanho`
+    limita os bytes válidos.
+    """
+    if tamanho is None:
+        tamanho = len(frame)
+    if tamanho < 14:
+        return None
+
+    off = 12
+    tipo = (frame[off] << 8) | frame[off + 1]
+    while tipo in _ETH_VLAN and tamanho >= off + 6:
+        off += 4
+        tipo = (frame[off] << 8) | frame[off + 1]
+    off += 2  # início do payload Ethernet
+
+    if tipo == _ETH_IPV4:
+        if tamanho < off + 20:
+            return None
+        ihl = (frame[off] & 0x0F) * 4
+        if frame[off + 9] != _PROTO_TCP:
+            return None
+        # Fragmentos que não são o primeiro não trazem o cabeçalho TCP
+        if ((frame[off + 6] & 0x1F) << 8) | frame[off + 7]:
+            return None
+        tcp_off = off + ihl
+        if tamanho <= tcp_off + 13 or not frame[tcp_off + 13] & _TCP_SYN:
+            return None
+        porta_destino = (frame[tcp_off + 2] << 8) | frame[tcp_off + 3]
+        origem = bytes(frame[off + 12:off + 16])
+        if origem == _IP_NAO_ESPECIFICADO:
+            return None
+        return socket.inet_ntoa(origem), porta_destino
+
+    if tipo == _ETH_ARP:
+        # htype(2) ptype(2) hlen(1) plen(1) op(2) sha(6) spa(4): só Ethernet/IPv4
+        if tamanho < off + 18 or frame[off + 4] != 6 or frame[off + 5] != 4:
+            return None
+        remetente = bytes(frame[off + 14:off + 18])
+        if remetente == _IP_NAO_ESPECIFICADO:
+            return None
+        return socket.inet_ntoa(remetente), None
+
+    return None
+
+
+def extrair_ip_origem(frame, tamanho: int = None):
+    """Devolve apenas o IP de origem (str) de um frame ARP ou TCP-SYN, ou None."""
+    candidato = extrair_candidato(frame, tamanho)
+    return candidato[0] if candidato else None
+
+
+def _anexar_filtro_bpf(sock, bpf_filter: str, interface):
+    """Aplica o filtro BPF no kernel (compilado pelo Scapy/libpcap). Sem ele, o filtro é feito em Python."""
+    try:
+        from scapy.arch.linux import attach_filter
+        attach_filter(sock, bpf_filter, interface)
+        return True
+    except Exception as e:
+        log.log_coleta(f"{LOG_PREFIX} Filtro BPF não aplicado no socket bruto ({e}); filtrando em Python.",
+                       level=logging.WARNING)
+        return False
+
+
+def _descartes_kernel(sock):
+    """Frames descartados pelo kernel (buffer do socket cheio) desde a leitura anterior, ou None."""
+    try:
+        return _TPACKET_STATS.unpack(sock.getsockopt(_SOL_PACKET, _PACKET_STATISTICS, _TPACKET_STATS.size))[1]
+    except OSError:
+        return None
+
+
+def capturar(interface, bpf_filter: str, ao_receber_ip, parar_evt, timeout: float = 1.0, contadores: dict = None):
+    """
+    Lê frames do socket AF_PACKET até `parar_evt` ser acionado e chama
+    `ao_receber_ip(ip, porta_destino)` para cada ARP/SYN (porta None no ARP).
+    Reutiliza um único buffer. Com `contadores`, acumula em "descartes_kernel"
+    os frames que o kernel descartou por o socket não ser lido a tempo.
+    """
+    if not hasattr(socket, "AF_PACKET"):
+        raise OSError("Captura bruta (AF_PACKET) só está disponível em Linux.")
+
+    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+    try:
+        if interface:
+            sock.bind((interface, 0))
+        _anexar_filtro_bpf(sock, bpf_filter, interface)
+        sock.settimeout(timeout)
+
+        def acumular_descartes():
+            descartes = _descartes_kernel(sock)
+            if descartes is not None:
+                contadores["descartes_kernel"] = (contadores.get("descartes_kernel") or 0) + descartes
+
+        if contadores is not None and contadores.get("descartes_kernel") is None:
+            contadores["descartes_kernel"] = 0
+
+        buffer = bytearray(TAMANHO_BUFFER)
+        visao = memoryview(buffer)
+        recv_into = sock.recv_into
+        frames = 0
+        while not parar_evt.is_set():
+            try:
+                n = recv_into(visao)
+            except socket.timeout:
+                if contadores is not None:
+                    acumular_descartes()
+                continue
+            candidato = extrair_candidato(buffer, n)
+            if candidato is not None:
+                ao_receber_ip(*candidato)
+            frames += 1
+            if contadores is not None and frames % FRAMES_POR_LEITURA_ESTATISTICAS == 0:
+                acumular_descartes()
+        if contadores is not None:
+            acumular_descartes()
+    finally:
+        sock.close()
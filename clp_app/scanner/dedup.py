@@ -0,0 +1,140 @@
+# clp_app/scanner/dedup.py
+"""
+Cache de deduplicação de IPs para o sniffer, com memória limitada.
+
+Substitui o dicionário `_ips_last_seen` (que nunca era limpo e era protegido
+por um único Lock):
+- Partições (shards) independentes, cada uma com o seu Lock: pacotes de IPs
+  diferentes raramente disputam o mesmo lock.
+- Expiração por "timing wheel": cada partição guarda os IPs em baldes por
+  fatia de tempo; baldes inteiros com mais de `ttl` segundos são descartados
+  de uma vez, sem varrer o cache.
+- Capacidade máxima: com a partição cheia, os IPs mais antigos são despejados.
+  Cada IP guarda a geração da sua entrada na roda; entradas de gerações antigas
+  (IP re-aceite ou esquecido) são ignoradas, mas contam para a capacidade até
+  saírem da roda, por isso a memória fica limitada mesmo com esquecer()/adiar().
+- Contadores de acertos (hits), faltas (misses), expirados e despejados.
+"""
+import time
+from collections import deque
+from threading import Lock
+
+SHARDS_PADRAO = 16
+BALDES_POR_TTL = 60   # Resolução da roda: ttl / BALDES_POR_TTL segundos por balde
+
+
+class _Particao:
+    __slots__ = ("lock", "vistos", "roda", "entradas", "geracao", "hits", "misses", "expirados", "despejados")
+
+    def __init__(self):
+        self.lock = Lock()
+        self.vistos = {}        # ip -> (instante da última vez que foi aceite, geração da entrada na roda)
+        self.roda = deque()     # baldes [(slot, deque de (ip, geração))], do mais antigo ao mais novo
+        self.entradas = 0       # entradas na roda, incluindo as de gerações antigas
+        self.geracao = 0
+        self.hits = self.misses = self.expirados = self.despejados = 0
+
+
+class CacheDedup:
+    """Decide se um IP deve ser processado, respeitando um TTL entre processamentos."""
+
+    def __init__(self, ttl: float, capacidade: int = 100_000, shards: int = SHARDS_PADRAO,
+                 relogio=time.monotonic):
+        self.ttl = float(ttl)
+        self.capacidade = int(capacidade)
+        self._capacidade_particao = max(1, self.capacidade // shards)
+        self._resolucao = max(self.ttl / BALDES_POR_TTL, 0.001)
+        self._particoes = [_Particao() for _ in range(shards)]
+        self._relogio = relogio
+
+    def _expirar(self, p: _Particao, agora: float):
+        """Descarta os baldes cujo IP mais recente já passou do TTL."""
+        roda, vistos, ttl, res = p.roda, p.vistos, self.ttl, self._resolucao
+        while roda and (roda[0][0] + 1) * res + ttl <= agora:
+            _, entradas = roda.popleft()
+            p.entradas -= len(entradas)
+            for ip, geracao in entradas:
+                atual = vistos.get(ip)
+                # Se o IP foi aceite de novo (ou esquecido), esta entrada já não é a dele: não remove.
+                if atual is not None and atual[1] == geracao:
+                    del vistos[ip]
+                    p.expirados += 1
+
+    def _libertar_entrada(self, p: _Particao):
+        """Tira a entrada mais antiga da roda (capacidade esgotada); se ainda for a atual do IP, despeja-o."""
+        roda, vistos = p.roda, p.vistos
+        while roda:
+            _, entradas = roda[0]
+            if entradas:
+                ip, geracao = entradas.popleft()
+                p.entradas -= 1
+                atual = vistos.get(ip)
+                if atual is not None and atual[1] == geracao:
+                    del vistos[ip]
+                    p.despejados += 1
+                return
+            roda.popleft()
+
+    def deve_processar(self, ip: str) -> bool:
+        """True (miss) se o IP é novo ou o TTL expirou, e marca-o como visto agora; False (hit) caso contrário."""
+        p = self._particoes[hash(ip) % len(self._particoes)]
+        agora = self._relogio()
+        with p.lock:
+            self._expirar(p, agora)
+            atual = p.vistos.get(ip)
+            if atual is not None and agora - atual[0] < self.ttl:
+                p.hits += 1
+                return False
+
+            p.misses += 1
+            if p.entradas >= self._capacidade_particao:
+                self._libertar_entrada(p)
+            p.geracao += 1
+            p.vistos[ip] = (agora, p.geracao)
+            p.entradas += 1
+            slot = int(agora // self._resolucao)
+            if p.roda and p.roda[-1][0] == slot:
+                p.roda[-1][1].append((ip, p.geracao))
+            else:
+                p.roda.append((slot, deque(((ip, p.geracao),))))
+            return True
+
+    def esquecer(self, ip: str):
+        """Remove o IP do cache, para que o próximo pacote dele volte a ser processado."""
+        p = self._particoes[hash(ip) % len(self._particoes)]
+        with p.lock:
+            p.vistos.pop(ip, None)
+
+    def adiar(self, ip: str, segundos: float):
+        """Encurta o TTL do IP: volta a ser processado daqui a `segundos` (se forem menos que o TTL)."""
+        p = self._particoes[hash(ip) % len(self._particoes)]
+        agora = self._relogio()
+        with p.lock:
+            atual = p.vistos.get(ip)
+            if atual is not None:
+                # Antecipa o instante "visto"; a entrada na roda continua a mesma
+                p.vistos[ip] = (min(atual[0], agora + segundos - self.ttl), atual[1])
+
+    def limpar(self):
+        """Esvazia o cache (os contadores são mantidos)."""
+        for p in self._particoes:
+            with p.lock:
+                p.vistos.clear()
+                p.roda.clear()
+                p.entradas = 0
+
+    def __len__(self):
+        return sum(len(p.vistos) for p in self._particoes)
+
+    def contadores(self) -> dict:
+        """Totais de hits/misses/expirados/despejados e ocupação atual."""
+        totais = {"hits": 0, "misses": 0, "expirados": 0, "despejados": 0, "tamanho": 0}
+        for p in self._particoes:
+            with p.lock:
+                totais["hits"] += p.hits
+                totais["misses"] += p.misses
+                totais["expirados"] += p.expirados
+                totais["despejados"] += p.despejados
+                totais["tamanho"] += len(p.vistos)
+        totais["capacidade"] = self.capacidade
+        return totais
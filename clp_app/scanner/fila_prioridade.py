@@ -0,0 +1,198 @@
+# clp_app/scanner/fila_prioridade.py
+"""
+Fila de candidatos a scan com prioridades e contabilização dos descartes.
+
+Substitui a Queue FIFO do coletor:
+- Três classes, atendidas por ordem: SYN para portas ICS, IPs novos e
+  re-verificações de CLPs já conhecidos. Dentro de cada classe, FIFO.
+- Com a fila cheia, um candidato só entra se houver outro de prioridade
+  inferior para despejar (o mais recente da classe mais baixa); caso
+  contrário é ele o descartado. Cada descarte é contado por motivo e classe.
+- Um IP já na fila que volte a aparecer com prioridade maior é promovido.
+- Guarda o tempo de espera de cada item retirado, para percentis por classe.
+- Mantém a contagem de tarefas por concluir (put/task_done), como a Queue.
+"""
+import time
+from collections import deque
+from threading import Condition
+
+PRIORIDADE_ICS = 0
+PRIORIDADE_NOVO = 1
+PRIORIDADE_RECHECK = 2
+NOMES_PRIORIDADE = ("ics", "novo", "recheck")
+
+# Resultado de put()
+ACEITE = "aceite"              # entrou na fila (talvez despejando outro)
+JA_NA_FILA = "ja_na_fila"      # já estava na fila: no máximo foi promovido
+DESCARTADO = "descartado"      # fila cheia de candidatos de prioridade igual ou maior
+
+MOTIVO_FILA_CHEIA = "fila_cheia"                        # o candidato não entrou
+MOTIVO_DESPEJADO = "despejado_por_prioridade"           # saiu para dar lugar a um mais prioritário
+AMOSTRAS_ESPERA = 10000
+
+
+def _percentil(valores, fracao):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(fracao * len(ordenados)))]
+
+
+class FilaPrioridade:
+    def __init__(self, capacidade: int):
+        self.capacidade = capacidade
+        self._classes = [deque() for _ in NOMES_PRIORIDADE]   # itens [ip, prioridade, instante, valido]
+        self._na_fila = {}                                    # ip -> item ativo
+        self._tamanho = 0
+        self._por_concluir = 0
+        self._cond = Condition()
+        self._descartes = {m: [0] * len(NOMES_PRIORIDADE) for m in (MOTIVO_FILA_CHEIA, MOTIVO_DESPEJADO)}
+        self._promovidos = 0
+        self._esperas = [deque(maxlen=AMOSTRAS_ESPERA) for _ in NOMES_PRIORIDADE]
+
+    def _remover_mais_recente(self, prioridade: int):
+        """Retira o item válido mais recente da classe (itens promovidos ficam inválidos e são ignorados)."""
+        classe = self._classes[prioridade]
+        while classe:
+            item = classe.pop()
+            if item[3]:
+                return item
+        return None
+
+    def put(self, ip: str, prioridade: int):
+        """
+        Coloca o IP na fila. Retorna (resultado, ip_despejado): resultado é ACEITE,
+        JA_NA_FILA ou DESCARTADO; ip_despejado é o IP de prioridade inferior que saiu
+        para lhe dar lugar.
+        """
+        with self._cond:
+            if ip in self._na_fila:
+                self._promover(ip, prioridade)
+                return JA_NA_FILA, None
+
+            despejado = None
+            if self._tamanho >= self.capacidade:
+                for classe in range(len(NOMES_PRIORIDADE) - 1, prioridade, -1):
+                    despejado = self._remover_mais_recente(classe)
+                    if despejado is not None:
+                        break
+                if despejado is None:
+                    self._descartes[MOTIVO_FILA_CHEIA][prioridade] += 1
+                    return DESCARTADO, None
+                del self._na_fila[despejado[0]]
+                self._tamanho -= 1
+                self._por_concluir -= 1
+                self._descartes[MOTIVO_DESPEJADO][despejado[1]] += 1
+
+            item = [ip, prioridade, time.monotonic(), True]
+            self._classes[prioridade].append(item)
+            self._na_fila[ip] = item
+            self._tamanho += 1
+            self._por_concluir += 1
+            self._cond.notify()
+            return ACEITE, despejado[0] if despejado else None
+
+    def _promover(self, ip: str, prioridade: int) -> bool:
+        existente = self._na_fila.get(ip)
+        if existente is None or prioridade >= existente[1]:
+            return False
+        # O item antigo fica inválido na sua classe; o novo mantém o instante de entrada
+        existente[3] = False
+        novo = [ip, prioridade, existente[2], True]
+        self._classes[prioridade].append(novo)
+        self._na_fila[ip] = novo
+        self._promovidos += 1
+        return True
+
+    def promover(self, ip: str, prioridade: int) -> bool:
+        """Sobe a prioridade de um IP que já está na fila. False se não estiver ou já tiver prioridade igual/maior."""
+        with self._cond:
+            return self._promover(ip, prioridade)
+
+    def get(self, timeout: float = None):
+        """Retira o IP de maior prioridade. Retorna None se o timeout expirar."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._tamanho == 0:
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return None
+                self._cond.wait(restante)
+            for classe in self._classes:
+                while classe:
+                    ip, prioridade, instante, valido = classe.popleft()
+                    if valido:
+                        del self._na_fila[ip]
+                        self._tamanho -= 1
+                        self._esperas[prioridade].append(time.monotonic() - instante)
+                        return ip
+        return None
+
+    def task_done(self, n: int = 1):
+        with self._cond:
+            self._por_concluir -= n
+
+    @property
+    def unfinished_tasks(self) -> int:
+        return self._por_concluir
+
+    def qsize(self) -> int:
+        return self._tamanho
+
+    def descartar(self, ip: str) -> bool:
+        """Remove o IP da fila, se lá estiver (usado ao esvaziar a fila)."""
+        with self._cond:
+            item = self._na_fila.pop(ip, None)
+            if item is None:
+                return False
+            item[3] = False
+            self._tamanho -= 1
+            self._por_concluir -= 1
+            return True
+
+    def limpar(self):
+        """Esvazia a fila (os contadores são mantidos)."""
+        with self._cond:
+            for classe in self._classes:
+                classe.clear()
+            self._por_concluir -= self._tamanho
+            self._na_fila.clear()
+            self._tamanho = 0
+
+    def reiniciar_contadores(self):
+        """Zera descartes, promoções e tempos de espera."""
+        with self._cond:
+            for contagens in self._descartes.values():
+                contagens[:] = [0] * len(contagens)
+            self._promovidos = 0
+            for amostras in self._esperas:
+                amostras.clear()
+
+    def estatisticas(self) -> dict:
+        """Profundidade por classe, descartes por motivo/classe e percentis (s) do tempo de espera."""
+        with self._cond:
+            profundidade = {nome: 0 for nome in NOMES_PRIORIDADE}
+            for item in self._na_fila.values():
+                profundidade[NOMES_PRIORIDADE[item[1]]] += 1
+            descartes = {motivo: dict(zip(NOMES_PRIORIDADE, contagens))
+                         for motivo, contagens in self._descartes.items()}
+            esperas = {nome: list(amostras) for nome, amostras in zip(NOMES_PRIORIDADE, self._esperas)}
+            promovidos = self._promovidos
+
+        espera = {}
+        for nome, amostras in esperas.items():
+            espera[nome] = {
+                "p50_s": _percentil(amostras, 0.50),
+                "p95_s": _percentil(amostras, 0.95),
+                "p99_s": _percentil(amostras, 0.99),
+                "amostras": len(amostras),
+            }
+        return {
+            "capacidade": self.capacidade,
+            "profundidade": sum(profundidade.values()),
+            "profundidade_por_classe": profundidade,
+            "descartes": descartes,
+            "descartes_total": sum(sum(c.values()) for c in descartes.values()),
+            "promovidos": promovidos,
+            "espera": espera,
+        }
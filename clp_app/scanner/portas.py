@@ -1,81 +1,196 @@
 # utils/portas.py (Refatorado)
 import subprocess
-import re
 import logging
 import shutil
+import xml.etree.ElementTree as ET
 
-from utils import log
+from utils import log, metricas
+from clp_app.scanner import varredura_async
+
+# Backend de scan: "nmap" (processo externo, com fallback Scapy) ou
+# "async" (TCP-connect nativo em asyncio, sem subprocesso).
+BACKEND_SCAN = "nmap"
+BACKENDS_SCAN = ("nmap", "async")
 
 # Scapy continua sendo um fallback útil
 try:
-    from scapy.all import sr1, IP, TCP, conf
+    from scapy.all import sr, send, IP, TCP, RandShort, conf
     SCAPY_AVAILABLE = True
 except ImportError:
     SCAPY_AVAILABLE = False
 
+SCAPY_TENTATIVAS = 2  # Rodadas de envio: a 1ª + reenvio das sondas sem resposta
+
+_duracao_scan = metricas.histograma(
+    "clp_scan_portas_segundos", "Duração de cada lote de escaneamento de portas, por backend.", ("backend",))
+_portas_abertas = metricas.contador(
+    "clp_scan_portas_abertas_total", "Portas abertas encontradas pelo escaneamento.", ("porta",))
+
+
+def _parse_nmap_xml(xml_saida: str) -> dict[str, list[int]]:
+    """Extrai, do XML do nmap (-oX), as portas TCP abertas de cada host: {ip: [portas]}."""
+    resultados = {}
+    try:
+        raiz = ET.fromstring(xml_saida)
+    except ET.ParseError as e:
+        log.log_coleta(f"XML do nmap inválido: {e}", level=logging.WARNING)
+        return resultados
+
+    for host in raiz.iter("host"):
+        ip = None
+        for endereco in host.findall("address"):
+            if endereco.get("addrtype") in ("ipv4", "ipv6"):
+                ip = endereco.get("addr")
+                break
+        if not ip:
+            continue
+        abertas = {
+            int(porta.get("portid"))
+            for porta in host.iter("port")
+            if porta.get("protocol") == "tcp" and porta.find("state") is not None
+            and porta.find("state").get("state") == "open"
+        }
+        resultados[ip] = sorted(abertas)
+    return resultados
+
+def _formatar_portas(intervalo: int, portas_alvo) -> str:
+    if portas_alvo:
+        return ",".join(map(str, sorted({int(p) for p in portas_alvo})))
+    return f"1-{int(intervalo)}"
+
+def _executar_nmap(ips: list, ports_to_check_str: str, timeout: int) -> dict[str, list[int]]:
+    """Executa UM processo nmap para todos os IPs e devolve {ip: [portas abertas]}.
+       IPs ausentes do resultado significam que o nmap falhou ou não estava disponível.
+    """
+    nmap_path = shutil.which("nmap")
+    if not nmap_path or not ips:
+        return {}
 
-def _parse_nmap_output(output: str) -> list[int]:
-    """Extrai portas abertas do output do nmap (lista de ints)."""
-    portas_abertas = re.findall(r'(\d+)/tcp\s+open', output)
-    return sorted({int(p) for p in portas_abertas})
+    # --host-timeout limita cada host; o timeout do processo cresce com o tamanho do lote.
+    cmd = [nmap_path, '-sT', '-n', '-T4', '--host-timeout', f"{int(timeout)}s",
+           '-p', ports_to_check_str, '-oX', '-', *ips]
+    timeout_total = timeout * 2 + len(ips)
+    alvo = ips[0] if len(ips) == 1 else f"{len(ips)} IPs"
+    try:
+        log.log_coleta(f"Executando nmap: {' '.join(cmd[:-len(ips)])} <{alvo}>")
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout_total, check=False)
+        if proc.returncode != 0:
+            log.log_coleta(f"Nmap retornou código {proc.returncode} para {alvo}. stderr: {proc.stderr}", level=logging.WARNING)
+            return {}
+        resultados = _parse_nmap_xml(proc.stdout)
+        # Hosts que o nmap considerou "down" não aparecem com portas: ficam sem portas abertas.
+        return {ip: resultados.get(ip, []) for ip in ips}
+    except subprocess.TimeoutExpired:
+        log.log_coleta(f"Nmap expirou (timeout) ao escanear {alvo}", level=logging.ERROR)
+    except Exception as e:
+        log.log_coleta(f"Erro inesperado ao executar nmap para {alvo}: {e}", level=logging.ERROR)
+    return {}
 
-def _scapy_syn_check(ip: str, ports, timeout=1) -> list[int]:
-    """Fallback com Scapy: envia SYN e espera SYN-ACK. Retorna lista de portas abertas."""
+def _scapy_syn_lote(ips, ports, timeout=1, tentativas=SCAPY_TENTATIVAS) -> dict[str, list[int]]:
+    """
+    Fallback com Scapy: envia TODOS os SYN (todos os hosts x portas) numa única
+    rodada de sr() e associa as respostas depois. Sondas sem resposta são
+    reenviadas até `tentativas` vezes; portas abertas recebem um RST para
+    desfazer a meia-conexão. Pior caso por rodada: um único `timeout`.
+    Retorna {ip: [portas abertas]}.
+    """
+    ips = [str(ip) for ip in ips]
     if not SCAPY_AVAILABLE:
         log.log_coleta("Scapy não disponível para fallback.", level=logging.ERROR)
-        return []
+        return {ip: [] for ip in ips}
 
     conf.verb = 0
-    abertas = []
-    for p in ports:
+    abertas = {ip: set() for ip in ips}
+    pendentes = [IP(dst=ip)/TCP(sport=RandShort(), dport=int(p), flags="S") for ip in ips for p in ports]
+    rsts = []
+    for _ in range(max(1, tentativas)):
+        if not pendentes:
+            break
+        try:
+            respondidos, sem_resposta = sr(pendentes, timeout=timeout, verbose=False)
+        except Exception as e:
+            log.log_coleta(f"Erro no scapy-syn check para {ips} -> {e}", level=logging.WARNING)
+            break
+        for enviado, resp in respondidos:
+            # SYN-ACK (0x12) = aberta; RST = fechada (não precisa de nova tentativa).
+            if resp.haslayer(TCP) and (int(resp[TCP].flags) & 0x12) == 0x12:
+                abertas.setdefault(enviado[IP].dst, set()).add(int(enviado[TCP].dport))
+                rsts.append(IP(dst=enviado[IP].dst)/TCP(sport=resp[TCP].dport, dport=resp[TCP].sport,
+                                                        flags="R", seq=resp[TCP].ack))
+        pendentes = list(sem_resposta)
+
+    if rsts:
         try:
-            pkt = IP(dst=ip)/TCP(dport=int(p), flags="S")
-            resp = sr1(pkt, timeout=timeout, verbose=False)
-            # Se a resposta for um pacote TCP com a flag SYN-ACK (0x12), a porta está aberta.
-            if resp and resp.haslayer(TCP) and resp[TCP].flags & 0x12:
-                abertas.append(int(p))
+            send(rsts, verbose=False)
         except Exception as e:
-            log.log_coleta(f"Erro no scapy-syn check para {ip}:{p} -> {e}", level=logging.WARNING)
-    return sorted(set(abertas))
+            log.log_coleta(f"Erro ao enviar RST de encerramento: {e}", level=logging.WARNING)
+    return {ip: sorted(portas) for ip, portas in abertas.items()}
+
 
+def _escanear_async(ips: list, intervalo: int, timeout: int, portas_alvo) -> dict[str, list[int]]:
+    portas = portas_alvo or range(1, int(intervalo) + 1)
+    resultados = varredura_async.escanear_lote(ips, portas, timeout_host=timeout)
+    for ip in ips:
+        if resultados.get(ip):
+            log.log_coleta(f"SUCESSO: Portas abertas encontradas em {ip}: {resultados[ip]}", ip=ip, evento="portas_abertas")
+        else:
+            log.log_coleta(f"Nenhuma porta aberta encontrada em {ip} com os métodos utilizados.", ip=ip, evento="sem_portas")
+    return resultados
 
-def escanear_portas(ip: str, intervalo: int = 1000, timeout: int = 60, portas_alvo: list = None) -> list[int]:
+
+def escanear_portas_lote(ips: list, intervalo: int = 1000, timeout: int = 60, portas_alvo: list = None,
+                         backend: str = None) -> dict[str, list[int]]:
     """
-    Escaneia portas abertas via nmap (ou fallback Scapy) e RETORNA uma lista de portas.
+    Escaneia vários IPs de uma vez e RETORNA {ip: [portas]}.
+    - backend "nmap": UMA única execução do nmap (saída XML); IPs sem resultado
+      passam pelo fallback Scapy.
+    - backend "async": motor TCP-connect em asyncio (varredura_async).
+    Sem `backend`, usa BACKEND_SCAN.
     """
-    log.log_coleta(f"Iniciando escaneamento de portas para o IP: {ip}...")
+    ips = list(dict.fromkeys(str(ip) for ip in ips))  # remove duplicados, mantendo a ordem
+    if not ips:
+        return {}
+    backend = backend or BACKEND_SCAN
+    if backend not in BACKENDS_SCAN:
+        raise ValueError(f"Backend de scan desconhecido: {backend}")
+    log.log_coleta(f"Iniciando escaneamento de portas ({backend}) para {len(ips)} IP(s): {', '.join(ips)}")
 
-    ports_to_check_str = ""
-    if portas_alvo:
-        ports_to_check_str = ",".join(map(str, sorted({int(p) for p in portas_alvo})))
-    else:
-        ports_to_check_str = f"1-{int(intervalo)}"
+    with _duracao_scan.cronometrar(backend=backend):
+        if backend == "async":
+            resultados = _escanear_async(ips, intervalo, timeout, portas_alvo)
+        else:
+            resultados = _escanear_nmap(ips, intervalo, timeout, portas_alvo)
+    for portas_encontradas in resultados.values():
+        for porta in portas_encontradas:
+            _portas_abertas.inc(porta=porta)
+    return resultados
 
-    portas_encontradas = []
-    nmap_path = shutil.which("nmap")
 
-    if nmap_path:
-        cmd = [nmap_path, '-sT', '-n', '-T4', '-p', ports_to_check_str, ip]
-        try:
-            log.log_coleta(f"Executando nmap: {' '.join(cmd)}")
-            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout, check=False)
-            if proc.returncode == 0:
-                portas_encontradas = _parse_nmap_output(proc.stdout)
-            else:
-                log.log_coleta(f"Nmap retornou código {proc.returncode} para {ip}. stderr: {proc.stderr}", level=logging.WARNING)
-        except subprocess.TimeoutExpired:
-            log.log_coleta(f"Nmap expirou (timeout) ao escanear {ip}", level=logging.ERROR)
-        except Exception as e:
-            log.log_coleta(f"Erro inesperado ao executar nmap para {ip}: {e}", level=logging.ERROR)
-
-    # Se nmap falhou ou não encontrou nada, tenta o fallback com Scapy se portas específicas foram dadas
-    if not portas_encontradas and portas_alvo:
-        log.log_coleta(f"Nmap não encontrou portas em {ip}. Tentando fallback com Scapy para {portas_alvo}.")
-        portas_encontradas = _scapy_syn_check(ip, portas_alvo)
-    
-    if portas_encontradas:
-        log.log_coleta(f"SUCESSO: Portas abertas encontradas em {ip}: {portas_encontradas}")
-    else:
-        log.log_coleta(f"Nenhuma porta aberta encontrada em {ip} com os métodos utilizados.")
-        
-    return portas_encontradas
\ No newline at end of file
+def _escanear_nmap(ips: list, intervalo: int, timeout: int, portas_alvo: list) -> dict[str, list[int]]:
+    resultados = _executar_nmap(ips, _formatar_portas(intervalo, portas_alvo), timeout)
+
+    # Se nmap falhou ou não encontrou nada, tenta o fallback com Scapy se portas específicas foram dadas,
+    # com uma única rodada de SYN para todos os IPs pendentes.
+    sem_portas = [ip for ip in ips if not resultados.get(ip)]
+    if sem_portas and portas_alvo:
+        log.log_coleta(f"Nmap não encontrou portas em {', '.join(sem_portas)}. Tentando fallback com Scapy para {portas_alvo}.")
+        resultados.update(_scapy_syn_lote(sem_portas, portas_alvo))
+
+    for ip in ips:
+        portas_encontradas = resultados.get(ip, [])
+        if portas_encontradas:
+            log.log_coleta(f"SUCESSO: Portas abertas encontradas em {ip}: {portas_encontradas}", ip=ip, evento="portas_abertas")
+        else:
+            log.log_coleta(f"Nenhuma porta aberta encontrada em {ip} com os métodos utilizados.", ip=ip, evento="sem_portas")
+        resultados[ip] = portas_encontradas
+
+    return resultados
+
+
+def escanear_portas(ip: str, intervalo: int = 1000, timeout: int = 60, portas_alvo: list = None,
+                    backend: str = None) -> list[int]:
+    """
+    Escaneia portas abertas via nmap (ou fallback Scapy) ou pelo motor async e RETORNA uma lista de portas.
+    """
+    return escanear_portas_lote([ip], intervalo=intervalo, timeout=timeout, portas_alvo=portas_alvo,
+                                backend=backend).get(str(ip), [])
@@ -0,0 +1,236 @@
+# clp_app/scanner/processo.py
+"""
+Scanner fora do processo web.
+
+O sniffer e o consumidor (rede.start_system) correm num processo filho, para que
+a dissecação de pacotes e os lotes de scan não disputem o GIL com o Flask.
+Um único Pipe liga os dois processos:
+
+- web -> filho: comandos ("status", id) e ("parar", id);
+- filho -> web: ("iniciado", ok), ("resposta", id, dados), ("descoberta", ip, portas, latencia_s),
+  ("estatisticas", {...}) a cada processo_filho.INTERVALO_ESTATISTICAS e ("logs", [registros]).
+
+As estatísticas levam também um instantâneo das métricas do filho (duração dos
+scans, contadores de log...), que o processo web soma às suas em /metrics.
+
+O inventário continua a ser gravado só pelo processo web (as descobertas chegam
+pelo pipe e passam por rede.gravar_descoberta) e os logs do filho são reemitidos
+no processo web, o único que escreve e roda os arquivos de log. O lado do filho
+está em processo_filho.py, que não importa o inventário (recebe só os IPs já
+conhecidos, a cada arranque).
+
+Se o filho morrer sem ter sido parado, o supervisor arranca outro com espera
+exponencial, até REINICIOS_MAX vezes por JANELA_REINICIOS_SEGUNDOS.
+"""
+import logging
+import multiprocessing
+import time
+from collections import deque
+from threading import Event, Lock, Thread
+
+from clp_app.scanner import processo_filho, rede
+from utils import CLP as clp_manager
+from utils import log, metricas
+
+# --- Configurações do Módulo ---
+TIMEOUT_ARRANQUE = 60.0           # Espera pelo "iniciado" do filho (spawn + import do scapy)
+TIMEOUT_COMANDO = 5.0             # Espera pela resposta a status/parar
+REINICIOS_MAX = 5                 # Reinícios automáticos permitidos por janela...
+JANELA_REINICIOS_SEGUNDOS = 300   # ...de 5 minutos
+ESPERA_REINICIO_BASE = 1.0        # Espera antes do 1º reinício da janela; dobra a cada novo reinício
+LOG_PREFIX = "[Scanner]"
+
+# fork com threads ativas (escrita de logs, Flask) pode herdar locks presos: usa spawn
+_contexto = multiprocessing.get_context("spawn")
+
+
+# --- Lado do processo web ---
+
+class ScannerProcesso:
+    """Arranca, comanda e supervisiona o processo filho do scanner."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._envio_lock = Lock()
+        self._processo = None
+        self._conexao = None
+        self._ativo = False        # pedido pelo utilizador; mantém-se durante os reinícios automáticos
+        self._opcoes = {}
+        self._pedidos = {}         # id -> [Event, resposta]
+        self._sequencia = 0
+        self._ultimas_estatisticas = None
+        self._reinicios = deque()  # instantes dos reinícios automáticos dentro da janela
+        self._total_reinicios = 0
+
+    def iniciar(self, **opcoes) -> bool:
+        """Arranca o filho com as opções de rede.start_system. False se já ativo ou se o arranque falhou."""
+        with self._lock:
+            if self._ativo:
+                return False
+            self._ativo = True
+            self._opcoes = opcoes
+            self._reinicios.clear()
+        if self._lancar():
+            rede.definir_fonte_estatisticas(self._estatisticas_pipeline)
+            return True
+        with self._lock:
+            self._ativo = False
+        return False
+
+    def parar(self, timeout: float = TIMEOUT_COMANDO) -> bool:
+        with self._lock:
+            if not self._ativo:
+                return False
+            self._ativo = False
+        self._encerrar(timeout)
+        return True
+
+    def status(self) -> str:
+        if not self._ativo:
+            return "desativado"
+        # Sem resposta (a reiniciar ou ocupado) continua ativo: o supervisor trata do filho
+        return self._pedir("status", TIMEOUT_COMANDO) or "ativado"
+
+    def metricas(self):
+        """Últimas métricas enviadas pelo filho, com pid e reinícios; None se nunca chegaram."""
+        estatisticas = self._ultimas_estatisticas
+        if estatisticas is None:
+            return None
+        processo = self._processo
+        return dict(estatisticas, processo={
+            "pid": processo.pid if processo is not None else None,
+            "reinicios": self._total_reinicios,
+        })
+
+    def _estatisticas_pipeline(self) -> dict:
+        estatisticas = self._ultimas_estatisticas
+        return estatisticas["pipeline"] if estatisticas else rede.obter_estatisticas()
+
+    def _lancar(self) -> bool:
+        conexao, conexao_filho = _contexto.Pipe()
+        processo = _contexto.Process(target=processo_filho.executar,
+                                     args=(conexao_filho, self._opcoes, clp_manager.listar_ips()),
+                                     name="ScannerProcesso", daemon=True)
+        processo.start()
+        conexao_filho.close()
+        arranque = {"evento": Event(), "ok": False}
+        with self._lock:
+            self._processo, self._conexao = processo, conexao
+        Thread(target=self._receber, args=(processo, conexao, arranque), name="ScannerReceptor", daemon=True).start()
+
+        if not arranque["evento"].wait(TIMEOUT_ARRANQUE):
+            log.log_coleta(f"{LOG_PREFIX} O processo do scanner não respondeu em {TIMEOUT_ARRANQUE:.0f}s.",
+                           level=logging.ERROR)
+        if not arranque["ok"] and processo.is_alive():
+            processo.terminate()
+        if arranque["ok"]:
+            log.log_coleta(f"{LOG_PREFIX} Coletor a correr no processo {processo.pid}.")
+        return arranque["ok"]
+
+    def _encerrar(self, timeout: float):
+        with self._lock:
+            processo = self._processo
+        if processo is None:
+            return
+        self._pedir("parar", timeout)
+        processo.join(timeout)
+        if processo.is_alive():
+            log.log_coleta(f"{LOG_PREFIX} O processo {processo.pid} não terminou; a forçar.", level=logging.WARNING)
+            processo.terminate()
+            processo.join(2.0)
+
+    def _pedir(self, comando: str, timeout: float):
+        """Envia um comando ao filho e espera a resposta (None sem filho ou em timeout)."""
+        with self._lock:
+            conexao = self._conexao
+            if conexao is None:
+                return None
+            self._sequencia += 1
+            pedido_id = self._sequencia
+            pedido = self._pedidos[pedido_id] = [Event(), None]
+        try:
+            with self._envio_lock:
+                conexao.send((comando, pedido_id))
+        except (OSError, ValueError):
+            self._pedidos.pop(pedido_id, None)
+            return None
+        pedido[0].wait(timeout)
+        self._pedidos.pop(pedido_id, None)
+        return pedido[1]
+
+    def _receber(self, processo, conexao, arranque: dict):
+        """Thread que lê tudo o que o filho envia; EOF significa que o filho terminou."""
+        while True:
+            try:
+                mensagem = conexao.recv()
+            except (EOFError, OSError):
+                break
+            tipo = mensagem[0]
+            if tipo == "logs":
+                log.reemitir(mensagem[1])
+            elif tipo == "descoberta":
+                _, ip, portas, _latencia = mensagem
+                try:
+                    rede.gravar_descoberta(ip, portas)
+                except Exception as e:
+                    log.log_coleta(f"{LOG_PREFIX} Erro ao gravar o CLP {ip}: {e}", level=logging.ERROR,
+                                   ip=ip, evento="erro_processamento")
+            elif tipo == "estatisticas":
+                estatisticas = dict(mensagem[1])
+                metricas.definir_remoto("scanner", estatisticas.pop("metricas", None))
+                self._ultimas_estatisticas = estatisticas
+            elif tipo == "resposta":
+                pedido = self._pedidos.get(mensagem[1])
+                if pedido is not None:
+                    pedido[1] = mensagem[2]
+                    pedido[0].set()
+            elif tipo == "iniciado":
+                arranque["ok"] = mensagem[1]
+                arranque["evento"].set()
+
+        arranque["evento"].set()
+        processo.join(5.0)
+        conexao.close()
+        self._ao_terminar(processo, arranque["ok"])
+
+    def _ao_terminar(self, processo, arrancou: bool):
+        """Decide se o fim do filho foi pedido ou uma falha a recuperar."""
+        with self._lock:
+            if processo is not self._processo:
+                return
+            self._processo = self._conexao = None
+            for pedido in self._pedidos.values():
+                pedido[0].set()
+            if not self._ativo or not arrancou:
+                return
+            agora = time.monotonic()
+            while self._reinicios and agora - self._reinicios[0] > JANELA_REINICIOS_SEGUNDOS:
+                self._reinicios.popleft()
+            desistir = len(self._reinicios) >= REINICIOS_MAX
+            if desistir:
+                self._ativo = False
+            else:
+                self._reinicios.append(agora)
+                espera = ESPERA_REINICIO_BASE * 2 ** (len(self._reinicios) - 1)
+
+        if desistir:
+            log.log_coleta(f"{LOG_PREFIX} O processo do scanner falhou {REINICIOS_MAX} vezes em "
+                           f"{JANELA_REINICIOS_SEGUNDOS}s; coleta desativada.", level=logging.CRITICAL)
+            return
+        log.log_coleta(f"{LOG_PREFIX} O processo do scanner terminou inesperadamente (código {processo.exitcode}); "
+                       f"a reiniciar em {espera:.1f}s.", level=logging.ERROR)
+        time.sleep(espera)
+        with self._lock:
+            if not self._ativo:
+                return
+        if not self._lancar():
+            with self._lock:
+                self._ativo = False
+            log.log_coleta(f"{LOG_PREFIX} Não foi possível reiniciar o processo do scanner.", level=logging.CRITICAL)
+            return
+        self._total_reinicios += 1
+        with self._lock:
+            parado = not self._ativo
+        if parado:
+            # parar() chegou durante o arranque, antes de haver conexão para o comando
+            self._encerrar(TIMEOUT_COMANDO)
@@ -0,0 +1,83 @@
+# clp_app/scanner/processo_filho.py
+"""
+Ponto de entrada do processo filho do scanner (ver processo.py).
+
+Com o método spawn, o filho importa de novo o módulo do alvo antes de o chamar.
+Por isso este módulo só importa utils.log ao nível do módulo: o encaminhamento
+dos logs é ligado antes de qualquer outro import (o filho nunca escreve nem roda
+os arquivos de log do processo web) e utils.CLP nunca é importado (o inventário,
+o armazenamento e as migrações são só do processo web, que recebe as descobertas).
+"""
+import logging
+import sys
+import time
+from threading import Lock
+
+from utils import log
+
+# --- Configurações do Módulo ---
+INTERVALO_ESTATISTICAS = 2.0      # Frequência com que o filho envia as métricas do pipeline
+LOG_PREFIX = "[Scanner]"
+
+
+def executar(conexao, opcoes: dict, conhecidos: list):
+    """Corre o coletor e atende os comandos do processo web. `conhecidos`: IPs do inventário no arranque."""
+    envio_lock = Lock()
+
+    def enviar(mensagem):
+        with envio_lock:
+            conexao.send(mensagem)
+
+    log.encaminhar_para(lambda lote: enviar(("logs", lote)))
+
+    from clp_app.scanner import rede
+    from utils import metricas
+
+    def estatisticas_locais() -> dict:
+        # O coletor do pipeline fica de fora: o processo web exporta-o a partir de "pipeline"
+        return {"lotes": rede.obter_metricas_lote(), "pipeline": rede.obter_estatisticas(),
+                "metricas": metricas.instantaneo(ignorar=(rede._coletar_metricas,))}
+
+    rede.definir_destino_descobertas(lambda ip, portas, latencia: enviar(("descoberta", ip, portas, latencia)),
+                                     conhecidos)
+
+    sniffer, consumidor = rede.start_system(**opcoes)
+    arrancou = bool(sniffer and consumidor)
+    enviar(("iniciado", arrancou))
+    if not arrancou:
+        log.parar_escrita()
+        return
+
+    codigo = 0
+    proximo_envio = 0.0
+    while True:
+        agora = time.monotonic()
+        if agora >= proximo_envio:
+            enviar(("estatisticas", estatisticas_locais()))
+            proximo_envio = agora + INTERVALO_ESTATISTICAS
+        if not (sniffer.is_alive() and consumidor.is_alive()):
+            # Sai com erro para o supervisor do processo web arrancar outro filho
+            log.log_coleta(f"{LOG_PREFIX} Thread do coletor terminou inesperadamente.", level=logging.ERROR)
+            rede.stop_system()
+            codigo = 1
+            break
+        if not conexao.poll(0.5):
+            continue
+        try:
+            comando, pedido = conexao.recv()
+        except EOFError:
+            # O processo web desapareceu: não há a quem responder
+            rede.stop_system()
+            break
+        if comando == "status":
+            enviar(("resposta", pedido, "ativado"))
+        elif comando == "parar":
+            rede.stop_system()
+            log.parar_escrita()  # os últimos logs seguem antes da resposta
+            enviar(("resposta", pedido, True))
+            break
+
+    log.parar_escrita()
+    conexao.close()
+    if codigo:
+        sys.exit(codigo)
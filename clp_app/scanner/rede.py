@@ -3,32 +3,84 @@
 import logging
 import socket
 import time
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor
-from queue import Empty, Full, Queue
-from threading import Event, Lock, Thread
-from clp_app.scanner import portas
+from queue import Empty
+from threading import Event, Lock, Semaphore, Thread
+from clp_app.scanner import captura_rapida, dedup, fila_prioridade, portas, replay
 
-from scapy.all import IP, get_working_ifaces, sniff
-from utils import CLP as clp_manager
-from utils import clp_functions, log
+from scapy.all import ARP, IP, TCP, Ether, get_working_ifaces, sniff
+# utils.CLP e utils.clp_functions (inventário e histórico) são importados só onde o inventário é
+# usado: o processo filho do scanner (processo_filho.py) encaminha as descobertas e não os carrega.
+from utils import log, metricas
 
 # --- Configurações do Módulo ---
 QUEUE_MAXSIZE = 2000  # Tamanho máximo da fila de IPs para processamento
 WORKER_THREADS = 10   # Número de threads para escanear portas simultaneamente
+MAX_LOTES_EM_ANDAMENTO = None  # Lotes submetidos e ainda não terminados (None = WORKER_THREADS)
 IP_TTL_SECONDS = 300  # Não re-escanear o mesmo IP por 5 minutos
+DEDUP_CAPACIDADE = 100_000  # Máximo de IPs lembrados pelo cache de TTL (memória limitada)
+RETENTATIVA_FILA_SEGUNDOS = 5  # IP descartado/despejado da fila cheia: volta a ser tentado após este TTL curto
 INTERFACE = None      # Deixe como None para Scapy escolher a melhor interface
+INTERFACES = None     # Várias interfaces em paralelo, ex.: ["eth0", "eth1"]; "todas" = as funcionais; None = só INTERFACE
+RETENTATIVA_INTERFACE_SEGUNDOS = 30  # Espera antes de retomar a captura numa interface que falhou
 BPF_FILTER = "arp or (tcp and (tcp[tcpflags] & (tcp-syn) != 0))" # Filtro para capturar tráfego relevante
 IGNORE_LOCAL = True   # Ignorar pacotes originados da própria máquina
+CAPTURA_BACKEND = "scapy"  # "scapy" (sniff + dissecação) ou "raw" (AF_PACKET + parsing por offsets, só Linux)
 LOG_PREFIX = "[Coletor]"
+PORTAS_ALVO = [502, 102, 44818, 80, 443]  # Portas que indicam um dispositivo de interesse
+IP_NAO_ESPECIFICADO = "0.0.0.0"  # Origem de sondas ARP/DHCP: nunca é enfileirado
+PORTAS_ICS = (502, 102, 44818)  # SYN para estas portas vai para a frente da fila (Modbus, S7, EtherNet/IP)
+LOTE_MAX_IPS = 32             # Máximo de IPs escaneados por uma única execução do nmap
+LOTE_JANELA_SEGUNDOS = 0.5    # Tempo máximo à espera de mais IPs antes de enviar o lote
 
 # --- Variáveis Globais de Estado ---
-_fila_ips = Queue(maxsize=QUEUE_MAXSIZE)
-_ips_last_seen = {}
-_ips_lock = Lock()
+_fila_ips = fila_prioridade.FilaPrioridade(QUEUE_MAXSIZE)
+_cache_ips = dedup.CacheDedup(ttl=IP_TTL_SECONDS, capacidade=DEDUP_CAPACIDADE)
 _shutdown_evt = Event()
 
 _sniffer_thread = None
 _consumer_thread = None
+_interfaces = {}      # nome da interface -> contadores da captura (um worker por interface)
+
+# Métricas do estágio de agrupamento (lotes) do consumidor
+_metricas_lote = {
+    "lotes": 0,
+    "ips": 0,
+    "ultimo_tamanho": 0,
+    "maior_tamanho": 0,
+    "ultima_janela_s": 0.0,
+    "janela_total_s": 0.0,
+    "envios_por_tamanho": 0,
+    "envios_por_janela": 0,
+}
+_metricas_lock = Lock()
+
+# Estatísticas do pipeline (usadas também no relatório do modo replay)
+_estatisticas = {
+    "pacotes": 0,            # IPs de origem extraídos dos pacotes capturados
+    "ignorados_locais": 0,   # pacotes originados da própria máquina
+    "ips_enfileirados": 0,   # IPs que passaram pelo TTL e entraram na fila
+    "ips_escaneados": 0,
+    "clps_descobertos": 0,   # IPs com portas abertas gravados no inventário
+}
+_latencias_descoberta = deque(maxlen=10000)  # segundos entre ver o pacote e gravar o CLP
+_enfileirado_em = {}                         # ip -> instante em que entrou na fila
+_jobs_em_andamento = 0
+
+# Configuração da execução atual (definida em start_system)
+_arquivos_pcap = None     # lista de pcaps no modo replay; None = captura ao vivo
+_velocidade_replay = 1.0
+_funcao_scan = None       # callable(ips) -> {ip: [portas]}
+_relatorio_replay = {}
+_interfaces_pedidas = None  # lista de interfaces desta execução; None = INTERFACES
+
+# Destino das descobertas e origem das estatísticas exportadas em /metrics.
+# Por omissão o próprio processo; no modo processo (clp_app/scanner/processo.py)
+# o filho envia as descobertas ao processo web e este lê as estatísticas do filho.
+_destino_descobertas = None   # callable(ip, portas, latencia_s); None = gravar_descoberta
+_ips_conhecidos = set()       # Com destino: IPs do inventário no arranque e os já entregues ao destino
+_fonte_estatisticas = None    # callable() -> dict; None = obter_estatisticas
 
 # --- Funções Auxiliares ---
 
@@ -59,108 +111,361 @@ _LOCAL_IPS = _get_local_ips() if IGNORE_LOCAL else set()
 def _should_process_ip(ip: str) -> bool:
     """Verifica se um IP deve ser processado com base no seu último tempo de varredura (TTL)."""
     if IGNORE_LOCAL and ip in _LOCAL_IPS:
+        _estatisticas["ignorados_locais"] += 1
         return False
 
-    now = time.time()
-    with _ips_lock:
-        last_seen_time = _ips_last_seen.get(ip)
-        if last_seen_time is None or (now - last_seen_time) >= IP_TTL_SECONDS:
-            _ips_last_seen[ip] = now
-            return True
-    return False
+    return _cache_ips.deve_processar(ip)
 
 # --- Lógica Principal: Coletor (Sniffer) e Consumidor ---
 
-def _analisar_pacote(pkt):
+def _prioridade(ip: str, porta_destino) -> int:
+    """SYN para porta ICS > IP ainda não inventariado > re-verificação de um CLP conhecido."""
+    if porta_destino in PORTAS_ICS:
+        return fila_prioridade.PRIORIDADE_ICS
+    if _destino_descobertas is not None:
+        # Sem inventário neste processo (filho do scanner): usa os IPs conhecidos
+        conhecido = ip in _ips_conhecidos
+    else:
+        from utils import CLP as clp_manager
+        conhecido = clp_manager.buscar_por_ip(ip) is not None
+    return fila_prioridade.PRIORIDADE_RECHECK if conhecido else fila_prioridade.PRIORIDADE_NOVO
+
+def _enfileirar_ip(ip_src: str, porta_destino: int = None) -> str:
+    """
+    Aplica o TTL e coloca o IP na fila de processamento (caminho comum aos backends de captura).
+    Retorna o contador de interface afetado: "enfileirados", "filtrados" (local/TTL/já na fila)
+    ou "descartados" (fila cheia).
+    """
+    _estatisticas["pacotes"] += 1
+    if not _should_process_ip(ip_src):
+        # Já visto dentro do TTL; um SYN ICS ainda pode promover o IP se ele estiver na fila
+        if porta_destino in PORTAS_ICS:
+            _fila_ips.promover(ip_src, fila_prioridade.PRIORIDADE_ICS)
+        return "filtrados"
+
+    # setdefault: se o IP ainda estiver na fila, a latência continua a contar desde a primeira entrada
+    _enfileirado_em.setdefault(ip_src, time.monotonic())
+    resultado, despejado = _fila_ips.put(ip_src, _prioridade(ip_src, porta_destino))
+    if despejado is not None:
+        # Saiu da fila para dar lugar a um candidato mais prioritário: volta a ser tentado daqui a
+        # pouco (não a cada pacote, o que faria os descartes crescer por pacote em vez de por IP)
+        _enfileirado_em.pop(despejado, None)
+        _cache_ips.adiar(despejado, RETENTATIVA_FILA_SEGUNDOS)
+    if resultado == fila_prioridade.ACEITE:
+        _estatisticas["ips_enfileirados"] += 1
+        return "enfileirados"
+    if resultado == fila_prioridade.JA_NA_FILA:
+        # Só foi promovido (se tanto): não é uma nova entrada
+        return "filtrados"
+    # Fila cheia de candidatos de prioridade igual ou maior. A fila contabiliza o descarte.
+    _enfileirado_em.pop(ip_src, None)
+    _cache_ips.adiar(ip_src, RETENTATIVA_FILA_SEGUNDOS)
+    return "descartados"
+
+def _novos_contadores() -> dict:
+    return {"estado": "iniciando", "pacotes": 0, "enfileirados": 0, "filtrados": 0, "descartados": 0,
+            "descartes_kernel": None, "falhas": 0, "ultimo_erro": None}
+
+def _receptor(contadores: dict):
+    """Callback de captura de uma interface: enfileira o IP e conta o resultado nos contadores dela."""
+    def ao_receber_ip(ip_src: str, porta_destino: int = None):
+        contadores["pacotes"] += 1
+        contadores[_enfileirar_ip(ip_src, porta_destino)] += 1
+    return ao_receber_ip
+
+def _analisar_pacote(pkt, ao_receber_ip=_enfileirar_ip):
     """
     Função de callback para cada pacote capturado pelo Scapy.
     Filtra e adiciona IPs relevantes à fila de processamento.
     """
-    if IP not in pkt:
-        return
+    if IP in pkt:
+        if pkt[IP].src != IP_NAO_ESPECIFICADO:
+            ao_receber_ip(pkt[IP].src, pkt[TCP].dport if TCP in pkt else None)
+    elif ARP in pkt:
+        # Pedidos/respostas ARP: o IP do remetente também revela o dispositivo
+        # (exceto nas sondas ARP da RFC 5227, que usam 0.0.0.0 como remetente)
+        if pkt[ARP].psrc != IP_NAO_ESPECIFICADO:
+            ao_receber_ip(pkt[ARP].psrc)
 
-    ip_src = pkt[IP].src
-    
-    if _should_process_ip(ip_src):
+def _replay_loop():
+    """Substitui a captura ao vivo: entrega os frames dos pcaps ao mesmo caminho de análise."""
+    log.log_coleta(f"{LOG_PREFIX} Reproduzindo {len(_arquivos_pcap)} pcap(s) a {_velocidade_replay or 'máxima'}x...")
+    contadores = _interfaces.setdefault("pcap", _novos_contadores())
+    contadores["estado"] = "ativa"
+    ao_receber_ip = _receptor(contadores)
+    if CAPTURA_BACKEND == "raw":
+        def ao_receber_frame(frame):
+            candidato = captura_rapida.extrair_candidato(frame)
+            if candidato is not None:
+                ao_receber_ip(*candidato)
+    else:
+        def ao_receber_frame(frame):
+            _analisar_pacote(Ether(frame), ao_receber_ip)
+    try:
+        _relatorio_replay.update(replay.reproduzir(_arquivos_pcap, ao_receber_frame, _shutdown_evt, _velocidade_replay))
+        log.log_coleta(f"{LOG_PREFIX} Reprodução terminada: {_relatorio_replay}")
+        contadores["estado"] = "parada"
+    except Exception as e:
+        log.log_coleta(f"{LOG_PREFIX} ERRO NA REPRODUÇÃO DO PCAP: {e}", level=logging.ERROR)
+        contadores["estado"] = "falhou"
+        contadores["ultimo_erro"] = str(e)
+        _shutdown_evt.set()
+
+def _interfaces_alvo() -> list:
+    """Interfaces a capturar nesta execução (None = a escolhida pelo Scapy)."""
+    interfaces = INTERFACES if _interfaces_pedidas is None else _interfaces_pedidas
+    if interfaces == "todas":
+        return [getattr(i, "name", str(i)) for i in get_working_ifaces()]
+    return list(interfaces) if interfaces else [INTERFACE]
+
+def _capturar_interface(interface, contadores: dict):
+    """
+    Worker de captura de uma interface. Uma falha afeta só esta interface: fica
+    registada nos contadores e a captura é retomada após RETENTATIVA_INTERFACE_SEGUNDOS,
+    enquanto as outras interfaces continuam a alimentar a fila.
+    """
+    nome = interface or "padrão"
+    ao_receber_ip = _receptor(contadores)
+    while not _shutdown_evt.is_set():
+        contadores["estado"] = "ativa"
+        log.log_coleta(f"{LOG_PREFIX} Iniciando a escuta de pacotes ({CAPTURA_BACKEND}) na interface '{nome}'...")
         try:
-            _fila_ips.put_nowait(ip_src)
-        except Full:
-            # A fila está cheia; normal em redes com muito tráfego. Apenas ignora.
-            pass
+            if CAPTURA_BACKEND == "raw":
+                # Caminho rápido: sem objetos Scapy por pacote
+                captura_rapida.capturar(interface, BPF_FILTER, ao_receber_ip, _shutdown_evt, contadores=contadores)
+            else:
+                # 'stop_filter' é a maneira mais eficiente de parar o sniff
+                sniff(
+                    prn=lambda pkt: _analisar_pacote(pkt, ao_receber_ip),
+                    filter=BPF_FILTER,
+                    store=False,
+                    iface=interface,
+                    stop_filter=lambda p: _shutdown_evt.is_set()
+                )
+            erro = None if _shutdown_evt.is_set() else "a captura terminou sem pedido de parada"
+        except Exception as e:
+            erro = str(e)
+        if erro is None:
+            break
+        contadores["estado"] = "falhou"
+        contadores["falhas"] += 1
+        contadores["ultimo_erro"] = erro
+        log.log_coleta(f"{LOG_PREFIX} ERRO NA CAPTURA da interface '{nome}': {erro}. "
+                       f"Nova tentativa em {RETENTATIVA_INTERFACE_SEGUNDOS}s.", level=logging.ERROR,
+                       evento="interface_falhou")
+        _shutdown_evt.wait(RETENTATIVA_INTERFACE_SEGUNDOS)
+    contadores["estado"] = "parada"
+    log.log_coleta(f"{LOG_PREFIX} Escuta de pacotes terminada na interface '{nome}'.")
 
 def _sniffer_loop():
     """
     Thread principal que executa a captura de pacotes.
     Bloqueia até que o evento de desligamento seja acionado.
     """
-    log.log_coleta(f"{LOG_PREFIX} Iniciando a escuta de pacotes na interface '{INTERFACE or 'padrão'}'...")
-    try:
-        # 'stop_filter' é a maneira mais eficiente de parar o sniff
-        sniff(
-            prn=_analisar_pacote,
-            filter=BPF_FILTER,
-            store=False,
-            iface=INTERFACE,
-            stop_filter=lambda p: _shutdown_evt.is_set()
-        )
-        log.log_coleta(f"{LOG_PREFIX} Escuta de pacotes terminada.")
-    except Exception as e:
-        log.log_coleta(f"{LOG_PREFIX} ERRO CRÍTICO NO SNIFFER: {e}", level=logging.ERROR)
-        # Em caso de erro crítico no sniffer, sinaliza para o sistema todo parar
-        _shutdown_evt.set()
+    if _arquivos_pcap is not None:
+        _replay_loop()
+        return
+
+    # Um worker por interface, todos a alimentar o mesmo cache de TTL e a mesma fila
+    workers = []
+    for interface in _interfaces_alvo():
+        contadores = _interfaces.setdefault(interface or "padrão", _novos_contadores())
+        worker = Thread(target=_capturar_interface, args=(interface, contadores),
+                        name=f"Captura-{interface or 'padrao'}", daemon=True)
+        worker.start()
+        workers.append(worker)
+    for worker in workers:
+        worker.join()
+
+def _registrar_lote(tamanho: int, janela: float, motivo: str):
+    """Atualiza as métricas de tamanho do lote e janela de espera."""
+    with _metricas_lock:
+        _metricas_lote["lotes"] += 1
+        _metricas_lote["ips"] += tamanho
+        _metricas_lote["ultimo_tamanho"] = tamanho
+        _metricas_lote["maior_tamanho"] = max(_metricas_lote["maior_tamanho"], tamanho)
+        _metricas_lote["ultima_janela_s"] = janela
+        _metricas_lote["janela_total_s"] += janela
+        _metricas_lote[f"envios_por_{motivo}"] += 1
+
+def obter_metricas_lote() -> dict:
+    """Retorna uma cópia das métricas dos lotes, com as médias já calculadas."""
+    with _metricas_lock:
+        metricas = dict(_metricas_lote)
+    lotes = metricas["lotes"] or 1
+    metricas["tamanho_medio"] = metricas["ips"] / lotes
+    metricas["janela_media_s"] = metricas["janela_total_s"] / lotes
+    return metricas
+
+def _coletar_lote():
+    """
+    Espera (até 1 s) pelo primeiro IP e depois junta mais IPs da fila até
+    LOTE_MAX_IPS ou até passar LOTE_JANELA_SEGUNDOS. Lança Empty se a fila estiver vazia.
+    Os IPs saem por ordem de prioridade.
+    """
+    primeiro = _fila_ips.get(timeout=1.0)
+    if primeiro is None:
+        raise Empty
+    lote = [primeiro]
+    inicio = time.monotonic()
+    motivo = "janela"
+    while len(lote) < LOTE_MAX_IPS and not _shutdown_evt.is_set():
+        restante = LOTE_JANELA_SEGUNDOS - (time.monotonic() - inicio)
+        if restante <= 0:
+            break
+        ip = _fila_ips.get(timeout=restante)
+        if ip is None:
+            break
+        lote.append(ip)
+    else:
+        if len(lote) >= LOTE_MAX_IPS:
+            motivo = "tamanho"
+    _registrar_lote(len(lote), time.monotonic() - inicio, motivo)
+    return lote
+
+def definir_destino_descobertas(funcao, conhecidos=()):
+    """
+    Encaminha as descobertas para funcao(ip, portas, latencia_s) em vez de gravar no inventário local.
+    `conhecidos`: IPs já inventariados (re-verificados com prioridade baixa), já que o inventário não é lido.
+    """
+    global _destino_descobertas
+    _destino_descobertas = funcao
+    _ips_conhecidos.clear()
+    _ips_conhecidos.update(conhecidos)
+
+def definir_fonte_estatisticas(funcao):
+    """Faz o coletor de /metrics ler as estatísticas de funcao() (None volta às locais)."""
+    global _fonte_estatisticas
+    _fonte_estatisticas = funcao
+
+def gravar_descoberta(ip: str, portas_abertas: list[int]):
+    """Cria ou atualiza o CLP no inventário com as portas abertas encontradas."""
+    from utils import CLP as clp_manager, clp_functions
+    clp_existente = clp_manager.buscar_por_ip(ip)
+    if clp_existente:
+        # Atualiza portas do CLP existente
+        for porta in portas_abertas:
+            clp_functions.adicionar_porta(clp_existente, porta)
+        clp_manager.notificar_clp(clp_existente)
+    else:
+        # Cria um novo registro de CLP
+        novo_clp = clp_functions.criar_clp(IP=ip, PORTAS=portas_abertas)
+        clp_manager.adicionar_clp(novo_clp)
+
+    # Salva apenas o registro deste CLP
+    clp_manager.salvar_clps(clp_manager.buscar_por_ip(ip))
+
+def salvar_resultado_scan(ip: str, portas_abertas: list[int]):
+    """Registra o resultado do scan de um IP e grava o CLP se houver portas abertas."""
+    visto_em = _enfileirado_em.pop(ip, None)
+    with _metricas_lock:
+        _estatisticas["ips_escaneados"] += 1
+    if not portas_abertas:
+        return
+    latencia = time.monotonic() - visto_em if visto_em is not None else None
+    if _destino_descobertas is not None:
+        _destino_descobertas(ip, portas_abertas, latencia)
+        # A partir daqui é um CLP conhecido, mesmo que este processo não veja o inventário
+        _ips_conhecidos.add(ip)
+    else:
+        gravar_descoberta(ip, portas_abertas)
+    with _metricas_lock:
+        _estatisticas["clps_descobertos"] += 1
+        if latencia is not None:
+            _latencias_descoberta.append(latencia)
+    log.log_coleta(f"{LOG_PREFIX} CLP {ip} gravado com as portas {portas_abertas}.", ip=ip, evento="clp_descoberto",
+                   latencia_ms=None if latencia is None else round(latencia * 1000, 1))
 
 def _consumidor_loop():
     """
-    Thread que consome IPs da fila e os submete para escaneamento de portas.
-    Usa um ThreadPool para processar múltiplos IPs em paralelo.
+    Thread que consome IPs da fila, agrupa-os em lotes e submete cada lote
+    para escaneamento de portas (uma execução do nmap por lote).
+    Usa um ThreadPool para processar vários lotes em paralelo.
+
+    No máximo MAX_LOTES_EM_ANDAMENTO lotes ficam submetidos ao mesmo tempo: sem
+    vaga, o consumidor não retira mais IPs e eles esperam na fila de prioridades
+    (onde são ordenados e, se preciso, descartados) em vez de na fila interna do executor.
     """
+    global _jobs_em_andamento
+    vagas = Semaphore(MAX_LOTES_EM_ANDAMENTO or WORKER_THREADS)
     log.log_coleta(f"{LOG_PREFIX} Consumidor iniciado com {WORKER_THREADS} workers.")
     
-    def escanear_e_salvar_job(ip: str):
-        """Função executada por cada worker para escanear e salvar dados do CLP."""
+    def escanear_e_salvar_lote(ips: list):
+        """Função executada por cada worker para escanear um lote e salvar os dados de cada CLP."""
+        global _jobs_em_andamento
         try:
-            # Lista de portas que indicam um dispositivo de interesse
-            portas_abertas = portas.escanear_portas(ip, portas_alvo=[502, 102, 44818, 80, 443])
-            
-            if portas_abertas:
-                clp_existente = clp_manager.buscar_por_ip(ip)
-                if clp_existente:
-                    # Atualiza portas do CLP existente
-                    for porta in portas_abertas:
-                        clp_functions.adicionar_porta(clp_existente, porta)
-                else:
-                    # Cria um novo registro de CLP
-                    novo_clp = clp_functions.criar_clp(IP=ip, PORTAS=portas_abertas)
-                    clp_manager.adicionar_clp(novo_clp)
-                
-                # Salva as alterações no arquivo de CLPs
-                clp_manager.salvar_clps()
-        except Exception as e:
-            log.log_coleta(f"{LOG_PREFIX} Erro ao processar o IP {ip}: {e}", level=logging.ERROR)
+            try:
+                resultados = _funcao_scan(ips)
+            except Exception as e:
+                log.log_coleta(f"{LOG_PREFIX} Erro ao escanear o lote {ips}: {e}", level=logging.ERROR)
+                for ip in ips:
+                    _enfileirado_em.pop(ip, None)
+                return
+            for ip in ips:
+                try:
+                    salvar_resultado_scan(ip, resultados.get(ip, []))
+                except Exception as e:
+                    log.log_coleta(f"{LOG_PREFIX} Erro ao processar o IP {ip}: {e}", level=logging.ERROR,
+                                   ip=ip, evento="erro_processamento")
+        finally:
+            with _metricas_lock:
+                _jobs_em_andamento -= 1
+            vagas.release()
 
     with ThreadPoolExecutor(max_workers=WORKER_THREADS) as executor:
         while not _shutdown_evt.is_set():
+            if not vagas.acquire(timeout=1.0):
+                # Todos os lotes em andamento; verifica o sinal de desligamento e tenta de novo
+                continue
             try:
-                ip_para_escanear = _fila_ips.get(timeout=1.0)
-                executor.submit(escanear_e_salvar_job, ip_para_escanear)
-                _fila_ips.task_done()
+                lote = _coletar_lote()
             except Empty:
                 # Fila vazia, continua o loop para verificar o sinal de desligamento
+                vagas.release()
                 continue
+            log.log_coleta(f"{LOG_PREFIX} Lote com {len(lote)} IP(s) enviado para escaneamento.", level=logging.DEBUG)
+            with _metricas_lock:
+                _jobs_em_andamento += 1
+            # Só marca os itens como concluídos depois de contar o lote como "em andamento"
+            _fila_ips.task_done(len(lote))
+            executor.submit(escanear_e_salvar_lote, lote)
     
     log.log_coleta(f"{LOG_PREFIX} Consumidor finalizado.")
 
 # --- Interface Pública de Controle ---
 
-def start_system():
+def _scan_por_backend(backend: str = None):
+    """Função de scan padrão: portas.escanear_portas_lote com o backend indicado."""
+    def escanear(ips):
+        return portas.escanear_portas_lote(ips, portas_alvo=PORTAS_ALVO, backend=backend)
+    return escanear
+
+def start_system(pcap: str = None, velocidade: float = 1.0, scan=None, interfaces=None):
     """
     Inicia e gerencia as threads de coleta e processamento.
     Retorna as threads para monitoramento externo, se necessário.
+
+    - pcap: arquivo .pcap (ou diretório de pcaps) reproduzido no lugar da interface ao vivo.
+    - velocidade: no modo pcap, 1.0 = tempo gravado, N = N vezes mais rápido, None/0 = máximo.
+    - scan: nome de backend de portas.BACKENDS_SCAN ou callable(ips) -> {ip: [portas]}.
+    - interfaces: lista de interfaces (ou "todas") capturadas em paralelo; None = INTERFACES.
     """
-    global _sniffer_thread, _consumer_thread
+    global _sniffer_thread, _consumer_thread, _arquivos_pcap, _velocidade_replay, _funcao_scan, _interfaces_pedidas
 
+    _funcao_scan = scan if callable(scan) else _scan_por_backend(scan)
+    _velocidade_replay = velocidade
+    _interfaces_pedidas = interfaces
+    _relatorio_replay.clear()
+    _interfaces.clear()
+    _arquivos_pcap = None
+    if pcap is not None:
+        try:
+            _arquivos_pcap = replay.listar_pcaps(pcap)
+        except FileNotFoundError:
+            log.log_coleta(f"{LOG_PREFIX} Arquivo ou diretório pcap não encontrado: {pcap}", level=logging.ERROR)
+            return None, None
     # Validação prévia: verifica se há interfaces de rede funcionais
-    if not get_working_ifaces():
+    elif not get_working_ifaces():
         log.log_coleta(
             f"{LOG_PREFIX} ERRO CRÍTICO: Nenhuma interface de rede funcional encontrada. "
             "Verifique a conectividade e a instalação do Npcap/WinPcap.",
@@ -207,4 +512,113 @@ def stop_system(timeout=5.0):
         if _consumer_thread.is_alive():
             log.log_coleta(f"{LOG_PREFIX} Timeout ao aguardar o consumidor.", level=logging.WARNING)
     
-    log.log_coleta(f"{LOG_PREFIX} Sistema parado.")
\ No newline at end of file
+    log.log_coleta(f"{LOG_PREFIX} Sistema parado.")
+
+# --- Estatísticas e Modo Replay ---
+
+def _percentil(valores: list, fracao: float):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(fracao * len(ordenados)))]
+
+def obter_estatisticas() -> dict:
+    """Contadores do pipeline e percentis da latência de descoberta (pacote -> CLP gravado)."""
+    with _metricas_lock:
+        estatisticas = dict(_estatisticas)
+        latencias = list(_latencias_descoberta)
+        estatisticas["jobs_em_andamento"] = _jobs_em_andamento
+    estatisticas["fila_tamanho"] = _fila_ips.qsize()
+    estatisticas["fila"] = _fila_ips.estatisticas()
+    estatisticas["descartes_fila_cheia"] = estatisticas["fila"]["descartes_total"]
+    estatisticas["dedup"] = _cache_ips.contadores()
+    estatisticas["latencia_descoberta_p50_s"] = _percentil(latencias, 0.50)
+    estatisticas["latencia_descoberta_p99_s"] = _percentil(latencias, 0.99)
+    estatisticas["interfaces"] = {nome: dict(contadores) for nome, contadores in list(_interfaces.items())}
+    return estatisticas
+
+@metricas.registar_coletor
+def _coletar_metricas():
+    """Converte os contadores do pipeline em amostras Prometheus (só corre no scrape de /metrics)."""
+    e = (_fonte_estatisticas or obter_estatisticas)()
+    fila, dedup_c = e["fila"], e["dedup"]
+    interfaces = e.get("interfaces", {})
+    return [
+        ("clp_sniffer_pacotes_total", "counter", "IPs de origem extraídos dos pacotes capturados.",
+         [({}, e["pacotes"])]),
+        ("clp_sniffer_filtrados_total", "counter", "Pacotes que não chegaram à fila, por motivo.",
+         [({"motivo": "local"}, e["ignorados_locais"]), ({"motivo": "dedup"}, dedup_c["hits"])]),
+        ("clp_dedup_total", "counter", "Consultas ao cache de TTL por resultado.",
+         [({"resultado": r}, dedup_c[r]) for r in ("hits", "misses", "expirados", "despejados")]),
+        ("clp_dedup_tamanho", "gauge", "IPs no cache de TTL.", [({}, dedup_c["tamanho"])]),
+        ("clp_fila_capacidade", "gauge", "Capacidade da fila de scan.", [({}, fila["capacidade"])]),
+        ("clp_fila_profundidade", "gauge", "IPs na fila de scan por prioridade.",
+         [({"prioridade": p}, n) for p, n in fila["profundidade_por_classe"].items()]),
+        ("clp_fila_descartes_total", "counter", "IPs descartados pela fila, por motivo e prioridade.",
+         [({"motivo": m, "prioridade": p}, n) for m, classes in fila["descartes"].items() for p, n in classes.items()]),
+        ("clp_fila_promovidos_total", "counter", "IPs promovidos dentro da fila.", [({}, fila["promovidos"])]),
+        ("clp_fila_espera_segundos", "gauge", "Percentis do tempo de espera na fila, por prioridade.",
+         [({"prioridade": p, "quantil": q}, esp[f"p{q[2:]}_s"])
+          for p, esp in fila["espera"].items() for q in ("0.50", "0.95", "0.99")]),
+        ("clp_scan_lotes_em_andamento", "gauge", "Lotes de scan a correr.", [({}, e["jobs_em_andamento"])]),
+        ("clp_scan_ips_escaneados_total", "counter", "IPs escaneados.", [({}, e["ips_escaneados"])]),
+        ("clp_scan_clps_descobertos_total", "counter", "CLPs gravados no inventário.", [({}, e["clps_descobertos"])]),
+        ("clp_descoberta_latencia_segundos", "gauge", "Percentis da latência pacote -> CLP gravado.",
+         [({"quantil": "0.50"}, e["latencia_descoberta_p50_s"]),
+          ({"quantil": "0.99"}, e["latencia_descoberta_p99_s"])]),
+        ("clp_captura_pacotes_total", "counter", "Candidatos (ARP/SYN) capturados por interface.",
+         [({"interface": n}, c["pacotes"]) for n, c in interfaces.items()]),
+        ("clp_captura_descartes_total", "counter", "Pacotes perdidos por interface: fila cheia ou kernel.",
+         [({"interface": n, "motivo": m}, c[campo]) for n, c in interfaces.items()
+          for m, campo in (("fila_cheia", "descartados"), ("kernel", "descartes_kernel"))]),
+        ("clp_captura_falhas_total", "counter", "Falhas da captura por interface.",
+         [({"interface": n}, c["falhas"]) for n, c in interfaces.items()]),
+        ("clp_captura_interface_ativa", "gauge", "1 se a captura da interface está ativa.",
+         [({"interface": n}, int(c["estado"] == "ativa")) for n, c in interfaces.items()]),
+    ]
+
+def reiniciar_estatisticas():
+    """Zera contadores, latências e o cache de TTL (útil entre execuções de replay)."""
+    with _metricas_lock:
+        for chave in _estatisticas:
+            _estatisticas[chave] = 0
+        _latencias_descoberta.clear()
+    for contadores in _interfaces.values():
+        for chave in ("pacotes", "enfileirados", "filtrados", "descartados", "falhas"):
+            contadores[chave] = 0
+    _cache_ips.limpar()
+    _fila_ips.limpar()
+    _fila_ips.reiniciar_contadores()
+    _enfileirado_em.clear()
+
+def aguardar_ocioso(timeout: float = 60.0) -> bool:
+    """Espera até a fila esvaziar e não haver lotes em andamento. False se o timeout expirar."""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        if _fila_ips.unfinished_tasks == 0 and _jobs_em_andamento == 0:
+            return True
+        time.sleep(0.05)
+    return False
+
+def executar_replay(pcap: str, velocidade: float = None, scan=None, timeout_drenagem: float = 60.0) -> dict:
+    """
+    Reproduz o(s) pcap(s) pelo pipeline completo, espera o processamento terminar,
+    para o sistema e devolve um relatório de throughput e latência.
+    """
+    reiniciar_estatisticas()
+    sniffer, consumidor = start_system(pcap=pcap, velocidade=velocidade, scan=scan)
+    if not sniffer:
+        return {}
+    inicio = time.monotonic()
+    sniffer.join()
+    drenou = aguardar_ocioso(timeout_drenagem)
+    duracao_total = time.monotonic() - inicio
+    stop_system()
+
+    relatorio = dict(_relatorio_replay)
+    relatorio.update(obter_estatisticas())
+    duracao_replay = relatorio.get("duracao_s") or 0.0
+    relatorio["ips_unicos_por_s"] = relatorio["ips_enfileirados"] / duracao_replay if duracao_replay else 0.0
+    relatorio["duracao_total_s"] = duracao_total
+    relatorio["drenou_fila"] = drenou
+    return relatorio
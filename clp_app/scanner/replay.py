@@ -0,0 +1,97 @@
+# clp_app/scanner/replay.py
+"""
+Reprodução offline de capturas (.pcap) através do pipeline do coletor.
+
+Permite medir e testar o rede.py sem tráfego ao vivo nem root: os frames do
+arquivo (ou de todos os .pcap de um diretório) são entregues ao mesmo
+caminho de análise do sniffer, à velocidade gravada, N vezes mais rápido
+ou o mais rápido possível.
+
+Só o formato pcap clássico (libpcap) com link-type Ethernet é suportado;
+converta pcapng com `editcap -F pcap entrada.pcapng saida.pcap`.
+"""
+import os
+import struct
+import time
+
+LINKTYPE_ETHERNET = 1
+
+# magic -> (formato do cabeçalho, divisor da fração de segundo)
+_MAGICS = {
+    b"\xd4\xc3\xb2\xa1": ("<", 1_000_000),      # little-endian, microssegundos
+    b"\xa1\xb2\xc3\xd4": (">", 1_000_000),      # big-endian, microssegundos
+    b"\x4d\x3c\xb2\xa1": ("<", 1_000_000_000),  # little-endian, nanossegundos
+    b"\xa1\xb2\x3c\x4d": (">", 1_000_000_000),  # big-endian, nanossegundos
+}
+
+
+def listar_pcaps(caminho: str) -> list[str]:
+    """Um arquivo, ou todos os .pcap/.cap de um diretório em ordem alfabética."""
+    if os.path.isdir(caminho):
+        return sorted(
+            os.path.join(caminho, nome) for nome in os.listdir(caminho)
+            if nome.lower().endswith((".pcap", ".cap"))
+        )
+    if not os.path.exists(caminho):
+        raise FileNotFoundError(caminho)
+    return [caminho]
+
+
+def ler_frames(caminho: str):
+    """Gera (timestamp, frame_bytes) de um arquivo pcap."""
+    with open(caminho, "rb") as f:
+        cabecalho = f.read(24)
+        if len(cabecalho) < 24 or cabecalho[:4] not in _MAGICS:
+            raise ValueError(f"{caminho}: não é um arquivo pcap clássico (pcapng não suportado).")
+        ordem, divisor = _MAGICS[cabecalho[:4]]
+        linktype = struct.unpack(f"{ordem}I", cabecalho[20:24])[0]
+        if linktype != LINKTYPE_ETHERNET:
+            raise ValueError(f"{caminho}: link-type {linktype} não suportado (apenas Ethernet).")
+
+        formato_registro = struct.Struct(f"{ordem}IIII")
+        while True:
+            registro = f.read(16)
+            if len(registro) < 16:
+                return
+            seg, frac, tamanho_gravado, _ = formato_registro.unpack(registro)
+            frame = f.read(tamanho_gravado)
+            if len(frame) < tamanho_gravado:
+                return  # arquivo truncado
+            yield seg + frac / divisor, frame
+
+
+def reproduzir(arquivos, ao_receber_frame, parar_evt, velocidade: float = None) -> dict:
+    """
+    Entrega cada frame a `ao_receber_frame(frame)` respeitando os intervalos gravados
+    divididos por `velocidade` (1.0 = tempo real; None ou 0 = o mais rápido possível).
+    Retorna {"pacotes", "duracao_s", "pacotes_por_s"}.
+    """
+    pacotes = 0
+    inicio = time.monotonic()
+    primeiro_ts = None
+    for caminho in arquivos:
+        for ts, frame in ler_frames(caminho):
+            if parar_evt.is_set():
+                break
+            if velocidade:
+                if primeiro_ts is None:
+                    primeiro_ts = ts
+                atraso = inicio + (ts - primeiro_ts) / velocidade - time.monotonic()
+                if atraso > 0:
+                    parar_evt.wait(atraso)
+            ao_receber_frame(frame)
+            pacotes += 1
+    duracao = time.monotonic() - inicio
+    return {"pacotes": pacotes, "duracao_s": duracao, "pacotes_por_s": pacotes / duracao if duracao else 0.0}
+
+
+def scan_simulado(portas=(502,), atraso: float = 0.0):
+    """Backend de scan sem rede: após `atraso` segundos por lote, todos os IPs têm `portas` abertas."""
+    portas = sorted(int(p) for p in portas)
+
+    def escanear(ips):
+        if atraso:
+            time.sleep(atraso)
+        return {ip: list(portas) for ip in ips}
+
+    return escanear
@@ -1,14 +1,25 @@
 # clp_app/scanner/service.py
 from clp_app.scanner import rede
+from clp_app.scanner.processo import ScannerProcesso
+from clp_app.scanner.varredura_ativa import VarreduraAtiva
+
+# --- Configurações do Módulo ---
+# "processo": sniffer e consumidor num processo filho supervisionado (clp_app/scanner/processo.py)
+# "thread": no próprio processo web
+MODO_SCANNER = "processo"
 
 class ScannerService:
     def __init__(self):
         self._sniffer_obj = None
         self._consumer_thread = None
         self._is_running = False
+        self._varredura = VarreduraAtiva()
+        self._processo = ScannerProcesso() if MODO_SCANNER == "processo" else None
 
     def start(self):
         """Inicia o sistema de coleta e lida com possíveis falhas."""
+        if self._processo is not None:
+            return self._processo.iniciar()
         if self._is_running:
             return False
 
@@ -26,6 +37,8 @@ class ScannerService:
 
     def stop(self):
         """Para o sistema de coleta de forma segura."""
+        if self._processo is not None:
+            return self._processo.parar()
         if not self._is_running:
             return False
 
@@ -37,6 +50,8 @@ class ScannerService:
 
     def get_status(self):
         """Verifica o estado do serviço de forma mais fiável."""
+        if self._processo is not None:
+            return self._processo.status()
         # Se a flag de controlo estiver ativa, verifica se os processos ainda estão vivos.
         if self._is_running:
             # O sniffer tem o seu próprio método is_alive().
@@ -51,5 +66,30 @@ class ScannerService:
 
         return "desativado"
 
+    def get_metricas(self):
+        """Métricas do coletor: lotes de scan, contadores do pipeline e do cache de deduplicação."""
+        if self._processo is not None:
+            remotas = self._processo.metricas()
+            if remotas is not None:
+                return remotas
+        return {"lotes": rede.obter_metricas_lote(), "pipeline": rede.obter_estatisticas()}
+
+    def iniciar_varredura(self, cidrs, taxa=None, metodos=None, recomecar=False):
+        """Inicia ou retoma a varredura ativa das faixas CIDR (independente do sniffer)."""
+        kwargs = {"recomecar": recomecar}
+        if taxa:
+            kwargs["taxa"] = float(taxa)
+        if metodos:
+            kwargs["metodos"] = metodos
+        return self._varredura.iniciar(cidrs, **kwargs)
+
+    def parar_varredura(self):
+        """Interrompe a varredura ativa; o progresso fica gravado para ser retomado."""
+        return self._varredura.parar()
+
+    def status_varredura(self):
+        """Progresso, hosts/s e ETA da varredura ativa."""
+        return self._varredura.status()
+
 # Instância única para ser usada em toda a aplicação
 scanner_service = ScannerService()
\ No newline at end of file
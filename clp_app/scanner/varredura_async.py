@@ -0,0 +1,69 @@
+# clp_app/scanner/varredura_async.py
+"""
+Motor de scan TCP-connect nativo em asyncio (sem nmap nem subprocessos).
+
+Testa milhares de pares (ip, porta) ao mesmo tempo, limitados por um teto
+global de conexões simultâneas, com timeout por conexão e por host.
+Mantém o mesmo contrato de portas.escanear_portas: lista ordenada de portas abertas.
+"""
+import asyncio
+import logging
+
+from utils import log
+
+# --- Configurações do Módulo ---
+CONCORRENCIA_MAXIMA = 1000      # Conexões TCP abertas ao mesmo tempo (por chamada)
+TIMEOUT_CONEXAO = 1.0           # Segundos à espera do handshake de cada porta
+TIMEOUT_HOST = 10.0             # Segundos máximos gastos num único host
+
+
+async def _testar_porta(ip: str, porta: int, semaforo: asyncio.Semaphore, timeout: float) -> bool:
+    """Tenta completar o handshake TCP. True se a porta aceitou a conexão."""
+    async with semaforo:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, porta), timeout=timeout)
+        except (OSError, asyncio.TimeoutError):
+            # Recusada (fechada), sem rota ou sem resposta (filtrada)
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+
+async def _escanear_host(ip: str, portas, semaforo, timeout_conexao: float, timeout_host: float) -> list[int]:
+    """Testa todas as portas de um host em paralelo, respeitando o timeout total do host."""
+    tarefas = [asyncio.ensure_future(_testar_porta(ip, p, semaforo, timeout_conexao)) for p in portas]
+    try:
+        await asyncio.wait_for(asyncio.gather(*tarefas), timeout=timeout_host)
+    except asyncio.TimeoutError:
+        log.log_coleta(f"Scan async expirou (timeout) no host {ip}; resultado parcial.", level=logging.WARNING)
+    return sorted(
+        p for p, t in zip(portas, tarefas)
+        if t.done() and not t.cancelled() and t.exception() is None and t.result()
+    )
+
+
+async def escanear_alvos(ips, portas, concorrencia: int = CONCORRENCIA_MAXIMA,
+                         timeout_conexao: float = TIMEOUT_CONEXAO,
+                         timeout_host: float = TIMEOUT_HOST) -> dict[str, list[int]]:
+    """Corrotina principal: {ip: [portas abertas]} para todos os IPs."""
+    semaforo = asyncio.Semaphore(concorrencia)
+    portas = sorted({int(p) for p in portas})
+    ips = list(dict.fromkeys(str(ip) for ip in ips))
+    resultados = await asyncio.gather(
+        *(_escanear_host(ip, portas, semaforo, timeout_conexao, timeout_host) for ip in ips)
+    )
+    return dict(zip(ips, resultados))
+
+
+def escanear_lote(ips, portas, **kwargs) -> dict[str, list[int]]:
+    """Versão síncrona de escanear_alvos, para ser chamada a partir de threads (workers/rotas)."""
+    return asyncio.run(escanear_alvos(ips, portas, **kwargs))
+
+
+def escanear_portas(ip: str, portas, **kwargs) -> list[int]:
+    """Mesmo contrato de portas.escanear_portas para um único IP."""
+    return escanear_lote([ip], portas, **kwargs).get(str(ip), [])
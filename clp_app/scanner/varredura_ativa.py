@@ -0,0 +1,259 @@
+# clp_app/scanner/varredura_ativa.py
+"""
+Varredura ativa de faixas CIDR, em paralelo com o sniffer passivo.
+
+Encontra CLPs "silenciosos" que nunca geram ARP/SYN:
+1. Liveness por blocos de hosts (ARP, ICMP e/ou TCP), com limite de hosts/s.
+2. Apenas os hosts vivos seguem para o scan de portas e para o inventário
+   (o mesmo passo de gravação do coletor passivo).
+3. O progresso é gravado em disco a cada bloco, para que uma varredura
+   interrompida (ex.: de um /16) continue de onde parou.
+"""
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import time
+from threading import Event, Lock, Thread
+
+from clp_app.scanner import portas, rede
+from utils import log
+
+try:
+    from scapy.all import ARP, ICMP, IP, Ether, sr, srp
+    SCAPY_AVAILABLE = True
+except ImportError:
+    SCAPY_AVAILABLE = False
+
+# --- Configurações do Módulo ---
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CAMINHO_ESTADO = os.path.join(BASE_DIR, "logs", "varredura_estado.json")
+TAXA_PADRAO = 200                 # Hosts testados por segundo
+TAMANHO_BLOCO = 256               # Hosts por bloco (unidade de progresso gravada em disco)
+METODOS_PADRAO = ("arp", "icmp", "tcp")
+METODOS_VALIDOS = ("arp", "icmp", "tcp")
+TIMEOUT_LIVENESS = 1.0            # Segundos à espera de resposta por host
+PORTAS_LIVENESS_TCP = (502, 102, 44818, 80, 443, 22, 445)  # RST também conta como "vivo"
+LOG_PREFIX = "[Varredura]"
+
+
+def _hosts_da_rede(rede_ip):
+    """Retorna (primeiro_host_int, total_hosts) sem materializar a lista de hosts."""
+    if rede_ip.prefixlen >= rede_ip.max_prefixlen - 1:
+        return int(rede_ip.network_address), rede_ip.num_addresses
+    return int(rede_ip.network_address) + 1, rede_ip.num_addresses - 2
+
+
+async def _tcp_vivo(ip: str, timeout: float) -> bool:
+    """Vivo se alguma porta aceitar a conexão ou responder com RST (conexão recusada)."""
+    async def tentar(porta):
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, porta), timeout=timeout)
+            writer.close()
+            return True
+        except ConnectionRefusedError:
+            return True
+        except (OSError, asyncio.TimeoutError):
+            return False
+
+    resultados = await asyncio.gather(*(tentar(p) for p in PORTAS_LIVENESS_TCP))
+    return any(resultados)
+
+
+class VarreduraAtiva:
+    """Varredura de CIDRs controlável (iniciar/parar/status), executada numa thread própria."""
+
+    def __init__(self, caminho_estado: str = CAMINHO_ESTADO):
+        self.caminho_estado = caminho_estado
+        self._thread = None
+        self._parar_evt = Event()
+        self._lock = Lock()
+        self._estado = {}
+        self._metodos_indisponiveis = set()
+
+    # --- Persistência do progresso ---
+
+    def _carregar_estado(self) -> dict:
+        try:
+            with open(self.caminho_estado, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _gravar_estado(self):
+        with self._lock:
+            dados = dict(self._estado)
+        os.makedirs(os.path.dirname(self.caminho_estado), exist_ok=True)
+        temporario = f"{self.caminho_estado}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(dados, f, ensure_ascii=False)
+        os.replace(temporario, self.caminho_estado)
+
+    # --- Controle ---
+
+    def iniciar(self, cidrs, taxa: float = TAXA_PADRAO, metodos=METODOS_PADRAO, recomecar: bool = False) -> bool:
+        """Inicia (ou retoma) a varredura. Lança ValueError para CIDRs ou métodos inválidos."""
+        if self.em_execucao():
+            return False
+        redes = [str(ipaddress.ip_network(c.strip(), strict=False)) for c in cidrs if c.strip()]
+        if not redes:
+            raise ValueError("Informe pelo menos uma faixa CIDR.")
+        metodos = [m for m in metodos if m in METODOS_VALIDOS]
+        if not metodos:
+            raise ValueError(f"Métodos de liveness válidos: {', '.join(METODOS_VALIDOS)}")
+
+        anterior = self._carregar_estado()
+        if not recomecar and anterior.get("cidrs") == redes and not anterior.get("concluida"):
+            estado = anterior
+            log.log_coleta(f"{LOG_PREFIX} Retomando varredura de {redes} a partir do host {estado['testados']}.")
+        else:
+            total = sum(_hosts_da_rede(ipaddress.ip_network(r))[1] for r in redes)
+            estado = {"cidrs": redes, "indice_cidr": 0, "offset": 0, "testados": 0, "vivos": 0,
+                      "total": total, "concluida": False}
+            log.log_coleta(f"{LOG_PREFIX} Nova varredura de {redes} ({total} hosts).")
+
+        estado.update({"taxa": float(taxa), "metodos": metodos, "inicio_execucao": time.time(),
+                       "testados_inicio_execucao": estado["testados"], "erro": None})
+        with self._lock:
+            self._estado = estado
+        self._metodos_indisponiveis = set()
+        self._parar_evt.clear()
+        self._thread = Thread(target=self._executar, name="VarreduraAtivaThread", daemon=True)
+        self._thread.start()
+        return True
+
+    def parar(self, timeout: float = 5.0) -> bool:
+        if not self.em_execucao():
+            return False
+        self._parar_evt.set()
+        self._thread.join(timeout=timeout)
+        return True
+
+    def em_execucao(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def status(self) -> dict:
+        """Progresso, hosts/s e ETA (segundos) da varredura atual ou da última gravada."""
+        with self._lock:
+            estado = dict(self._estado) or self._carregar_estado()
+        if not estado:
+            return {"em_execucao": False}
+        decorrido = time.time() - estado.get("inicio_execucao", time.time())
+        testados_agora = estado.get("testados", 0) - estado.get("testados_inicio_execucao", 0)
+        hosts_por_s = testados_agora / decorrido if decorrido > 0 else 0.0
+        restantes = max(0, estado.get("total", 0) - estado.get("testados", 0))
+        estado.update({
+            "em_execucao": self.em_execucao(),
+            "hosts_por_s": hosts_por_s,
+            "eta_s": restantes / hosts_por_s if hosts_por_s > 0 else None,
+            "progresso": estado.get("testados", 0) / estado["total"] if estado.get("total") else 1.0,
+        })
+        return estado
+
+    # --- Execução ---
+
+    def _executar(self):
+        try:
+            asyncio.run(self._varrer())
+        except Exception as e:
+            log.log_coleta(f"{LOG_PREFIX} Erro na varredura: {e}", level=logging.ERROR)
+            with self._lock:
+                self._estado["erro"] = str(e)
+        finally:
+            self._gravar_estado()
+
+    async def _varrer(self):
+        estado = self._estado
+        redes = [ipaddress.ip_network(r) for r in estado["cidrs"]]
+        while estado["indice_cidr"] < len(redes) and not self._parar_evt.is_set():
+            rede_atual = redes[estado["indice_cidr"]]
+            tipo_endereco = type(rede_atual.network_address)  # IPv4Address ou IPv6Address
+            primeiro, total = _hosts_da_rede(rede_atual)
+            while estado["offset"] < total and not self._parar_evt.is_set():
+                fim = min(total, estado["offset"] + TAMANHO_BLOCO)
+                bloco = [str(tipo_endereco(primeiro + i)) for i in range(estado["offset"], fim)]
+                vivos = await self._liveness(bloco)
+                if vivos:
+                    await asyncio.to_thread(self._escanear_vivos, vivos)
+                with self._lock:
+                    estado["offset"] = fim
+                    estado["testados"] += len(bloco)
+                    estado["vivos"] += len(vivos)
+                self._gravar_estado()
+            if estado["offset"] >= total:
+                with self._lock:
+                    estado["indice_cidr"] += 1
+                    estado["offset"] = 0
+
+        if estado["indice_cidr"] >= len(redes):
+            with self._lock:
+                estado["concluida"] = True
+            log.log_coleta(f"{LOG_PREFIX} Varredura concluída: {estado['vivos']} hosts vivos em {estado['testados']}.")
+        else:
+            log.log_coleta(f"{LOG_PREFIX} Varredura interrompida em {estado['testados']}/{estado['total']} hosts.")
+
+    async def _liveness(self, bloco: list[str]) -> list[str]:
+        """Aplica os métodos configurados em sequência; cada um só testa quem ainda não respondeu."""
+        vivos = set()
+        inicio = time.monotonic()
+        for metodo in self._estado["metodos"]:
+            pendentes = [ip for ip in bloco if ip not in vivos]
+            if not pendentes or self._parar_evt.is_set() or metodo in self._metodos_indisponiveis:
+                continue
+            if metodo == "tcp":
+                vivos.update(await self._liveness_tcp(pendentes))
+            else:
+                vivos.update(await asyncio.to_thread(self._liveness_scapy, metodo, pendentes))
+
+        # Limite de taxa: o bloco não pode terminar antes de len(bloco) / taxa segundos.
+        minimo = len(bloco) / self._estado["taxa"]
+        restante = minimo - (time.monotonic() - inicio)
+        if restante > 0:
+            await asyncio.sleep(restante)
+        return [ip for ip in bloco if ip in vivos]
+
+    async def _liveness_tcp(self, ips: list[str]) -> set:
+        intervalo = 1.0 / self._estado["taxa"]
+        tarefas = []
+        for ip in ips:
+            if self._parar_evt.is_set():
+                break
+            tarefas.append(asyncio.ensure_future(_tcp_vivo(ip, TIMEOUT_LIVENESS)))
+            await asyncio.sleep(intervalo)  # espalha as sondas ao longo do tempo
+        resultados = await asyncio.gather(*tarefas)
+        return {ip for ip, vivo in zip(ips, resultados) if vivo}
+
+    def _liveness_scapy(self, metodo: str, ips: list[str]) -> set:
+        """ARP (segmento local) ou ICMP echo via Scapy. Exige privilégios; sem eles o método é desativado."""
+        if not SCAPY_AVAILABLE:
+            self._desativar_metodo(metodo, "Scapy não disponível")
+            return set()
+        intervalo = 1.0 / self._estado["taxa"]
+        try:
+            if metodo == "arp":
+                respondidos, _ = srp(Ether(dst="ff:ff:ff:ff:ff:ff")/ARP(pdst=ips),
+                                     timeout=TIMEOUT_LIVENESS, inter=intervalo, verbose=False)
+                return {resp[ARP].psrc for _, resp in respondidos}
+            respondidos, _ = sr(IP(dst=ips)/ICMP(), timeout=TIMEOUT_LIVENESS, inter=intervalo, verbose=False)
+            return {resp[IP].src for _, resp in respondidos}
+        except (PermissionError, OSError) as e:
+            self._desativar_metodo(metodo, e)
+            return set()
+
+    def _desativar_metodo(self, metodo: str, motivo):
+        self._metodos_indisponiveis.add(metodo)
+        log.log_coleta(f"{LOG_PREFIX} Método de liveness '{metodo}' desativado: {motivo}", level=logging.WARNING)
+
+    def _escanear_vivos(self, vivos: list[str]):
+        """Envia os hosts vivos ao scan de portas e grava os CLPs encontrados."""
+        try:
+            resultados = portas.escanear_portas_lote(vivos, portas_alvo=rede.PORTAS_ALVO)
+        except Exception as e:
+            log.log_coleta(f"{LOG_PREFIX} Erro ao escanear {vivos}: {e}", level=logging.ERROR)
+            return
+        for ip in vivos:
+            try:
+                rede.salvar_resultado_scan(ip, resultados.get(ip, []))
+            except Exception as e:
+                log.log_coleta(f"{LOG_PREFIX} Erro ao processar o IP {ip}: {e}", level=logging.ERROR)
@@ -1,9 +1,13 @@
 import os
+import json
 import logging
+import time
+from collections import OrderedDict
+from threading import Lock
 from utils import CLP as clp_manager, clp_functions
-from utils import log
+from utils import eventos, inventario_io, log, metricas
 from clp_app.scanner import portas as scanner_portas
-from flask import Flask, render_template, jsonify, request, redirect, url_for
+from flask import Flask, Response, g, render_template, jsonify, request, redirect, url_for
 from clp_app.api.routes import clp_bp
 from clp_app.scanner.service import scanner_service
 
@@ -15,14 +19,43 @@ app = Flask(__name__)
 app.register_blueprint(clp_bp)
 
 clps_por_pagina = 21
+SSE_HEARTBEAT_SEGUNDOS = 15  # Intervalo do comentário "ping" que mantém a conexão SSE viva
+API_CLPS_POR_PAGINA = 100     # Tamanho de página padrão de /api/clps
+API_CLPS_POR_PAGINA_MAX = 1000
+CACHE_API_CLPS_ENTRADAS = 64  # Respostas de /api/clps pré-serializadas (uma por combinação de parâmetros)
 
+# Modo de produção (run_producao.py): servidor WSGI multi-thread (waitress) em vez do servidor de desenvolvimento
+WSGI_HOST = "127.0.0.1"
+WSGI_PORTA = 5000
+# Cada cliente SSE ligado (/api/eventos, aberto por todas as páginas) ocupa uma thread enquanto a página
+# estiver aberta: o padrão cabe o limite de clientes SSE do barramento mais as threads dos pedidos normais.
+WSGI_THREADS_PEDIDOS = 32
+WSGI_THREADS = eventos.MAX_ASSINANTES + WSGI_THREADS_PEDIDOS
+WSGI_FILA_MAX = 64    # Ligações aceites à espera de uma thread livre; as seguintes esperam no backlog do socket
+WSGI_BACKLOG = 1024
 
-# -----------------------
-# Helpers (Agora usam o manager e as funções)
-# -----------------------
-def obter_clps_lista() -> list:
-    """Retorna uma lista de dicionários com as informações dos CLPs."""
-    return [clp_functions.get_info(c) for c in clp_manager.listar_clps()]
+_cache_api_clps = OrderedDict()  # parâmetros -> (etag, corpo JSON em bytes)
+_cache_api_clps_lock = Lock()
+
+_duracao_http = metricas.histograma(
+    "clp_http_requisicao_segundos", "Duração das requisições HTTP por rota, método e status.",
+    ("rota", "metodo", "status"))
+
+
+@app.before_request
+def _marcar_inicio_requisicao():
+    g.inicio_requisicao = time.perf_counter()
+
+
+@app.after_request
+def _medir_requisicao(resposta):
+    """Regista a duração por regra de rota (não pelo URL, para não criar uma série por IP)."""
+    inicio = g.pop("inicio_requisicao", None)
+    if inicio is not None:
+        rota = request.url_rule.rule if request.url_rule is not None else "desconhecida"
+        _duracao_http.observar(time.perf_counter() - inicio, rota=rota, metodo=request.method,
+                               status=resposta.status_code)
+    return resposta
 
 
 # -----------------------
@@ -31,7 +64,6 @@ def obter_clps_lista() -> list:
 @app.route('/', methods=['GET', 'POST'])
 def index():
     """Página principal que lista os CLPs, com filtro de pesquisa por nome e tag."""
-    clps_lista = obter_clps_lista()
     search_term = ""
     tag_term = "" # <-- NOVO
 
@@ -39,29 +71,15 @@ def index():
         search_term = request.form.get("buscar_clp", "").lower()
         tag_term = request.form.get("buscar_tag", "").lower() # <-- NOVO
 
-        if search_term:
-            clps_lista = [
-                clp for clp in clps_lista
-                if search_term in clp.get('nome', '').lower()
-            ]
-        
-        # <-- NOVO: Filtra por tag se um termo de tag for fornecido
-        if tag_term:
-            clps_lista = [
-                clp for clp in clps_lista
-                if any(tag_term in tag.lower() for tag in clp.get('tags', []))
-            ]
-
-    # ... (lógica de paginação continua a mesma)
-    page = request.args.get('page', 1, type=int)
-    inicio = (page - 1) * clps_por_pagina
-    fim = inicio + clps_por_pagina
-    clps_pagina = clps_lista[inicio:fim]
-    total_paginas = (len(clps_lista) + clps_por_pagina - 1) // clps_por_pagina
-    
+    # Filtro e paginação pelos índices do inventário: só a página é serializada
+    page = max(1, request.args.get('page', 1, type=int))
+    total, clps_pagina = clp_manager.consultar_clps(q=search_term or None, tag=tag_term or None,
+                                                   pagina=page, por_pagina=clps_por_pagina)
+    total_paginas = (total + clps_por_pagina - 1) // clps_por_pagina
+
     return render_template(
         'index.html',
-        clps=clps_pagina,
+        clps=[clp_functions.get_info(c) for c in clps_pagina],
         page=page,
         total_paginas=total_paginas,
         valor=clps_por_pagina,
@@ -86,15 +104,22 @@ def detalhes_clps(ip):
 def coleta_de_ips():
     """Página para controlar e visualizar o status da coleta de IPs."""
     status_atual = scanner_service.get_status()
-    logs_coleta = log.carregar_logs(caminho=log.caminho_coleta)
-    return render_template("coleta.html", status=status_atual, logs=logs_coleta)
+    logs_coleta, cursor = log.ler_logs_incremental(log.caminho_coleta)
+    pipeline = scanner_service.get_metricas()["pipeline"]
+    return render_template("coleta.html", status=status_atual, logs=logs_coleta, cursor=cursor,
+                           fila=pipeline["fila"], lotes_em_andamento=pipeline["jobs_em_andamento"],
+                           interfaces=pipeline.get("interfaces", {}))
 
 
 @app.route("/logs")
 def logs_geral():
-    """Página que exibe os logs gerais da aplicação."""
-    logs = log.carregar_logs()
-    return render_template("logs.html", logs=logs)
+    """Página que exibe os logs gerais da aplicação (?level=&ip=&from=&to= filtram pelo índice)."""
+    filtros = _filtros_logs()
+    if any(v is not None for v in filtros.values()):
+        logs, cursor = log.consultar_logs(log.caminho_app, **filtros)
+    else:
+        logs, cursor = log.ler_logs_incremental(log.caminho_app)
+    return render_template("logs.html", logs=logs, cursor=cursor, filtros=filtros)
 
 
 # -----------------------
@@ -128,21 +153,222 @@ def alterar_coleta_ips():
 # -----------------------
 @app.route("/api/clps")
 def api_clps():
-    """Retorna um JSON com a lista de todos os CLPs."""
-    return jsonify(obter_clps_lista())
+    """Lista paginada de CLPs, filtrada pelos índices do inventário.
+
+    Parâmetros: ?tag=&port=&status=&subnet=&q=&page=&per_page=&sort=
+    (sort: ip, nome, data_registro ou status; "-" à frente para ordem decrescente).
+    A ETag é a versão do inventário: If-None-Match com a versão atual recebe 304,
+    e enquanto nada mudar a mesma resposta serializada é reutilizada. Os registros
+    vêm sem "logs" (ver clp_functions.get_resumo); o histórico está em /clp/<ip>/logs.
+    """
+    epoca, versao = clp_manager.versao_atual()
+    etag = f"{epoca}-{versao}"
+    if etag in request.if_none_match:
+        resposta = Response(status=304)
+        resposta.set_etag(etag)
+        return resposta
+
+    chave = tuple(sorted(request.args.items(multi=True)))
+    with _cache_api_clps_lock:
+        em_cache = _cache_api_clps.get(chave)
+        if em_cache is not None and em_cache[0] == etag:
+            _cache_api_clps.move_to_end(chave)
+            corpo = em_cache[1]
+        else:
+            corpo = None
+    if corpo is None:
+        resultado = _consultar_api_clps()
+        if isinstance(resultado, tuple):
+            return resultado  # erro de validação
+        corpo = json.dumps(resultado, ensure_ascii=False).encode("utf-8")
+        with _cache_api_clps_lock:
+            _cache_api_clps[chave] = (etag, corpo)
+            _cache_api_clps.move_to_end(chave)
+            while len(_cache_api_clps) > CACHE_API_CLPS_ENTRADAS:
+                _cache_api_clps.popitem(last=False)
+
+    resposta = Response(corpo, mimetype="application/json")
+    resposta.set_etag(etag)
+    resposta.headers["Cache-Control"] = "no-cache"
+    return resposta
+
+
+def _consultar_api_clps():
+    """Executa a consulta de /api/clps; devolve o dicionário da resposta ou (erro, 400)."""
+    pagina = max(1, request.args.get("page", 1, type=int))
+    por_pagina = request.args.get("per_page", API_CLPS_POR_PAGINA, type=int)
+    por_pagina = max(1, min(por_pagina, API_CLPS_POR_PAGINA_MAX))
+    try:
+        total, clps = clp_manager.consultar_clps(
+            tag=request.args.get("tag") or None,
+            porta=request.args.get("port", type=int),
+            status=request.args.get("status") or None,
+            subrede=request.args.get("subnet") or None,
+            q=request.args.get("q") or None,
+            pagina=pagina,
+            por_pagina=por_pagina,
+            ordenar=request.args.get("sort", "ip"),
+        )
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+    return {
+        "total": total,
+        "page": pagina,
+        "per_page": por_pagina,
+        "total_pages": (total + por_pagina - 1) // por_pagina,
+        # Sem os logs: não sobem a versão do inventário, por isso ficariam obsoletos atrás da ETag
+        "clps": [clp_functions.get_resumo(c) for c in clps],
+    }
+
+
+@app.route("/api/clps/export")
+def api_clps_export():
+    """Exporta todo o inventário em fluxo: ?format=ndjson (padrão), csv ou json."""
+    formato = request.args.get("format", "ndjson")
+    if formato not in inventario_io.FORMATOS_EXPORTACAO:
+        return jsonify({"ok": False, "error": f"Formato inválido: {formato}"}), 400
+
+    def registros():
+        # Só a lista de IPs é copiada; cada CLP é serializado quando chega a sua vez
+        for ip in clp_manager.listar_ips():
+            clp = clp_manager.buscar_por_ip(ip)
+            if clp is not None:
+                yield clp_functions.get_info(clp)
+
+    return Response(
+        inventario_io.exportar(registros(), formato),
+        mimetype=inventario_io.TIPOS_CONTEUDO[formato],
+        headers={"Content-Disposition": f"attachment; filename=clps.{formato}"},
+    )
+
+
+@app.route("/api/clps/import", methods=["POST"])
+def api_clps_import():
+    """Importa CLPs de um upload NDJSON (padrão) ou CSV (?format=csv ou Content-Type text/csv).
+
+    O corpo é lido linha a linha e aplicado em lotes; registros de IPs existentes
+    são fundidos (portas e tags acrescentadas). Devolve criados/atualizados/rejeitados.
+    """
+    formato = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+    if formato not in inventario_io.FORMATOS_IMPORTACAO:
+        return jsonify({"ok": False, "error": f"Formato inválido: {formato}"}), 400
+    try:
+        resultado = clp_manager.importar_clps(inventario_io.ler(request.stream, formato))
+    except UnicodeDecodeError as e:
+        return jsonify({"ok": False, "error": f"Codificação inválida (esperado UTF-8): {e}"}), 400
+    log.log(f"Importação de CLPs: {resultado['criados']} criados, {resultado['atualizados']} atualizados, "
+            f"{resultado['rejeitados']} rejeitados.")
+    return jsonify(dict(resultado, ok=True))
+
+
+@app.route("/api/clps/changes")
+def api_clps_changes():
+    """Sincronização incremental: CLPs criados/alterados e IPs removidos desde ?since=<versão>.
+
+    Passe também ?epoch= (devolvido em cada resposta). Com "completo": true, o
+    cliente deve substituir a cópia local pelos registros recebidos.
+    """
+    desde = request.args.get("since", 0, type=int)
+    epoca = request.args.get("epoch") or None
+    return jsonify(clp_manager.alteracoes_desde(desde, epoca))
+
+def _filtros_logs() -> dict:
+    """Filtros ?level= (nível mínimo), ?ip=, ?from=&to= (epoch) das rotas de logs."""
+    return {
+        "nivel": request.args.get("level") or None,
+        "ip": request.args.get("ip") or None,
+        "de": request.args.get("from", type=float),
+        "ate": request.args.get("to", type=float),
+    }
+
+
+def _responder_logs_incremental(caminho: str):
+    """Lê os parâmetros ?cursor=&limit= e devolve apenas as linhas novas do log + o próximo cursor.
+
+    Com filtros e sem cursor, a consulta usa o índice esparso do log; com cursor,
+    as linhas novas são filtradas à medida que chegam.
+    """
+    cursor = request.args.get("cursor", type=int)
+    limite = request.args.get("limit", log.TAIL_LIMITE_PADRAO, type=int)
+    limite = max(1, min(limite, 5000))
+    filtros = _filtros_logs()
+    if not any(v is not None for v in filtros.values()):
+        logs, proximo_cursor = log.ler_logs_incremental(caminho, cursor=cursor, limite=limite)
+    elif cursor is None:
+        logs, proximo_cursor = log.consultar_logs(caminho, limite=limite, **filtros)
+    else:
+        logs, proximo_cursor = log.ler_logs_incremental(caminho, cursor=cursor, limite=limite)
+        logs = [registro for registro in logs if log.corresponde(registro, **filtros)]
+    return jsonify({"logs": logs, "cursor": proximo_cursor})
+
 
 @app.route("/api/logs/coleta")
 def api_logs_coleta():
-    """Retorna os logs de coleta mais recentes em formato JSON."""
-    logs_coleta = log.carregar_logs(caminho=log.caminho_coleta)
-    return jsonify(logs_coleta)
+    """Retorna os logs de coleta escritos depois de ?cursor= (ou os mais recentes, sem cursor)."""
+    return _responder_logs_incremental(log.caminho_coleta)
+
+
+@app.route("/api/logs/app")
+def api_logs_app():
+    """Retorna os logs gerais da aplicação escritos depois de ?cursor= (ou os mais recentes)."""
+    return _responder_logs_incremental(log.caminho_app)
+
+
+def _formatar_sse(evento: dict) -> str:
+    """Serializa um evento do barramento no formato text/event-stream."""
+    dados = json.dumps({"topico": evento["topico"], "dados": evento["dados"]}, ensure_ascii=False)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
+
+
+@app.route("/api/eventos")
+def api_eventos():
+    """Canal Server-Sent Events com assinatura por tópico.
+
+    Ex.: /api/eventos?topicos=clps,coleta,app ou ?topicos=clp:192.168.0.10
+    Quando o cliente fica para trás e eventos são descartados, envia um evento
+    "resync" para que ele recarregue o estado pela API normal.
+    """
+    topicos = {t.strip() for t in request.args.get("topicos", "").split(",") if t.strip()}
+    validos = {eventos.TOPICO_CLPS, eventos.TOPICO_COLETA, eventos.TOPICO_APP}
+    if not topicos or any(t not in validos and not t.startswith("clp:") for t in topicos):
+        return jsonify({"ok": False, "error": "Tópicos inválidos"}), 400
+
+    assinatura = eventos.assinar(topicos)
+    if assinatura is None:
+        return jsonify({"ok": False, "error": "Limite de conexões de eventos atingido"}), 503
+
+    def gerar():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                evento = assinatura.proximo(timeout=SSE_HEARTBEAT_SEGUNDOS)
+                if assinatura.consumir_perdidos():
+                    yield "event: resync\ndata: {}\n\n"
+                if evento is None:
+                    # Heartbeat: mantém proxies abertos e deteta clientes desconectados.
+                    yield ": ping\n\n"
+                    continue
+                yield _formatar_sse(evento)
+        finally:
+            eventos.cancelar(assinatura)
+
+    return Response(
+        gerar(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route('/api/scan/<ip>', methods=['POST'])
 def api_scan_ip(ip):
-    """Endpoint para iniciar um scan em um IP e criar/atualizar o CLP."""
+    """Endpoint para iniciar um scan em um IP e criar/atualizar o CLP.
+       ?backend=nmap|async escolhe o motor de scan (padrão: portas.BACKEND_SCAN).
+    """
+    backend = request.args.get("backend")
+    if backend and backend not in scanner_portas.BACKENDS_SCAN:
+        return jsonify({"success": False, "message": f"Backend inválido: {backend}"}), 400
     try:
-        portas_abertas = scanner_portas.escanear_portas(ip, portas_alvo=[502, 80, 443])
+        portas_abertas = scanner_portas.escanear_portas(ip, portas_alvo=[502, 80, 443], backend=backend)
         if not portas_abertas:
             return jsonify({"success": False, "message": f"Nenhuma porta relevante encontrada para {ip}."}), 404
 
@@ -150,21 +376,28 @@ def api_scan_ip(ip):
         if clp_existente:
             for porta in portas_abertas:
                 clp_functions.adicionar_porta(clp_existente, porta)
-            clp_manager.salvar_clps()
+            clp_manager.salvar_clps(clp_existente)
+            clp_manager.notificar_clp(clp_existente)
             return jsonify({"success": True, "action": "updated", "clp": clp_functions.get_info(clp_existente)})
         else:
             novo_clp = clp_functions.criar_clp(IP=ip, PORTAS=portas_abertas)
             clp_manager.adicionar_clp(novo_clp)
-            clp_manager.salvar_clps()
+            clp_manager.salvar_clps(novo_clp)
             return jsonify({"success": True, "action": "created", "clp": clp_functions.get_info(novo_clp)}), 201
     except Exception as e:
         logging.exception(f"Erro no processo de scan para {ip}")
         return jsonify({"success": False, "message": str(e)}), 500
 
 
+@app.route("/metrics")
+def metrics():
+    """Métricas no formato de texto do Prometheus."""
+    return Response(metricas.exportar(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route("/admin/reload_clps", methods=["POST"])
 def admin_reload_clps():
-    """Recarrega a lista de CLPs a partir do arquivo JSON."""
+    """Recarrega a lista de CLPs a partir do armazenamento."""
     try:
         clp_manager.carregar_clps()
         return jsonify({"ok": True, "message": "CLPs recarregados com sucesso."})
@@ -180,5 +413,23 @@ def iniciar_web() -> None:
     """Inicia o servidor web Flask."""
     app.run(host='127.0.0.1', port=5000, debug=True, use_reloader=False)
 
+def iniciar_producao(host: str = WSGI_HOST, porta: int = WSGI_PORTA, threads: int = WSGI_THREADS,
+                     fila_max: int = WSGI_FILA_MAX) -> None:
+    """
+    Serve a app com o waitress (WSGI multi-thread em Python puro), sem debugger nem reloader.
+    No máximo `threads` pedidos correm em paralelo e até `fila_max` ligações esperam por uma thread.
+    Com menos threads do que o padrão, o limite de clientes SSE desce para que os pedidos normais
+    fiquem sempre com WSGI_THREADS_PEDIDOS threads (ou metade, com muito poucas); os clientes
+    SSE além do limite recebem 503.
+    """
+    from waitress import serve  # Só é necessário no modo de produção
+
+    app.debug = False
+    eventos.MAX_ASSINANTES = min(eventos.MAX_ASSINANTES, max(threads - WSGI_THREADS_PEDIDOS, threads // 2))
+    log.log(f"Servidor de produção em http://{host}:{porta} ({threads} threads, até {eventos.MAX_ASSINANTES} "
+            f"clientes SSE, fila de {fila_max} ligações).")
+    serve(app, host=host, port=porta, threads=threads, connection_limit=threads + fila_max,
+          backlog=WSGI_BACKLOG, ident="CLP_TCC")
+
 if __name__ == '__main__':
     iniciar_web()
\ No newline at end of file
@@ -47,8 +47,11 @@ document.addEventListener('DOMContentLoaded', () => {
     async function atualizarInfo(ip) {
         const res = await fetchJson(`/clp/${ip}/info`);
         if (!res.ok) return;
+        renderizarInfo(res.clp);
+    }
 
-        const clp = res.clp;
+    // Aplica na página os dados de um CLP (vindos da API ou do canal de eventos)
+    function renderizarInfo(clp) {
         const statusEl = document.getElementById('statusText');
         const connectContainer = document.getElementById('connect-container');
         const disconnectContainer = document.getElementById('disconnect-container');
@@ -127,11 +130,45 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
-    // Inicia a atualização periódica e chama uma vez no início
-    setInterval(() => atualizarInfo(ip), 5000);
+    // Recebe as alterações do CLP por Server-Sent Events em vez de consultar a cada 5 s.
+    // Em navegadores sem EventSource, mantém a atualização periódica.
+    if (window.EventSource) {
+        const fonte = new EventSource(`/api/eventos?topicos=clp:${encodeURIComponent(ip)}`);
+        fonte.addEventListener('clp_atualizado', (e) => renderizarInfo(JSON.parse(e.data).dados));
+        fonte.addEventListener('clp_adicionado', (e) => renderizarInfo(JSON.parse(e.data).dados));
+        // Eventos perdidos (cliente lento) ou reconexão: recarrega o estado completo.
+        fonte.addEventListener('resync', () => atualizarInfo(ip));
+        fonte.addEventListener('open', () => atualizarInfo(ip));
+    } else {
+        setInterval(() => atualizarInfo(ip), 5000);
+    }
     atualizarInfo(ip);
 
 
+    // Histórico completo, paginado por cursor (/clp/<ip>/logs?before=&limit=)
+    const btnHistorico = document.getElementById('btnHistorico');
+    const historicoContainer = document.getElementById('historicoContainer');
+    let historicoAntes = null;
+
+    if (btnHistorico && historicoContainer) {
+        btnHistorico.addEventListener('click', async () => {
+            const params = new URLSearchParams({ limit: 50 });
+            if (historicoAntes !== null) params.set('before', historicoAntes);
+            const res = await fetchJson(`/clp/${ip}/logs?${params}`);
+            if (!res.ok) return;
+
+            res.logs.forEach(entrada => {
+                const logEntry = document.createElement('div');
+                logEntry.textContent = `${entrada.hora} - ${entrada.mensagem}`;
+                historicoContainer.appendChild(logEntry);
+            });
+            historicoAntes = res.before;
+            btnHistorico.textContent = 'Carregar mais antigos';
+            btnHistorico.style.display = res.before === null ? 'none' : 'inline-block';
+        });
+    }
+
+
     // --- Parte 2: Lógica para Edição do Nome do CLP ---
     const viewMode = document.getElementById('viewMode');
     const editMode = document.getElementById('editMode');
@@ -1,9 +1,13 @@
 # run.py (Versão Simplificada)
-from clp_app.server import server
-# A importação do scanner_service pode ser necessária para garantir que a instância seja criada
-from clp_app.scanner.service import scanner_service 
 
 if __name__ == "__main__":
+    # Imports dentro do if: o processo filho do scanner (spawn) volta a importar este
+    # script como __mp_main__ e não deve carregar a app nem o inventário
+    from clp_app.server import server
+    # A importação do scanner_service pode ser necessária para garantir que a instância seja criada
+    from clp_app.scanner.service import scanner_service
+    from clp_app.polling.service import polling_service
+
     # O scanner agora é iniciado e parado pela interface do usuário.
     # Não iniciamos mais as threads aqui.
     
@@ -13,4 +17,5 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         print("Programa encerrado")
         # É uma boa prática garantir que o scanner pare ao encerrar o programa
-        scanner_service.stop()
\ No newline at end of file
+        scanner_service.stop()
+        polling_service.stop()
\ No newline at end of file
@@ -0,0 +1,34 @@
+# run_producao.py
+# Arranque em modo de produção: o mesmo app de run.py servido pelo waitress
+# (multi-thread, sem debugger), para várias estações de operação em simultâneo.
+import argparse
+import signal
+import sys
+
+if __name__ == "__main__":
+    # Imports dentro do if: o processo filho do scanner (spawn) volta a importar este
+    # script como __mp_main__ e não deve carregar a app nem o inventário
+    from clp_app.server import server
+    from clp_app.scanner.service import scanner_service
+    from clp_app.polling.service import polling_service
+
+    parser = argparse.ArgumentParser(description="Servidor web CLP_TCC em modo de produção (waitress).")
+    parser.add_argument("--host", default=server.WSGI_HOST)
+    parser.add_argument("--porta", type=int, default=server.WSGI_PORTA)
+    parser.add_argument("--threads", type=int, default=server.WSGI_THREADS,
+                        help="Pedidos atendidos em paralelo; cada cliente SSE ocupa uma "
+                             f"(padrão: limite de clientes SSE + {server.WSGI_THREADS_PEDIDOS})")
+    parser.add_argument("--fila", type=int, default=server.WSGI_FILA_MAX,
+                        help="Ligações à espera de uma thread livre")
+    args = parser.parse_args()
+    # SIGTERM (systemd, docker stop) passa pelo mesmo encerramento que o Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        server.iniciar_producao(host=args.host, porta=args.porta, threads=args.threads, fila_max=args.fila)
+    except KeyboardInterrupt:
+        print("Programa encerrado")
+    finally:
+        # O waitress devolve o controlo ao receber SIGINT/SIGTERM: para os serviços de fundo
+        scanner_service.stop()
+        polling_service.stop()
@@ -0,0 +1,70 @@
+# tests/test_dedup.py
+import unittest
+
+from clp_app.scanner.dedup import CacheDedup
+
+
+class _Relogio:
+    def __init__(self):
+        self.agora = 1000.0
+
+    def __call__(self):
+        return self.agora
+
+
+class TestCacheDedup(unittest.TestCase):
+    def _entradas_na_roda(self, cache):
+        return sum(len(entradas) for p in cache._particoes for _, entradas in p.roda)
+
+    def test_ttl(self):
+        relogio = _Relogio()
+        cache = CacheDedup(ttl=300, capacidade=160, relogio=relogio)
+        self.assertTrue(cache.deve_processar("10.0.0.1"))
+        self.assertFalse(cache.deve_processar("10.0.0.1"))
+        relogio.agora += 301
+        self.assertTrue(cache.deve_processar("10.0.0.1"))
+
+    def test_esquecer_repetido_mantem_memoria_limitada(self):
+        cache = CacheDedup(ttl=300, capacidade=160, relogio=_Relogio())
+        for _ in range(200_000):
+            self.assertTrue(cache.deve_processar("10.0.0.1"))
+            cache.esquecer("10.0.0.1")
+        self.assertEqual(len(cache), 0)
+        self.assertLessEqual(self._entradas_na_roda(cache), cache.capacidade)
+
+    def test_adiar_repetido_mantem_memoria_limitada(self):
+        relogio = _Relogio()
+        cache = CacheDedup(ttl=300, capacidade=160, relogio=relogio)
+        for _ in range(20_000):
+            cache.deve_processar("10.0.0.1")
+            cache.adiar("10.0.0.1", 5)
+            relogio.agora += 1
+        self.assertLessEqual(self._entradas_na_roda(cache), cache.capacidade)
+
+    def test_adiar_encurta_o_ttl(self):
+        relogio = _Relogio()
+        cache = CacheDedup(ttl=300, capacidade=160, relogio=relogio)
+        cache.deve_processar("10.0.0.1")
+        cache.adiar("10.0.0.1", 5)
+        relogio.agora += 4
+        self.assertFalse(cache.deve_processar("10.0.0.1"))
+        relogio.agora += 2
+        self.assertTrue(cache.deve_processar("10.0.0.1"))
+
+    def test_entradas_antigas_nao_despejam_ip_re_aceite(self):
+        # Uma partição com capacidade 2: o IP esquecido e re-aceite não pode ser despejado
+        # por causa da sua entrada antiga no início da roda
+        relogio = _Relogio()
+        cache = CacheDedup(ttl=300, capacidade=2, shards=1, relogio=relogio)
+        cache.deve_processar("a")
+        cache.esquecer("a")
+        relogio.agora += 10
+        cache.deve_processar("a")
+        relogio.agora += 10
+        cache.deve_processar("b")
+        self.assertFalse(cache.deve_processar("a"))
+        self.assertEqual(cache.contadores()["despejados"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,47 +1,111 @@
 # utils/CLP.py (Refatorado para ser um gerenciador de dicionários)
-import json
 import os
+import uuid
+from collections import OrderedDict
+from threading import Lock, RLock
 from . import clp_functions # Importa as novas funções
+from . import eventos, metricas
+from .armazenamento import ArmazenamentoJSON, ArmazenamentoSQLite
+from .indice_clps import IndiceCLPs
 
 # --- Configuração de Caminhos ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CAMINHO_JSON = os.path.join(BASE_DIR, "logs", "clps.json")
+CAMINHO_SQLITE = os.path.join(BASE_DIR, "logs", "clps.db")
 
-# Dicionário em memória para armazenar os CLPs (IP -> dicionário do CLP)
+# Backend de persistência: "sqlite" (upsert por registro, WAL) ou "json" (arquivo único)
+BACKEND_ARMAZENAMENTO = "sqlite"
 
+# Dicionário em memória para armazenar os CLPs (IP -> dicionário do CLP)
 _clps = {}
-try:
-    with open(CAMINHO_JSON, "r", encoding="UTF-8") as f:
-        _clps = json.load(f)
-except FileNotFoundError:
-    print(f"Error: The file at {CAMINHO_JSON} was not found.")
-except json.JSONDecodeError:
-    print(f"Error: The file at {CAMINHO_JSON} is not a valid JSON file.")
+# Protege _clps e as operações compostas sobre ele (verificar e inserir, percorrer, trocar
+# o inventário inteiro): no modo de produção os pedidos HTTP são atendidos em várias threads.
+# Reentrante porque adicionar_clp -> notificar_clp -> get_info voltam a precisar dele.
+_clps_lock = RLock()
+_armazenamento = None
+# Índices secundários (tags, portas, status, sub-rede, nome) para consultar_clps
+_indice = IndiceCLPs()
+
+# Versionamento do inventário (ETag de /api/clps e /api/clps/changes).
+# As versões vivem só em memória: a época muda a cada arranque e obriga os
+# clientes a fazer uma sincronização completa.
+LIMITE_REMOCOES = 10000        # IPs removidos lembrados para a sincronização incremental
+
+TAMANHO_LOTE_IMPORTACAO = 500  # Registros aplicados por gravação em importar_clps
+LIMITE_ERROS_IMPORTACAO = 100  # Erros detalhados devolvidos pela importação (os restantes só contam)
+_epoca = uuid.uuid4().hex[:8]
+_versao = 0
+_versoes = {}                  # ip -> versão da última alteração
+_removidos = OrderedDict()     # ip -> versão da remoção (mais antigos primeiro)
+_versao_minima_remocoes = 0    # remoções com versão <= a esta já foram esquecidas
+_versao_lock = Lock()
+
+_duracao_salvar = metricas.histograma(
+    "clp_persistencia_salvar_segundos", "Duração de salvar_clps por operação (um registro ou todos).", ("operacao",))
+_bytes_salvos = metricas.contador(
+    "clp_persistencia_bytes_escritos_total", "Bytes de JSON escritos por salvar_clps.", ("operacao",))
+
+
+def _criar_armazenamento(backend: str = BACKEND_ARMAZENAMENTO):
+    """Instancia o backend configurado. O SQLite importa o clps.json antigo na primeira execução."""
+    if backend == "sqlite":
+        return ArmazenamentoSQLite(CAMINHO_SQLITE, caminho_json_legado=CAMINHO_JSON)
+    if backend == "json":
+        return ArmazenamentoJSON(CAMINHO_JSON)
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend}")
+
 
+def configurar_armazenamento(armazenamento):
+    """Troca o backend de persistência (ex.: em testes) e recarrega os CLPs a partir dele."""
+    global _armazenamento
+    _armazenamento = armazenamento
+    carregar_clps()
 
-def carregar_clps(caminho_arquivo=CAMINHO_JSON):
-    """Carrega os CLPs do arquivo JSON para a memória."""
+
+def carregar_clps():
+    """Carrega os CLPs do armazenamento para a memória."""
     global _clps
-    if not os.path.exists(caminho_arquivo):
-        _clps = {}
+    # Lido fora do lock: o armazenamento tem o seu próprio lock, que salvar_clps segura antes deste
+    carregados = _armazenamento.carregar()
+    with _clps_lock:
+        anteriores = set(_clps)
+        _clps = carregados
+        _indice.reconstruir(_clps.values())
+        for ip in anteriores - set(_clps):
+            _registrar_remocao(ip)
+        for clp in _clps.values():
+            _registrar_versao(clp)
+        # Registros antigos traziam todo o histórico em "logs": move-o para utils/historico.
+        migrados = [clp_functions.migrar_logs_legados(clp) for clp in _clps.values()]
+    if any(migrados):
+        salvar_clps()
+
+def salvar_clps(clp: dict = None):
+    """Persiste as alterações dos CLPs.
+
+    Com `clp`, grava apenas esse registro (upsert no SQLite); sem argumento,
+    grava todo o inventário.
+    """
+    if clp is not None and clp.get("IP") in _clps:
+        registrar_alteracao(clp)
+        ip = clp["IP"]
+        # A cópia é tirada pelo armazenamento já dentro do seu lock de escrita: duas gravações
+        # concorrentes do mesmo CLP não podem deixar a cópia mais antiga por último
+        with _duracao_salvar.cronometrar(operacao="um"):
+            escritos = _armazenamento.salvar_um(lambda: _dados_serializaveis((ip,)).get(ip), _dados_serializaveis)
+        _bytes_salvos.inc(escritos or 0, operacao="um")
         return
+    with _duracao_salvar.cronometrar(operacao="todos"):
+        escritos = _armazenamento.salvar_todos(_dados_serializaveis)
+    _bytes_salvos.inc(escritos or 0, operacao="todos")
 
-    try:
-        with open(caminho_arquivo, "r", encoding="utf-8") as f:
-            dados_json = json.load(f)
-            # Garante que os dados carregados sejam dicionários
-            _clps = {ip: clp for ip, clp in dados_json.items() if isinstance(clp, dict)}
-    except (json.JSONDecodeError, IOError) as e:
-        print(f"Erro ao carregar o arquivo de CLPs: {e}")
-        _clps = {}
-
-def salvar_clps(caminho_arquivo=CAMINHO_JSON):
-    """Salva todos os CLPs da memória para o arquivo JSON."""
-    os.makedirs(os.path.dirname(caminho_arquivo), exist_ok=True)
-    # Usamos get_info para garantir que apenas dados serializáveis sejam salvos
-    dados_para_salvar = {ip: clp_functions.get_info(clp) for ip, clp in _clps.items()}
-    with open(caminho_arquivo, "w", encoding="utf-8") as f:
-        json.dump(dados_para_salvar, f, indent=4, ensure_ascii=False)
+def _dados_serializaveis(ips=None) -> dict:
+    """Cópia do inventário (ou dos `ips` que ainda lá estão) tal como é gravada no armazenamento."""
+    with _clps_lock:
+        # Apenas dados serializáveis (e a marca de migração, que não sai na API) são salvos
+        if ips is None:
+            return {ip: clp_functions.dados_armazenamento(clp) for ip, clp in _clps.items()}
+        return {ip: clp_functions.dados_armazenamento(_clps[ip]) for ip in ips if ip in _clps}
 
 def adicionar_clp(clp: dict):
     """Adiciona um novo CLP (dicionário) ao gerenciador."""
@@ -49,15 +113,169 @@ def adicionar_clp(clp: dict):
     if not ip:
         print("Aviso: Dicionário de CLP sem IP. Não foi possível adicionar.")
         return
-    if ip in _clps:
-        # Atualiza as portas se o CLP já existir
-        portas_existentes = set(_clps[ip].get("PORTAS", []))
-        portas_novas = set(clp.get("PORTAS", []))
-        portas_existentes.update(portas_novas)
-        _clps[ip]["PORTAS"] = sorted(list(portas_existentes))
+    with _clps_lock:
+        existente = _clps.get(ip)
+        if existente is None:
+            _clps[ip] = clp
+        else:
+            # Atualiza as portas se o CLP já existir
+            with clp_functions.listas_lock:
+                portas_existentes = set(existente.get("PORTAS", []))
+                portas_novas = set(clp.get("PORTAS", []))
+                portas_existentes.update(portas_novas)
+                existente["PORTAS"] = sorted(list(portas_existentes))
+    if existente is not None:
         print(f"Aviso: CLP com IP {ip} já existe. Portas atualizadas.")
+        notificar_clp(existente)
+        return
+    notificar_clp(clp, tipo="clp_adicionado")
+
+def notificar_clp(clp: dict, tipo: str = "clp_atualizado"):
+    """Publica a alteração de um CLP no canal de eventos (SSE), para todos e para quem segue esse IP.
+
+    Também reindexa o CLP: todas as alterações ao registro passam por aqui ou por salvar_clps.
+    """
+    ip = clp.get("IP")
+    registrar_alteracao(clp)
+    topicos = (eventos.TOPICO_CLPS, eventos.topico_clp(ip))
+    if not any(eventos.tem_assinantes(t) for t in topicos):
         return
-    _clps[ip] = clp
+    with _clps_lock:
+        info = clp_functions.get_info(clp)
+    for topico in topicos:
+        eventos.publicar(topico, tipo, info)
+
+def _aplicar_importado(registro: dict) -> tuple[dict, bool]:
+    """Cria ou funde um registro importado. Retorna (clp, criado)."""
+    existente = _clps.get(registro["IP"])
+    if existente is None:
+        clp = clp_functions.criar_clp(IP=registro["IP"], UNIDADE=registro.get("UNIDADE"),
+                                      PORTAS=registro["PORTAS"], nome=registro.get("nome", ""),
+                                      descricao=registro.get("descricao", ""))
+        if registro["tags"]:
+            clp["tags"] = list(registro["tags"])
+        _clps[clp["IP"]] = clp
+        return clp, True
+
+    # Campos presentes substituem; portas e tags são acrescentadas às existentes
+    for campo in ("nome", "descricao", "UNIDADE"):
+        if campo in registro:
+            existente[campo] = registro[campo]
+    with clp_functions.listas_lock:
+        for porta in registro["PORTAS"]:
+            if porta not in existente["PORTAS"]:
+                existente["PORTAS"].append(porta)
+        tags = existente.setdefault("tags", [])
+        for tag in registro["tags"]:
+            if tag not in tags:
+                tags.append(tag)
+    return existente, False
+
+def importar_clps(linhas, tamanho_lote: int = TAMANHO_LOTE_IMPORTACAO) -> dict:
+    """
+    Aplica registros importados em lotes, com uma gravação por lote.
+    `linhas`: iterável de (número da linha, registro normalizado ou ValueError),
+    como o produzido por utils.inventario_io.ler. Devolve as contagens e os primeiros erros.
+    """
+    resultado = {"criados": 0, "atualizados": 0, "rejeitados": 0, "lotes": 0, "erros": []}
+    lote = {}
+
+    def gravar_lote():
+        if not lote:
+            return
+        for clp in lote.values():
+            registrar_alteracao(clp)
+        ips = list(lote)
+        with _duracao_salvar.cronometrar(operacao="lote"):
+            escritos = _armazenamento.salvar_lote(lambda: _dados_serializaveis(ips), _dados_serializaveis)
+        _bytes_salvos.inc(escritos or 0, operacao="lote")
+        if eventos.tem_assinantes(eventos.TOPICO_CLPS):
+            eventos.publicar(eventos.TOPICO_CLPS, "clps_importados", {"quantidade": len(lote)})
+        resultado["lotes"] += 1
+        lote.clear()
+
+    for numero, registro in linhas:
+        if isinstance(registro, Exception):
+            resultado["rejeitados"] += 1
+            if len(resultado["erros"]) < LIMITE_ERROS_IMPORTACAO:
+                resultado["erros"].append({"linha": numero, "erro": str(registro)})
+            continue
+        with _clps_lock:
+            clp, criado = _aplicar_importado(registro)
+        resultado["criados" if criado else "atualizados"] += 1
+        lote[clp["IP"]] = clp
+        if len(lote) >= tamanho_lote:
+            gravar_lote()
+    gravar_lote()
+    return resultado
+
+def remover_clp(ip: str) -> bool:
+    """Remove o CLP do inventário e do armazenamento."""
+    with _clps_lock:
+        clp = _clps.pop(str(ip), None)
+    if clp is None:
+        return False
+    _armazenamento.remover(clp["IP"], _dados_serializaveis)
+    _indice.remover(clp["IP"])
+    _registrar_remocao(clp["IP"])
+    topicos = (eventos.TOPICO_CLPS, eventos.topico_clp(clp["IP"]))
+    for topico in topicos:
+        if eventos.tem_assinantes(topico):
+            eventos.publicar(topico, "clp_removido", {"IP": clp["IP"]})
+    return True
+
+# --- Versionamento ---
+
+def _registrar_versao(clp: dict):
+    global _versao
+    with _versao_lock:
+        _versao += 1
+        _versoes[clp["IP"]] = _versao
+        _removidos.pop(clp["IP"], None)
+
+def _registrar_remocao(ip: str):
+    global _versao, _versao_minima_remocoes
+    with _versao_lock:
+        _versao += 1
+        _versoes.pop(ip, None)
+        _removidos.pop(ip, None)
+        _removidos[ip] = _versao
+        while len(_removidos) > LIMITE_REMOCOES:
+            _, esquecida = _removidos.popitem(last=False)
+            _versao_minima_remocoes = esquecida
+
+def registrar_alteracao(clp: dict):
+    """Reindexa o CLP e sobe a versão do inventário e do registro. Ignora CLPs ainda não adicionados."""
+    if clp.get("IP") not in _clps:
+        return
+    _indice.atualizar(clp)
+    _registrar_versao(clp)
+
+def versao_atual() -> tuple[str, int]:
+    """(época, versão) do inventário; qualquer alteração sobe a versão."""
+    return _epoca, _versao
+
+def alteracoes_desde(versao: int, epoca: str = None) -> dict:
+    """
+    Registros criados/alterados e IPs removidos depois de `versao`.
+    Se a época não for a atual ou as remoções necessárias já tiverem sido
+    esquecidas, devolve o inventário completo com "completo": True.
+    """
+    with _versao_lock:
+        atual = _versao
+        completo = (epoca is not None and epoca != _epoca) or versao > atual or versao < _versao_minima_remocoes
+        if completo:
+            versao = 0
+        alterados = [(ip, v) for ip, v in _versoes.items() if v > versao]
+        removidos = [] if completo else [ip for ip, v in _removidos.items() if v > versao]
+    registros = []
+    with _clps_lock:
+        for ip, v in sorted(alterados, key=lambda item: item[1]):
+            clp = _clps.get(ip)
+            if clp is not None:
+                registros.append(dict(clp_functions.get_resumo(clp), versao=v))
+    return {"epoca": _epoca, "versao": atual, "completo": completo,
+            "alterados": registros, "removidos": removidos}
 
 def buscar_por_ip(ip: str):
     """Busca um CLP (dicionário) pelo seu endereço IP."""
@@ -65,8 +283,34 @@ def buscar_por_ip(ip: str):
 
 def listar_clps():
     """Retorna uma lista de todos os dicionários de CLP gerenciados."""
-    return list(_clps.values())
+    with _clps_lock:
+        return list(_clps.values())
+
+def listar_ips():
+    """Retorna a lista dos IPs do inventário (mais leve do que listar_clps para percorrer tudo)."""
+    with _clps_lock:
+        return list(_clps)
+
+def consultar_clps(tag: str = None, porta: int = None, status: str = None, subrede: str = None,
+                   q: str = None, pagina: int = 1, por_pagina: int = 50, ordenar: str = "ip"):
+    """
+    Consulta o inventário pelos índices e devolve (total, [CLPs da página]).
+    `q` procura por substring no nome; `tag` aceita a tag exata ou parte dela.
+    Lança ValueError para `ordenar` ou `subrede` inválidos.
+    """
+    total, ips = _indice.consultar(tag=tag, porta=porta, status=status, subrede=subrede, q=q,
+                                   pagina=pagina, por_pagina=por_pagina, ordenar=ordenar)
+    with _clps_lock:
+        # Um IP pode ter sido removido entre a consulta ao índice e aqui
+        return total, [_clps[ip] for ip in ips if ip in _clps]
+
+def resumo_inventario() -> dict:
+    """Totais por status, porta e tag, lidos diretamente dos índices."""
+    return _indice.contagens()
 
 # --- Carregamento Inicial ---
-# Carrega os CLPs do arquivo JSON assim que o módulo é importado.
-carregar_clps()
\ No newline at end of file
+# Carrega os CLPs do armazenamento assim que o módulo é importado.
+_armazenamento = _criar_armazenamento()
+carregar_clps()
+# As alterações feitas pelas funções de clp_functions também versionam o registro
+clp_functions.ao_alterar(registrar_alteracao)
\ No newline at end of file
@@ -0,0 +1,164 @@
+# utils/armazenamento.py
+"""
+Backends de persistência do inventário de CLPs.
+
+- ArmazenamentoJSON: o formato original (logs/clps.json), agora com escrita
+  atómica (arquivo temporário + os.replace) para não truncar em caso de crash.
+- ArmazenamentoSQLite: banco SQLite em modo WAL com upsert por registro, para
+  que uma alteração num CLP não reescreva o inventário inteiro.
+
+Os dois expõem a mesma interface: carregar(), salvar_todos(obter_todos),
+salvar_um(obter_registro, obter_todos), salvar_lote(obter_lote, obter_todos) e
+remover(ip, obter_todos). Os dados chegam como funções que devolvem uma cópia:
+- obter_todos(): o inventário completo (IP -> CLP), chamada apenas pelos backends
+  que não conseguem gravar um registro isolado;
+- obter_registro(): o CLP a gravar, ou None se entretanto foi removido;
+- obter_lote(): os CLPs do lote (IP -> CLP).
+Cada backend chama-as já dentro do seu lock de escrita, para que a última
+escrita leve sempre o estado mais recente.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class ArmazenamentoJSON:
+    """Persiste todos os CLPs num único arquivo JSON (dicionário IP -> CLP)."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+
+    def carregar(self) -> dict:
+        if not os.path.exists(self.caminho):
+            return {}
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                dados_json = json.load(f)
+        except (json.JSONDecodeError, IOError) as e:
+            print(f"Erro ao carregar o arquivo de CLPs: {e}")
+            return {}
+        # Garante que os dados carregados sejam dicionários
+        return {ip: clp for ip, clp in dados_json.items() if isinstance(clp, dict)}
+
+    def salvar_todos(self, obter_todos) -> int:
+        """Reescreve o arquivo. Retorna o número de bytes escritos."""
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        temporario = f"{self.caminho}.tmp"
+        with self._lock:
+            conteudo = json.dumps(obter_todos(), indent=4, ensure_ascii=False).encode("utf-8")
+            with open(temporario, "wb") as f:
+                f.write(conteudo)
+            os.replace(temporario, self.caminho)
+        return len(conteudo)
+
+    def salvar_um(self, obter_registro, obter_todos) -> int:
+        # O formato JSON não suporta escrita parcial: reescreve o arquivo.
+        return self.salvar_todos(obter_todos)
+
+    def salvar_lote(self, obter_lote, obter_todos) -> int:
+        return self.salvar_todos(obter_todos)
+
+    def remover(self, ip: str, obter_todos) -> None:
+        # `obter_todos` já não contém o IP removido
+        self.salvar_todos(obter_todos)
+
+
+class ArmazenamentoSQLite:
+    """Persiste cada CLP como uma linha (JSON) numa tabela SQLite em modo WAL."""
+
+    def __init__(self, caminho: str, caminho_json_legado: str = None):
+        self.caminho = caminho
+        self.caminho_json_legado = caminho_json_legado
+        self._local = threading.local()
+        self._escrita_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        self._criar_schema()
+        self._migrar_json_legado()
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread (sqlite3 não partilha conexões entre threads por padrão)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _criar_schema(self) -> None:
+        conn = self._conexao()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS clps ("
+                " ip TEXT PRIMARY KEY,"
+                " dados TEXT NOT NULL,"
+                " atualizado_em REAL NOT NULL)"
+            )
+
+    def _migrar_json_legado(self) -> None:
+        """Importa uma única vez o clps.json existente para o banco vazio."""
+        legado = self.caminho_json_legado
+        if not legado or not os.path.exists(legado):
+            return
+        conn = self._conexao()
+        if conn.execute("SELECT 1 FROM clps LIMIT 1").fetchone():
+            return
+        clps = ArmazenamentoJSON(legado).carregar()
+        self.salvar_todos(lambda: clps)
+        # Renomeia o arquivo antigo para não voltar a ser importado.
+        os.replace(legado, f"{legado}.migrado")
+        logging.info(f"{len(clps)} CLPs migrados de {legado} para {self.caminho}.")
+
+    def carregar(self) -> dict:
+        conn = self._conexao()
+        clps = {}
+        for ip, dados in conn.execute("SELECT ip, dados FROM clps"):
+            try:
+                clp = json.loads(dados)
+            except json.JSONDecodeError as e:
+                logging.error(f"Registro inválido para o CLP {ip} no banco: {e}")
+                continue
+            if isinstance(clp, dict):
+                clps[ip] = clp
+        return clps
+
+    def salvar_todos(self, obter_todos) -> int:
+        """Upsert de todos os registros. Retorna o número de bytes de JSON escritos."""
+        conn = self._conexao()
+        with self._escrita_lock, conn:
+            agora = time.time()
+            linhas = [(ip, json.dumps(clp, ensure_ascii=False), agora) for ip, clp in obter_todos().items()]
+            conn.executemany(
+                "INSERT INTO clps (ip, dados, atualizado_em) VALUES (?, ?, ?) "
+                "ON CONFLICT(ip) DO UPDATE SET dados = excluded.dados, atualizado_em = excluded.atualizado_em",
+                linhas,
+            )
+        return sum(len(dados.encode("utf-8")) for _, dados, _ in linhas)
+
+    def salvar_um(self, obter_registro, obter_todos) -> int:
+        # Só o registro alterado é escrito; `obter_todos` nem chega a ser chamado.
+        conn = self._conexao()
+        with self._escrita_lock, conn:
+            clp = obter_registro()
+            if clp is None:
+                return 0  # removido entretanto
+            dados = json.dumps(clp, ensure_ascii=False)
+            conn.execute(
+                "INSERT INTO clps (ip, dados, atualizado_em) VALUES (?, ?, ?) "
+                "ON CONFLICT(ip) DO UPDATE SET dados = excluded.dados, atualizado_em = excluded.atualizado_em",
+                (clp["IP"], dados, time.time()),
+            )
+        return len(dados.encode("utf-8"))
+
+    def salvar_lote(self, obter_lote, obter_todos) -> int:
+        # Upsert só dos registros do lote, numa única transação
+        return self.salvar_todos(obter_lote)
+
+    def remover(self, ip: str, obter_todos) -> None:
+        conn = self._conexao()
+        with self._escrita_lock, conn:
+            conn.execute("DELETE FROM clps WHERE ip = ?", (ip,))
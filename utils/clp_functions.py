@@ -1,9 +1,33 @@
 # utils/clp_functions.py
+from collections import deque
 from datetime import datetime
-from pymodbus.client import ModbusTcpClient
+from threading import Lock
 
-# Este dicionário em memória manterá as conexões de cliente ativas, usando o IP como chave.
-_active_clients = {}
+from . import historico, modbus_lote, modbus_pool
+
+# Número de entradas de log mantidas dentro do registro do CLP (as restantes ficam em utils/historico).
+LIMITE_LOGS_EM_MEMORIA = 50
+
+# Menor intervalo aceite para um grupo de polling (segundos).
+INTERVALO_POLLING_MINIMO = 0.1
+
+# Serializa todas as alterações às listas do CLP (PORTAS, tags): pedidos HTTP, scanner e importação
+# correm em threads diferentes. utils/CLP toma-o já dentro do seu _clps_lock, nunca o contrário.
+listas_lock = Lock()
+
+# Chamado com o CLP depois de cada alteração ao registro feita aqui (utils/CLP regista-se para
+# versionar o inventário). Entradas de log sozinhas não contam: por isso as representações
+# versionadas (get_resumo, usada por /api/clps e /api/clps/changes) não incluem os logs.
+_ao_alterar = None
+
+def ao_alterar(callback):
+    """Define a função chamada após cada alteração de um CLP por este módulo."""
+    global _ao_alterar
+    _ao_alterar = callback
+
+def _alterado(clp: dict):
+    if _ao_alterar is not None:
+        _ao_alterar(clp)
 
 def criar_clp(IP: str, UNIDADE=None, PORTAS=None, nome: str = "", descricao: str = ""):
     """Cria um novo dicionário para representar um CLP."""
@@ -22,54 +46,144 @@ def criar_clp(IP: str, UNIDADE=None, PORTAS=None, nome: str = "", descricao: str
         "data_registro": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
         "nome": nome or f"CLP_{IP}",
         "descricao": descricao,
-        "logs": [],
+        "logs": deque(maxlen=LIMITE_LOGS_EM_MEMORIA),
+        "logs_migrados": True,
     }
 
 def conectar(clp: dict, port: int = None, timeout: float = 3.0) -> bool:
-    """Tenta conectar ao CLP via Modbus e atualiza o dicionário."""
+    """Tenta conectar ao CLP via Modbus (pool de conexões) e atualiza o dicionário."""
     ip = clp["IP"]
     p = port or (clp["PORTAS"][0] if clp["PORTAS"] else 502)
     try:
-        client = ModbusTcpClient(host=ip, port=int(p), timeout=timeout)
-        ok = client.connect()
-        clp["conectado"] = bool(ok)
-        if ok:
-            _active_clients[ip] = client
-        status = 'Conectado' if ok else 'Falha ao conectar'
-        adicionar_log(clp, f"{status} usando a porta {p}.")
-        return clp["conectado"]
+        modbus_pool.pool.registrar(ip, int(p), timeout=timeout)
+        clp["conectado"] = True
+        adicionar_log(clp, f"Conectado usando a porta {p}.")
+        _alterado(clp)
+        return True
+    except modbus_pool.ConexaoIndisponivel as e:
+        clp["conectado"] = False
+        adicionar_log(clp, f"Falha ao conectar usando a porta {p}: {e}")
+        _alterado(clp)
+        return False
     except Exception as e:
         clp["conectado"] = False
         adicionar_log(clp, f"Exceção ao conectar na porta {p}: {e}")
+        _alterado(clp)
         return False
 
 def desconectar(clp: dict):
-    """Desconecta do CLP."""
-    ip = clp["IP"]
-    client = _active_clients.get(ip)
-    if client and client.is_socket_open():
-        client.close()
-        if ip in _active_clients:
-            del _active_clients[ip]
+    """Desconecta do CLP, fechando as conexões do pool."""
+    modbus_pool.pool.remover(clp["IP"])
     clp["conectado"] = False
     adicionar_log(clp, "Conexão encerrada.")
+    _alterado(clp)
 
 def get_client(ip: str):
-    """Obtém o objeto de cliente Modbus ativo para um determinado IP."""
-    return _active_clients.get(ip)
+    """
+    Empresta uma conexão Modbus do pool para o IP, ou None se o CLP não estiver conectado.
+    Uso: `with get_client(ip) as client: ...` (a conexão é devolvida ao sair do bloco).
+    """
+    if not modbus_pool.pool.conectado(ip):
+        return None
+    return modbus_pool.pool.transacao(ip)
+
+def executar_modbus(ip: str, operacao):
+    """Executa `operacao(client)` numa conexão do pool, reconectando uma vez se a conexão tiver caído."""
+    return modbus_pool.pool.executar(ip, operacao)
 
 def adicionar_porta(clp: dict, porta: int):
     """Adiciona uma nova porta à lista do CLP."""
     porta = int(porta)
-    if porta not in clp["PORTAS"]:
+    with listas_lock:
+        if porta in clp["PORTAS"]:
+            return
         clp["PORTAS"].append(porta)
-        adicionar_log(clp, f"Porta {porta} adicionada à lista de portas conhecidas.")
+    adicionar_log(clp, f"Porta {porta} adicionada à lista de portas conhecidas.")
+    _alterado(clp)
+
+def adicionar_tag(clp: dict, tag: str) -> bool:
+    """Adiciona uma tag ao CLP. False se ele já a tinha."""
+    with listas_lock:
+        tags = clp.setdefault("tags", [])
+        if tag in tags:
+            return False
+        tags.append(tag)
+    _alterado(clp)
+    return True
+
+def definir_grupo_polling(clp: dict, dados: dict) -> dict:
+    """
+    Valida e guarda no CLP o grupo de polling: endereços a amostrar e intervalo.
+    `dados`: {"enderecos": [{"address": 0, "type": "holding"}, ...], "intervalo": 1.0,
+              "unidade": 1, "porta": 502, "ativo": true}. Lança ValueError se for inválido.
+    """
+    pedidos = modbus_lote.normalizar_pedidos(dados.get("enderecos"))
+    intervalo = float(dados.get("intervalo", 1.0))
+    if intervalo < INTERVALO_POLLING_MINIMO:
+        raise ValueError(f"O intervalo mínimo é {INTERVALO_POLLING_MINIMO} s.")
+    porta = dados.get("porta") or (clp["PORTAS"][0] if clp["PORTAS"] else 502)
+
+    clp["polling"] = {
+        "enderecos": [{"address": endereco, "type": tipo} for tipo, endereco in pedidos],
+        "intervalo": intervalo,
+        "unidade": int(dados.get("unidade", 1)),
+        "porta": int(porta),
+        "ativo": bool(dados.get("ativo", True)),
+    }
+    adicionar_log(clp, f"Grupo de polling definido: {len(pedidos)} endereço(s) a cada {intervalo} s.")
+    _alterado(clp)
+    return clp["polling"]
+
+def remover_grupo_polling(clp: dict) -> bool:
+    """Remove o grupo de polling do CLP."""
+    if clp.pop("polling", None) is None:
+        return False
+    adicionar_log(clp, "Grupo de polling removido.")
+    _alterado(clp)
+    return True
+
+def _logs_recentes(clp: dict) -> deque:
+    """Garante que clp["logs"] é um buffer circular com as últimas LIMITE_LOGS_EM_MEMORIA entradas."""
+    logs = clp.get("logs")
+    if not isinstance(logs, deque) or logs.maxlen != LIMITE_LOGS_EM_MEMORIA:
+        logs = deque(logs or [], maxlen=LIMITE_LOGS_EM_MEMORIA)
+        clp["logs"] = logs
+    return logs
 
 def adicionar_log(clp: dict, texto: str):
-    """Adiciona uma entrada de log ao CLP."""
-    if "logs" not in clp:
-        clp["logs"] = []
-    clp["logs"].append(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {texto}")
+    """Adiciona uma entrada de log ao CLP.
+
+    O histórico completo vai para o armazenamento append-only (utils/historico);
+    no registro do CLP ficam apenas as entradas mais recentes.
+    """
+    hora = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    historico.registrar(clp["IP"], hora, texto)
+    _logs_recentes(clp).append(f"{hora} - {texto}")
+
+def migrar_logs_legados(clp: dict) -> bool:
+    """Move para o histórico os logs de um registro antigo (lista sem limite).
+
+    Retorna True se o registro foi alterado e precisa de ser gravado.
+    """
+    if clp.get("logs_migrados"):
+        _logs_recentes(clp)
+        return False
+    logs = clp.get("logs") or []
+    if logs:
+        historico.importar_linhas(clp["IP"], logs)
+    _logs_recentes(clp)
+    clp["logs_migrados"] = True
+    return True
+
+def dados_armazenamento(clp: dict) -> dict:
+    """Registro gravado no armazenamento: get_info mais as marcas internas, que não vão para a API."""
+    return dict(get_info(clp), logs_migrados=clp.get("logs_migrados", False))
+
+def get_resumo(clp: dict) -> dict:
+    """get_info sem os logs recentes: a parte do CLP coberta pela versão do inventário (e pelas ETags)."""
+    info = get_info(clp)
+    del info["logs"]  # histórico em /clp/<ip>/logs
+    return info
 
 def get_info(clp: dict) -> dict:
     """Retorna um dicionário serializável com as informações do CLP."""
@@ -81,12 +195,13 @@ def get_info(clp: dict) -> dict:
     return {
         "IP": clp.get("IP"),  # Chave corrigida de "ip" para "IP"
         "UNIDADE": clp.get("UNIDADE"),
-        "PORTAS": clp.get("PORTAS", []), # Chave corrigida de "portas" para "PORTAS"
+        "PORTAS": list(clp.get("PORTAS", [])), # Chave corrigida de "portas" para "PORTAS"
         "conectado": clp.get("conectado", False),
         "data_registro": clp.get("data_registro"),
         "nome": clp.get("nome"),
         "descricao": clp.get("descricao"),
-        "logs": clp.get("logs", []),
+        "logs": list(clp.get("logs", [])),
         "status": clp.get("status"), # Adicionamos o status aqui também
-        "tags": clp.get("tags", []),
+        "tags": list(clp.get("tags", [])),
+        "polling": clp.get("polling"),
     }
\ No newline at end of file
@@ -0,0 +1,104 @@
+# utils/eventos.py
+"""
+Barramento de eventos em memória (publicar/assinar) usado pelo canal SSE.
+
+Cada assinante tem uma fila LIMITADA: se o cliente for lento e a fila encher,
+os eventos mais antigos são descartados e o assinante é marcado como
+"atrasado", para que o cliente faça uma ressincronização completa em vez de
+o servidor acumular memória sem limite.
+"""
+import itertools
+from collections import deque
+from threading import Condition, Lock
+
+# --- Configurações do Módulo ---
+MAX_EVENTOS_POR_ASSINANTE = 500   # Eventos pendentes por cliente antes de descartar os mais antigos
+MAX_ASSINANTES = 200              # Limite de conexões SSE simultâneas
+
+# Tópicos conhecidos
+TOPICO_CLPS = "clps"          # Todas as alterações de CLPs
+TOPICO_COLETA = "coleta"      # Linhas novas do coleta.log
+TOPICO_APP = "app"            # Linhas novas do app.log
+
+
+def topico_clp(ip: str) -> str:
+    """Tópico com as alterações de um único CLP."""
+    return f"clp:{ip}"
+
+
+class Assinatura:
+    """Fila limitada de eventos de um assinante (uma conexão SSE)."""
+
+    def __init__(self, topicos, max_eventos: int = MAX_EVENTOS_POR_ASSINANTE):
+        self.topicos = frozenset(topicos)
+        self._fila = deque(maxlen=max_eventos)
+        self._cond = Condition()
+        self.perdidos = 0
+
+    def entregar(self, evento: dict) -> None:
+        """Coloca um evento na fila sem bloquear o produtor."""
+        with self._cond:
+            if len(self._fila) == self._fila.maxlen:
+                # Cliente lento: o deque descarta o evento mais antigo.
+                self.perdidos += 1
+            self._fila.append(evento)
+            self._cond.notify()
+
+    def proximo(self, timeout: float = None):
+        """Devolve o próximo evento, ou None se o timeout expirar."""
+        with self._cond:
+            if not self._fila:
+                self._cond.wait(timeout)
+            if self._fila:
+                return self._fila.popleft()
+            return None
+
+    def consumir_perdidos(self) -> int:
+        """Retorna (e zera) o número de eventos descartados desde a última chamada."""
+        with self._cond:
+            perdidos, self.perdidos = self.perdidos, 0
+            return perdidos
+
+
+_assinantes = {}          # tópico -> set(Assinatura)
+_assinantes_lock = Lock()
+_sequencia = itertools.count(1)
+
+
+def assinar(topicos):
+    """Regista um novo assinante para os tópicos indicados. Retorna None se o limite foi atingido."""
+    with _assinantes_lock:
+        total = len({a for conjunto in _assinantes.values() for a in conjunto})
+        if total >= MAX_ASSINANTES:
+            return None
+        assinatura = Assinatura(topicos)
+        for topico in assinatura.topicos:
+            _assinantes.setdefault(topico, set()).add(assinatura)
+    return assinatura
+
+
+def cancelar(assinatura: Assinatura) -> None:
+    """Remove o assinante de todos os tópicos."""
+    with _assinantes_lock:
+        for topico in assinatura.topicos:
+            conjunto = _assinantes.get(topico)
+            if conjunto:
+                conjunto.discard(assinatura)
+                if not conjunto:
+                    del _assinantes[topico]
+
+
+def tem_assinantes(topico: str) -> bool:
+    """Verificação barata (sem lock) usada pelos produtores para evitar trabalho inútil."""
+    return bool(_assinantes.get(topico))
+
+
+def publicar(topico: str, tipo: str, dados) -> None:
+    """Publica um evento para todos os assinantes do tópico. Nunca bloqueia o chamador."""
+    if not _assinantes.get(topico):
+        return
+    with _assinantes_lock:
+        destinatarios = list(_assinantes.get(topico, ()))
+    evento = {"id": next(_sequencia), "topico": topico, "tipo": tipo, "dados": dados}
+    for assinatura in destinatarios:
+        assinatura.entregar(evento)
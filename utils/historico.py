@@ -0,0 +1,117 @@
+# utils/historico.py
+"""
+Histórico de eventos por CLP, guardado fora do registro do CLP.
+
+Cada chamada a clp_functions.adicionar_log acrescenta uma linha numa tabela
+SQLite só de inserção (append-only). O registro do CLP guarda apenas as
+últimas entradas (ver clp_functions.LIMITE_LOGS_EM_MEMORIA); as mais antigas
+são lidas daqui de forma paginada pela rota /clp/<ip>/logs.
+"""
+import os
+import sqlite3
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_HISTORICO = os.path.join(BASE_DIR, "logs", "historico.db")
+
+LIMITE_PAGINA_PADRAO = 50
+LIMITE_PAGINA_MAXIMO = 500
+
+
+class HistoricoSQLite:
+    """Tabela append-only (id crescente) com índice por (ip, id) para paginação por cursor."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._escrita_lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        conn = self._conexao()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS eventos_clp ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " ip TEXT NOT NULL,"
+                " hora TEXT NOT NULL,"
+                " mensagem TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_eventos_clp_ip ON eventos_clp (ip, id)")
+
+    def _conexao(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def registrar(self, ip: str, entradas) -> None:
+        """Acrescenta uma lista de (hora, mensagem) ao histórico do IP."""
+        conn = self._conexao()
+        with self._escrita_lock, conn:
+            conn.executemany(
+                "INSERT INTO eventos_clp (ip, hora, mensagem) VALUES (?, ?, ?)",
+                [(ip, hora, mensagem) for hora, mensagem in entradas],
+            )
+
+    def listar(self, ip: str, antes: int = None, limite: int = LIMITE_PAGINA_PADRAO) -> list[dict]:
+        """Entradas do IP em ordem decrescente de id, começando antes de `antes` (exclusivo)."""
+        conn = self._conexao()
+        if antes is None:
+            cursor = conn.execute(
+                "SELECT id, hora, mensagem FROM eventos_clp WHERE ip = ? ORDER BY id DESC LIMIT ?",
+                (ip, limite),
+            )
+        else:
+            cursor = conn.execute(
+                "SELECT id, hora, mensagem FROM eventos_clp WHERE ip = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (ip, antes, limite),
+            )
+        return [{"id": id_, "hora": hora, "mensagem": mensagem} for id_, hora, mensagem in cursor]
+
+
+_historico = None
+_historico_lock = threading.Lock()
+
+
+def _obter() -> HistoricoSQLite:
+    """Cria o histórico na primeira utilização."""
+    global _historico
+    if _historico is None:
+        with _historico_lock:
+            if _historico is None:
+                _historico = HistoricoSQLite(CAMINHO_HISTORICO)
+    return _historico
+
+
+def configurar(historico) -> None:
+    """Troca o backend do histórico (ex.: outro caminho em testes)."""
+    global _historico
+    _historico = historico
+
+
+def separar_linha(linha: str):
+    """Divide uma linha 'YYYY-mm-dd HH:MM:SS - texto' em (hora, mensagem)."""
+    partes = linha.split(" - ", 1)
+    if len(partes) == 2:
+        return partes[0], partes[1]
+    return "", linha
+
+
+def registrar(ip: str, hora: str, mensagem: str) -> None:
+    """Acrescenta uma entrada ao histórico do CLP."""
+    _obter().registrar(ip, [(hora, mensagem)])
+
+
+def importar_linhas(ip: str, linhas) -> None:
+    """Importa linhas de log no formato antigo (texto) para o histórico."""
+    _obter().registrar(ip, [separar_linha(str(linha)) for linha in linhas])
+
+
+def listar(ip: str, antes: int = None, limite: int = LIMITE_PAGINA_PADRAO):
+    """Retorna (entradas, proximo_antes). proximo_antes é None quando não há mais páginas."""
+    limite = max(1, min(int(limite), LIMITE_PAGINA_MAXIMO))
+    entradas = _obter().listar(ip, antes=antes, limite=limite)
+    proximo = entradas[-1]["id"] if len(entradas) == limite else None
+    return entradas, proximo
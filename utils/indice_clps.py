@@ -0,0 +1,228 @@
+# utils/indice_clps.py
+"""
+Índices secundários do inventário de CLPs, para consultas filtradas e paginadas
+sem percorrer (nem serializar) todos os registros.
+
+Mantidos por CLP.py a cada alteração (adicionar, salvar, notificar, remover):
+- tags      -> IPs (índice invertido, em minúsculas)
+- porta     -> IPs
+- status    -> IPs ("Online"/"Offline")
+- sub-rede  -> IPs (agrupados por /PREFIXO_SUBREDE)
+- trigramas do nome -> IPs (pesquisa por substring)
+
+Atualizar um CLP recalcula as suas chaves e aplica só a diferença em relação
+às anteriores, por isso pode ser chamado várias vezes para a mesma alteração.
+"""
+import heapq
+import ipaddress
+from threading import Lock
+
+# --- Configurações do Módulo ---
+PREFIXO_SUBREDE = 24          # Granularidade do índice de sub-redes (IPv4)
+TAMANHO_NGRAMA = 3
+ORDENACOES = ("ip", "nome", "data_registro", "status")
+
+
+def _ngramas(texto: str) -> set:
+    texto = texto.lower()
+    return {texto[i:i + TAMANHO_NGRAMA] for i in range(len(texto) - TAMANHO_NGRAMA + 1)}
+
+
+def _chave_ip(ip: str) -> tuple:
+    try:
+        endereco = ipaddress.ip_address(ip)
+        return (endereco.version, int(endereco))
+    except ValueError:
+        return (99, ip)
+
+
+def _subrede(ip: str):
+    try:
+        endereco = ipaddress.ip_address(ip)
+    except ValueError:
+        return None
+    prefixo = PREFIXO_SUBREDE if endereco.version == 4 else 64
+    return str(ipaddress.ip_network(f"{ip}/{prefixo}", strict=False))
+
+
+class _Entrada:
+    __slots__ = ("tags", "portas", "status", "subrede", "ngramas", "nome", "data_registro", "chave_ip")
+
+    def __init__(self, clp: dict):
+        ip = clp["IP"]
+        self.tags = frozenset(str(t).lower() for t in clp.get("tags") or [])
+        self.portas = frozenset(int(p) for p in clp.get("PORTAS") or [])
+        self.status = "Online" if clp.get("conectado") else "Offline"
+        self.subrede = _subrede(ip)
+        self.nome = (clp.get("nome") or "").lower()
+        self.ngramas = frozenset(_ngramas(self.nome))
+        self.data_registro = clp.get("data_registro") or ""
+        self.chave_ip = _chave_ip(ip)
+
+
+class IndiceCLPs:
+    def __init__(self):
+        self._entradas = {}   # ip -> _Entrada
+        self._tags = {}
+        self._portas = {}
+        self._status = {}
+        self._subredes = {}
+        self._ngramas = {}
+        self._lock = Lock()
+
+    @staticmethod
+    def _ligar(indice: dict, chave, ip: str):
+        indice.setdefault(chave, set()).add(ip)
+
+    @staticmethod
+    def _desligar(indice: dict, chave, ip: str):
+        ips = indice.get(chave)
+        if ips is not None:
+            ips.discard(ip)
+            if not ips:
+                del indice[chave]
+
+    def _aplicar(self, ip: str, antiga, nova):
+        """Aplica a diferença de chaves entre duas versões da entrada (qualquer uma pode ser None)."""
+        for indice, atributo in ((self._tags, "tags"), (self._portas, "portas"), (self._ngramas, "ngramas")):
+            chaves_antigas = getattr(antiga, atributo) if antiga else frozenset()
+            chaves_novas = getattr(nova, atributo) if nova else frozenset()
+            for chave in chaves_antigas - chaves_novas:
+                self._desligar(indice, chave, ip)
+            for chave in chaves_novas - chaves_antigas:
+                self._ligar(indice, chave, ip)
+        for indice, atributo in ((self._status, "status"), (self._subredes, "subrede")):
+            chave_antiga = getattr(antiga, atributo) if antiga else None
+            chave_nova = getattr(nova, atributo) if nova else None
+            if chave_antiga == chave_nova:
+                continue
+            if chave_antiga is not None:
+                self._desligar(indice, chave_antiga, ip)
+            if chave_nova is not None:
+                self._ligar(indice, chave_nova, ip)
+
+    def atualizar(self, clp: dict):
+        """(Re)indexa um CLP depois de uma alteração."""
+        ip = clp.get("IP")
+        if not ip:
+            return
+        nova = _Entrada(clp)
+        with self._lock:
+            self._aplicar(ip, self._entradas.get(ip), nova)
+            self._entradas[ip] = nova
+
+    def remover(self, ip: str):
+        with self._lock:
+            antiga = self._entradas.pop(ip, None)
+            if antiga is not None:
+                self._aplicar(ip, antiga, None)
+
+    def reconstruir(self, clps):
+        """Descarta tudo e indexa de novo (após carregar o inventário)."""
+        with self._lock:
+            for indice in (self._entradas, self._tags, self._portas, self._status, self._subredes, self._ngramas):
+                indice.clear()
+        for clp in clps:
+            self.atualizar(clp)
+
+    # --- Consultas ---
+
+    def _por_tag(self, termo: str) -> set:
+        """Tag exata pelo índice; sem correspondência exata, substring sobre o vocabulário de tags."""
+        termo = termo.lower()
+        if termo in self._tags:
+            return set(self._tags[termo])
+        encontrados = set()
+        for tag, ips in self._tags.items():
+            if termo in tag:
+                encontrados |= ips
+        return encontrados
+
+    def _por_subrede(self, cidr: str) -> set:
+        rede = ipaddress.ip_network(cidr, strict=False)
+        encontrados = set()
+        for chave, ips in self._subredes.items():
+            bloco = ipaddress.ip_network(chave)
+            if bloco.version != rede.version or not bloco.overlaps(rede):
+                continue
+            if bloco.subnet_of(rede):
+                encontrados |= ips
+            else:
+                encontrados.update(ip for ip in ips if ipaddress.ip_address(ip) in rede)
+        return encontrados
+
+    def _por_nome(self, termo: str, candidatos) -> set:
+        termo = termo.lower()
+        if len(termo) >= TAMANHO_NGRAMA:
+            conjuntos = sorted((self._ngramas.get(n, set()) for n in _ngramas(termo)), key=len)
+            base = set(conjuntos[0]).intersection(*conjuntos[1:])
+            if candidatos is not None:
+                base &= candidatos
+        else:
+            base = candidatos if candidatos is not None else self._entradas.keys()
+        # Os trigramas só garantem candidatos: confirma a substring no nome
+        return {ip for ip in base if termo in self._entradas[ip].nome}
+
+    def _chave_ordenacao(self, campo: str):
+        if campo == "nome":
+            return lambda ip: (self._entradas[ip].nome, self._entradas[ip].chave_ip)
+        if campo == "data_registro":
+            return lambda ip: (self._entradas[ip].data_registro, self._entradas[ip].chave_ip)
+        if campo == "status":
+            return lambda ip: (self._entradas[ip].status, self._entradas[ip].chave_ip)
+        return lambda ip: self._entradas[ip].chave_ip
+
+    def consultar(self, tag: str = None, porta: int = None, status: str = None, subrede: str = None,
+                  q: str = None, pagina: int = 1, por_pagina: int = 50, ordenar: str = "ip") -> tuple[int, list]:
+        """
+        Filtra pelos índices e devolve (total, [ips da página]). Os filtros combinam-se com E.
+        `ordenar` aceita um campo de ORDENACOES, com "-" à frente para ordem decrescente.
+        Lança ValueError para ordenação ou sub-rede inválidas.
+        """
+        decrescente = bool(ordenar) and ordenar.startswith("-")
+        campo = (ordenar or "ip").lstrip("-")
+        if campo not in ORDENACOES:
+            raise ValueError(f"Ordenação inválida: {ordenar}")
+        pagina = max(1, int(pagina))
+        por_pagina = max(1, int(por_pagina))
+
+        with self._lock:
+            candidatos = None
+            filtros = []
+            if tag:
+                filtros.append(lambda: self._por_tag(tag))
+            if porta is not None:
+                filtros.append(lambda: set(self._portas.get(int(porta), ())))
+            if status:
+                filtros.append(lambda: set(self._status.get(status.capitalize(), ())))
+            if subrede:
+                filtros.append(lambda: self._por_subrede(subrede))
+            for filtro in filtros:
+                resultado = filtro()
+                candidatos = resultado if candidatos is None else candidatos & resultado
+                if not candidatos:
+                    return 0, []
+            if q:
+                candidatos = self._por_nome(q, candidatos)
+            if candidatos is None:
+                candidatos = self._entradas.keys()
+
+            total = len(candidatos)
+            fim = pagina * por_pagina
+            chave = self._chave_ordenacao(campo)
+            # Só ordena os primeiros `fim` itens (O(n log k)) em vez do conjunto inteiro
+            if decrescente:
+                primeiros = heapq.nlargest(fim, candidatos, key=chave)
+            else:
+                primeiros = heapq.nsmallest(fim, candidatos, key=chave)
+        return total, primeiros[fim - por_pagina:]
+
+    def contagens(self) -> dict:
+        """Totais por status, porta e tag (para resumos sem percorrer o inventário)."""
+        with self._lock:
+            return {
+                "total": len(self._entradas),
+                "status": {s: len(ips) for s, ips in self._status.items()},
+                "portas": {p: len(ips) for p, ips in self._portas.items()},
+                "tags": {t: len(ips) for t, ips in self._tags.items()},
+            }
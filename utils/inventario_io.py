@@ -0,0 +1,154 @@
+# utils/inventario_io.py
+"""
+Exportação e importação do inventário em fluxo (NDJSON, CSV e array JSON).
+
+Tudo aqui trabalha com geradores: a exportação produz uma linha por CLP e a
+importação lê o upload linha a linha, por isso a memória usada não depende
+do tamanho do inventário. A aplicação dos registros (em lotes) fica em
+utils/CLP.importar_clps.
+"""
+import csv
+import io
+import ipaddress
+import json
+
+# --- Configurações do Módulo ---
+FORMATOS_EXPORTACAO = ("ndjson", "csv", "json")
+FORMATOS_IMPORTACAO = ("ndjson", "csv")
+COLUNAS_CSV = ("IP", "nome", "descricao", "UNIDADE", "PORTAS", "tags", "status", "data_registro")
+SEPARADOR_LISTA = ";"   # Separador de PORTAS e tags dentro de uma célula CSV
+TIPOS_CONTEUDO = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    "json": "application/json",
+}
+
+
+# --- Exportação ---
+
+def exportar_ndjson(registros):
+    """Um objeto JSON por linha."""
+    for info in registros:
+        yield json.dumps(info, ensure_ascii=False) + "\n"
+
+
+def exportar_json(registros):
+    """Array JSON produzido aos pedaços (o mesmo formato de uma lista serializada de uma vez)."""
+    yield "["
+    primeiro = True
+    for info in registros:
+        yield ("" if primeiro else ",") + json.dumps(info, ensure_ascii=False)
+        primeiro = False
+    yield "]\n"
+
+
+def _celula(valor):
+    if isinstance(valor, (list, tuple)):
+        return SEPARADOR_LISTA.join(str(v) for v in valor)
+    return "" if valor is None else valor
+
+
+def exportar_csv(registros):
+    """Cabeçalho + uma linha por CLP (PORTAS e tags separadas por SEPARADOR_LISTA)."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(COLUNAS_CSV)
+    for info in registros:
+        escritor.writerow([_celula(info.get(coluna)) for coluna in COLUNAS_CSV])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def exportar(registros, formato: str):
+    if formato == "csv":
+        return exportar_csv(registros)
+    if formato == "json":
+        return exportar_json(registros)
+    return exportar_ndjson(registros)
+
+
+# --- Importação ---
+
+def _lista(valor) -> list:
+    if valor is None or valor == "":
+        return []
+    if isinstance(valor, str):
+        return [parte.strip() for parte in valor.split(SEPARADOR_LISTA) if parte.strip()]
+    if isinstance(valor, (list, tuple)):
+        return list(valor)
+    return [valor]
+
+
+def normalizar_registro(dados) -> dict:
+    """
+    Valida um registro importado e devolve {IP, PORTAS, tags, nome?, descricao?, UNIDADE?}.
+    Campos ausentes não são devolvidos (não apagam os do CLP existente). Lança ValueError.
+    """
+    if not isinstance(dados, dict):
+        raise ValueError("o registro deve ser um objeto")
+    ip = str(dados.get("IP") or dados.get("ip") or "").strip()
+    if not ip:
+        raise ValueError("IP em falta")
+    try:
+        ip = str(ipaddress.ip_address(ip))
+    except ValueError:
+        raise ValueError(f"IP inválido: {ip}")
+
+    portas = []
+    for porta in _lista(dados.get("PORTAS", dados.get("portas"))):
+        try:
+            porta = int(porta)
+        except (TypeError, ValueError):
+            raise ValueError(f"porta inválida: {porta}")
+        if not 0 < porta < 65536:
+            raise ValueError(f"porta fora do intervalo: {porta}")
+        if porta not in portas:
+            portas.append(porta)
+
+    registro = {"IP": ip, "PORTAS": portas, "tags": [str(t).strip() for t in _lista(dados.get("tags")) if str(t).strip()]}
+    for campo in ("nome", "descricao"):
+        if dados.get(campo) not in (None, ""):
+            registro[campo] = str(dados[campo])
+    if dados.get("UNIDADE") not in (None, ""):
+        try:
+            registro["UNIDADE"] = int(dados["UNIDADE"])
+        except (TypeError, ValueError):
+            raise ValueError(f"UNIDADE inválida: {dados['UNIDADE']}")
+    return registro
+
+
+def _linhas_texto(fluxo):
+    """Decodifica as linhas (bytes) de um fluxo binário, uma de cada vez."""
+    for linha in fluxo:
+        yield linha.decode("utf-8-sig") if isinstance(linha, bytes) else linha
+
+
+def ler_ndjson(fluxo):
+    """Gera (número da linha, registro normalizado ou ValueError) a partir de um fluxo NDJSON."""
+    for numero, linha in enumerate(_linhas_texto(fluxo), start=1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield numero, normalizar_registro(json.loads(linha))
+        except json.JSONDecodeError as e:
+            yield numero, ValueError(f"JSON inválido: {e.msg}")
+        except ValueError as e:
+            yield numero, e
+
+
+def ler_csv(fluxo):
+    """Gera (número da linha, registro normalizado ou ValueError) a partir de um CSV com cabeçalho."""
+    leitor = csv.DictReader(_linhas_texto(fluxo))
+    for dados in leitor:
+        try:
+            yield leitor.line_num, normalizar_registro(dados)
+        except ValueError as e:
+            yield leitor.line_num, e
+
+
+def ler(fluxo, formato: str):
+    return ler_csv(fluxo) if formato == "csv" else ler_ndjson(fluxo)
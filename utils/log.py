@@ -1,39 +1,371 @@
+import atexit
+import gzip
+import json
 import os
 import logging
+import logging.handlers
+import queue
+import re
+import shutil
+import struct
+import sys
+import time
+import zlib
+from datetime import datetime
+from threading import Thread
+
+from . import eventos, metricas
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 logs_dir = os.path.join(BASE_DIR, "logs")
 caminho_app = os.path.join(logs_dir, "app.log")
 caminho_coleta = os.path.join(logs_dir, "coleta.log")
 
+# Leitura incremental (tail) dos logs
+TAIL_LIMITE_PADRAO = 200          # Linhas devolvidas na primeira carga / por chamada
+TAIL_BLOCO_BYTES = 64 * 1024      # Tamanho do bloco lido de trás para frente
+TAIL_MAX_BYTES = 1024 * 1024      # Máximo de bytes lidos a partir de um cursor por chamada
+
+# Pipeline de escrita: os produtores só colocam o registro numa fila; uma
+# thread escreve em lotes e faz a rotação dos arquivos.
+LOG_NIVEL = logging.INFO
+LOG_FILA_MAX = 10000                  # Registros à espera; com a fila cheia, os novos são descartados
+LOG_LOTE_MAX = 500                    # Registros escritos por chamada a write()
+LOG_TAMANHO_MAX = 10 * 1024 * 1024    # Roda o arquivo ao atingir este tamanho...
+LOG_ROTACAO_SEGUNDOS = 24 * 3600      # ...ou depois de aberto há este tempo
+LOG_ARQUIVOS_MAX = 10                 # Segmentos comprimidos mantidos por arquivo
+FORMATO = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Formato das linhas: "texto" (hora - nível - mensagem) ou "jsonl" (um objeto JSON por
+# linha, com os campos estruturados ip/evento/latencia_ms passados a log()/log_coleta()).
+# Os leitores aceitam os dois, por isso a troca pode ser feita a qualquer momento. Nas
+# linhas de texto o filtro por IP procura o endereço na própria mensagem.
+LOG_FORMATO = "texto"
+CAMPOS_ESTRUTURADOS = ("ip", "evento", "latencia_ms")
+# Um IPv4 dentro do texto, sem dígitos colados (10.0.0.1 não aparece em 110.0.0.12)
+_ANTES_IP, _DEPOIS_IP = r"(?<!\d)(?<!\d\.)", r"(?!\.?\d)"
+_IPV4_TEXTO = re.compile(_ANTES_IP + r"\d{1,3}(?:\.\d{1,3}){3}" + _DEPOIS_IP)
+# Índice esparso <arquivo>.idx: uma entrada por bloco de LOG_INDICE_LINHAS linhas, com o
+# intervalo de tempo, os offsets, os níveis presentes e um filtro de Bloom dos IPs do bloco.
+LOG_INDICE_LINHAS = 256
+_ENTRADA_INDICE = struct.Struct("<ddqqIQ")   # ts_inicio, ts_fim, offset_inicio, offset_fim, níveis, bloom
+
 # garante que a pasta de logs exista (IMPORTANTE)
 os.makedirs(logs_dir, exist_ok=True)
 
-# Logger principal
-logging.basicConfig(
-    filename=caminho_app,
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    encoding="utf-8"
-)
+_fila_logs = queue.Queue(maxsize=LOG_FILA_MAX)
+_estatisticas = {"enfileirados": 0, "descartados": 0, "escritos": 0, "lotes": 0, "rotacoes": 0}
+_encaminhar = None   # callable(lote): num processo filho, recebe os registros em vez dos arquivos
 
-# Logger exclusivo da coleta
-logger_coleta = logging.getLogger("coleta")
-logger_coleta.setLevel(logging.DEBUG)
 
-# Adiciona um handler separado para o arquivo coleta.log
-handler_coleta = logging.FileHandler(caminho_coleta, encoding="utf-8")
-handler_coleta.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-logger_coleta.addHandler(handler_coleta)
+# --- Segmentos rodados ---
+# Cada segmento rodado chama-se <arquivo>.<fim>.gz, onde <fim> é o offset lógico
+# (bytes escritos desde o primeiro segmento ainda guardado) logo após a sua
+# última linha. O arquivo atual começa nesse offset, por isso os cursores de
+# ler_logs_incremental continuam válidos através das rotações.
+
+def _segmentos_arquivados(caminho: str) -> list:
+    """[(inicio, fim, arquivo .gz)] dos segmentos rodados, do mais antigo para o mais recente."""
+    pasta, nome = os.path.split(caminho)
+    prefixo = f"{nome}."
+    try:
+        nomes = os.listdir(pasta or ".")
+    except OSError:
+        return []
+    segmentos = []
+    for arquivo in nomes:
+        meio = arquivo[len(prefixo):-3]
+        if not (arquivo.startswith(prefixo) and arquivo.endswith(".gz") and meio.isdigit()):
+            continue
+        completo = os.path.join(pasta, arquivo)
+        try:
+            # O trailer do gzip guarda o tamanho descomprimido (mod 2^32) nos últimos 4 bytes
+            with open(completo, "rb") as f:
+                f.seek(-4, os.SEEK_END)
+                tamanho = int.from_bytes(f.read(4), "little")
+        except OSError:
+            continue
+        fim = int(meio)
+        segmentos.append((fim - tamanho, fim, completo))
+    segmentos.sort(key=lambda s: s[1])
+    return segmentos
+
+
+def _caminho_indice(arquivo: str) -> str:
+    """Índice de um arquivo de log (atual ou segmento <arquivo>.<fim>.gz)."""
+    return f"{arquivo[:-3] if arquivo.endswith('.gz') else arquivo}.idx"
+
+
+def _bit_nivel(nivel: int) -> int:
+    return 1 << min(max(nivel, 0) // 10, 31)
+
+
+def _bits_ip(ip) -> int:
+    h = zlib.crc32(str(ip).encode("utf-8"))
+    return (1 << (h & 63)) | (1 << ((h >> 6) & 63))
+
+
+def _base_atual(caminho: str, arquivados: list = None) -> int:
+    """Offset lógico do primeiro byte do arquivo atual."""
+    if arquivados is None:
+        arquivados = _segmentos_arquivados(caminho)
+    return arquivados[-1][1] if arquivados else 0
+
+
+class _ArquivoRotativo:
+    """Arquivo de log escrito só pela thread de escrita, rodado por tamanho ou idade."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self._f = None
+        self._indice = None
+        self._bloco = None     # [ts_inicio, ts_fim, offset_inicio, níveis, bloom, linhas] do bloco em curso
+        self._tamanho = 0
+        self._aberto_em = 0.0
+
+    def escrever(self, entradas: list):
+        """Escreve [(linha em bytes, instante, nível, ips)] de uma vez e atualiza o índice esparso."""
+        if self._f is None:
+            self._f = open(self.caminho, "ab")
+            self._indice = open(_caminho_indice(self.caminho), "ab")
+            self._aberto_em = time.monotonic()
+            self._bloco = None
+            self._tamanho = os.fstat(self._f.fileno()).st_size
+        # fstat e não tell(): o arquivo pode ser truncado por fora (limpar_logs)
+        offset = os.fstat(self._f.fileno()).st_size
+        if offset < self._tamanho:
+            self._indice.truncate(0)
+            self._bloco = None
+
+        for linha, instante, nivel, ips in entradas:
+            if self._bloco is None:
+                self._bloco = [instante, instante, offset, 0, 0, 0]
+            bloco = self._bloco
+            bloco[1] = instante
+            bloco[3] |= _bit_nivel(nivel)
+            for ip in ips:
+                bloco[4] |= _bits_ip(ip)
+            bloco[5] += 1
+            offset += len(linha)
+            if bloco[5] >= LOG_INDICE_LINHAS:
+                self._fechar_bloco(offset)
+        self._f.write(b"".join(linha for linha, _, _, _ in entradas))
+        self._f.flush()
+        self._indice.flush()
+        self._tamanho = offset
+        if offset >= LOG_TAMANHO_MAX or (offset and time.monotonic() - self._aberto_em >= LOG_ROTACAO_SEGUNDOS):
+            self._rodar(offset)
+
+    def _fechar_bloco(self, offset_fim: int):
+        ts_inicio, ts_fim, offset_inicio, niveis, bloom, _ = self._bloco
+        self._indice.write(_ENTRADA_INDICE.pack(ts_inicio, ts_fim, offset_inicio, offset_fim, niveis, bloom))
+        self._bloco = None
+
+    def _rodar(self, tamanho: int):
+        if self._bloco is not None:
+            self._fechar_bloco(tamanho)  # o índice do segmento rodado cobre-o por inteiro
+        self.fechar()
+        arquivados = _segmentos_arquivados(self.caminho)
+        destino = f"{self.caminho}.{_base_atual(self.caminho, arquivados) + tamanho:015d}"
+        if os.path.exists(_caminho_indice(self.caminho)):
+            os.replace(_caminho_indice(self.caminho), f"{destino}.idx")
+        os.replace(self.caminho, destino)
+        with open(destino, "rb") as origem, gzip.open(f"{destino}.gz.tmp", "wb") as comprimido:
+            shutil.copyfileobj(origem, comprimido)
+        os.replace(f"{destino}.gz.tmp", f"{destino}.gz")
+        os.remove(destino)
+        for _, _, antigo in (arquivados + [(0, 0, f"{destino}.gz")])[:-LOG_ARQUIVOS_MAX]:
+            os.remove(antigo)
+            if os.path.exists(_caminho_indice(antigo)):
+                os.remove(_caminho_indice(antigo))
+        _estatisticas["rotacoes"] += 1
+
+    def fechar(self):
+        if self._f is not None:
+            self._f.close()
+            self._indice.close()
+            self._f = self._indice = None
+
+
+class _FilaHandler(logging.handlers.QueueHandler):
+    """Coloca o registro na fila sem bloquear; com a fila cheia, descarta-o e conta."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            _estatisticas["enfileirados"] += 1
+        except queue.Full:
+            _estatisticas["descartados"] += 1
+
+
+def _formatar(registro, formatador) -> str:
+    if LOG_FORMATO == "jsonl":
+        dados = {
+            "ts": round(registro.created, 3),
+            "hora": formatador.formatTime(registro),
+            "nivel": registro.levelname,
+            "mensagem": registro.getMessage(),
+        }
+        for campo in CAMPOS_ESTRUTURADOS:
+            valor = getattr(registro, campo, None)
+            if valor is not None:
+                dados[campo] = valor
+        return json.dumps(dados, ensure_ascii=False, default=str)
+    return formatador.format(registro)
+
+
+def _ips_do_registro(registro) -> tuple:
+    """IPs que o índice esparso associa à linha: o campo estruturado e, no formato texto, os da mensagem."""
+    ip = getattr(registro, "ip", None)
+    ips = (str(ip),) if ip else ()
+    if LOG_FORMATO != "jsonl":
+        # A linha de texto não guarda o campo estruturado: o filtro vai procurar o IP na mensagem
+        ips += tuple(_IPV4_TEXTO.findall(registro.getMessage()))
+    return ips
+
+
+def _escrever_logs():
+    """Thread de escrita: junta os registros disponíveis e escreve cada arquivo de uma vez."""
+    formatador = logging.Formatter(FORMATO)
+    destinos = {"app": _ArquivoRotativo(caminho_app), "coleta": _ArquivoRotativo(caminho_coleta)}
+    parar = False
+    while not parar:
+        lote = [_fila_logs.get()]
+        while len(lote) < LOG_LOTE_MAX:
+            try:
+                lote.append(_fila_logs.get_nowait())
+            except queue.Empty:
+                break
+        if None in lote:  # sentinela de encerramento: escreve o que veio antes dela e sai
+            lote = lote[:lote.index(None)]
+            parar = True
+
+        if _encaminhar is not None:
+            try:
+                _encaminhar(lote)
+            except Exception as e:
+                print(f"[log] Erro ao encaminhar {len(lote)} registro(s): {e}", file=sys.stderr)
+            _estatisticas["escritos"] += len(lote)
+            _estatisticas["lotes"] += 1
+            continue
+
+        linhas = {"app": [], "coleta": []}
+        for registro in lote:
+            destino = "coleta" if registro.name.split(".")[0] == "coleta" else "app"
+            try:
+                linha = (_formatar(registro, formatador) + "\n").encode("utf-8")
+            except Exception:
+                continue
+            linhas[destino].append((linha, registro.created, registro.levelno, _ips_do_registro(registro)))
+        for destino, entradas in linhas.items():
+            if not entradas:
+                continue
+            try:
+                destinos[destino].escrever(entradas)
+            except OSError as e:
+                print(f"[log] Erro ao escrever {destinos[destino].caminho}: {e}", file=sys.stderr)
+                destinos[destino].fechar()
+        _estatisticas["escritos"] += len(lote)
+        _estatisticas["lotes"] += 1
+    for arquivo in destinos.values():
+        arquivo.fechar()
+
+
+def parar_escrita(timeout: float = 5.0):
+    """Escreve o que ainda está na fila e termina a thread de escrita (chamado ao sair)."""
+    if _escritor.is_alive():
+        _fila_logs.put(None)
+        _escritor.join(timeout)
+
+
+def encaminhar_para(funcao):
+    """
+    Usado por processos filhos (ex.: scanner fora do processo web): em vez de
+    escrever nos arquivos, a thread de escrita entrega cada lote a funcao(lote),
+    que o envia ao processo principal. Só o principal escreve e roda os arquivos.
+    """
+    global _encaminhar
+    _encaminhar = funcao
+
+
+def reemitir(registros):
+    """No processo principal: passa registros recebidos de um filho pelos handlers locais (arquivo e SSE)."""
+    for registro in registros:
+        logging.getLogger(registro.name).handle(registro)
+
+
+def estatisticas() -> dict:
+    """Registros enfileirados, descartados por sobrecarga, escritos e rotações."""
+    return dict(_estatisticas, fila=_fila_logs.qsize())
+
+
+@metricas.registar_coletor
+def _coletar_metricas():
+    e = estatisticas()
+    resultados = [({"resultado": "descartado"}, e["descartados"])]
+    if _encaminhar is None:
+        # Num filho que encaminha, os registros voltam a ser contados ao chegar ao processo principal
+        resultados += [({"resultado": "enfileirado"}, e["enfileirados"]), ({"resultado": "escrito"}, e["escritos"])]
+    return [
+        ("clp_log_registros_total", "counter", "Registros de log por resultado.", resultados),
+        ("clp_log_fila_profundidade", "gauge", "Registros de log à espera de escrita.", [({}, e["fila"])]),
+        ("clp_log_rotacoes_total", "counter", "Rotações dos arquivos de log.", [({}, e["rotacoes"])]),
+    ]
+
+
+_escritor = Thread(target=_escrever_logs, name="EscritorLogs", daemon=True)
+_escritor.start()
+atexit.register(parar_escrita)
+
+# Logger principal (app.log)
+_raiz = logging.getLogger()
+_raiz.setLevel(LOG_NIVEL)
+_raiz.addHandler(_FilaHandler(_fila_logs))
+
+# Logger exclusivo da coleta (coleta.log): o mesmo handler de fila, a thread separa pelo nome
+logger_coleta = logging.getLogger("coleta")
+logger_coleta.setLevel(LOG_NIVEL)
+logger_coleta.addHandler(_FilaHandler(_fila_logs))
 
 # --- ALTERAÇÃO PRINCIPAL AQUI ---
 # Impede que os logs da coleta "subam" para o logger principal (app.log)
 logger_coleta.propagate = False
 
 
-def log(mensagem: str, level=logging.INFO) -> None:
-    """Log geral do sistema."""
-    logging.log(level, mensagem)
+class _EventosHandler(logging.Handler):
+    """Publica cada linha de log no barramento de eventos (canal SSE) do tópico indicado."""
+
+    def __init__(self, topico: str):
+        super().__init__()
+        self.topico = topico
+        self._formatter = logging.Formatter()
+
+    def emit(self, record):
+        # Sem ninguém a ouvir, não formata nada (custo quase zero no caminho quente).
+        if not eventos.tem_assinantes(self.topico):
+            return
+        try:
+            eventos.publicar(self.topico, "log", {
+                "hora": self._formatter.formatTime(record),
+                "nivel": record.levelname,
+                "mensagem": record.getMessage(),
+            })
+        except Exception:
+            self.handleError(record)
+
+
+logger_coleta.addHandler(_EventosHandler(eventos.TOPICO_COLETA))
+logging.getLogger().addHandler(_EventosHandler(eventos.TOPICO_APP))
+
+
+def _extra(ip, evento, latencia_ms):
+    campos = {"ip": ip, "evento": evento, "latencia_ms": latencia_ms}
+    return {k: v for k, v in campos.items() if v is not None} or None
+
+
+def log(mensagem: str, level=logging.INFO, ip: str = None, evento: str = None, latencia_ms: float = None) -> None:
+    """Log geral do sistema. ip/evento/latencia_ms vão como campos próprios no formato jsonl."""
+    logging.log(level, mensagem, extra=_extra(ip, evento, latencia_ms))
 
 
 def log_and_print(mensagem: str, level=logging.INFO) -> None:
@@ -42,14 +374,34 @@ def log_and_print(mensagem: str, level=logging.INFO) -> None:
     logging.log(level, mensagem)
 
 
-def log_coleta(mensagem: str, level=logging.INFO) -> None:
-    """Log exclusivo da coleta de IPs."""
-    logger_coleta.log(level, mensagem)
+def log_coleta(mensagem: str, level=logging.INFO, ip: str = None, evento: str = None,
+               latencia_ms: float = None) -> None:
+    """Log exclusivo da coleta de IPs. ip/evento/latencia_ms vão como campos próprios no formato jsonl."""
+    logger_coleta.log(level, mensagem, extra=_extra(ip, evento, latencia_ms))
+
+
+def limpar_logs(caminho=caminho_app) -> None:
+    """Esvazia o arquivo de log e apaga os seus segmentos rodados."""
+    for _, _, arquivo in _segmentos_arquivados(caminho):
+        try:
+            os.remove(arquivo)
+            if os.path.exists(_caminho_indice(arquivo)):
+                os.remove(_caminho_indice(arquivo))
+        except OSError as e:
+            logging.error(f"Não foi possível apagar o segmento de log {arquivo}: {e}")
+    for arquivo in (caminho, _caminho_indice(caminho)):
+        with open(arquivo, "w", encoding="utf-8"):
+            pass
+
+
+def _ler_segmento(arquivo: str) -> bytes:
+    with gzip.open(arquivo, "rb") as f:
+        return f.read()
 
 
 def carregar_logs(caminho=caminho_app):
-    """Carrega logs de um arquivo específico (padrão: app.log).
-       Se o arquivo não existir, cria-o vazio e retorna lista vazia.
+    """Carrega logs de um arquivo específico (padrão: app.log), incluindo os segmentos rodados.
+       Se o arquivo não existir, cria-o vazio (e só os segmentos rodados são lidos).
     """
     logs = []
 
@@ -58,7 +410,7 @@ def carregar_logs(caminho=caminho_app):
     if dir_do_arquivo:
         os.makedirs(dir_do_arquivo, exist_ok=True)
 
-    # se não existe, cria um arquivo vazio e retorna lista vazia
+    # se não existe, cria um arquivo vazio
     if not os.path.exists(caminho):
         # cria o arquivo (modo append -> cria se não existir)
         try:
@@ -67,34 +419,294 @@ def carregar_logs(caminho=caminho_app):
             # se não conseguiu criar, registra no logger e devolve mensagem de erro
             logging.error(f"Não foi possível criar o arquivo de log {caminho}: {e}")
             return [{"hora": "", "nivel": "ERRO", "mensagem": f"Não foi possível criar o arquivo de log: {e}"}]
-        return []  # arquivo criado, mas sem conteúdo ainda
 
+    linhas = []
     try:
-        with open(caminho, "r", encoding="utf-8") as f:
-            linhas = f.readlines()
-    except UnicodeDecodeError:
-        # caso o arquivo tenha outra codificação, tenta cp1252 com replace
-        with open(caminho, "r", encoding="cp1252", errors="replace") as f:
-            linhas = f.readlines()
+        # Segmentos rodados (mais antigos primeiro) e depois o arquivo atual
+        for _, _, arquivo in _segmentos_arquivados(caminho):
+            linhas.extend(_decodificar(_ler_segmento(arquivo)).splitlines())
+        with open(caminho, "rb") as f:
+            # caso o arquivo tenha outra codificação, _decodificar tenta cp1252 com replace
+            linhas.extend(_decodificar(f.read()).splitlines())
     except Exception as e:
         logging.error(f"Erro ao abrir o arquivo de log {caminho}: {e}")
         return [{"hora": "", "nivel": "ERRO", "mensagem": f"Erro ao abrir arquivo de log: {e}"}]
 
     for linha in linhas:
-        linha = linha.strip()
-        if linha:
-            partes = linha.split(" - ", 2)
-            if len(partes) == 3:
-                logs.append({
-                    "hora": partes[0],
-                    "nivel": partes[1],
-                    "mensagem": partes[2]
-                })
-            else:
-                logs.append({"hora": "", "nivel": "", "mensagem": linha})
+        registro = _parse_linha(linha)
+        if registro:
+            logs.append(registro)
     return logs
 
 
+def _parse_linha(linha: str):
+    """Converte uma linha do log (texto ou jsonl) num dicionário (hora, nível, mensagem e campos estruturados)."""
+    linha = linha.strip()
+    if not linha:
+        return None
+    if linha.startswith("{"):
+        try:
+            dados = json.loads(linha)
+        except json.JSONDecodeError:
+            dados = None
+        if isinstance(dados, dict):
+            registro = {"hora": dados.get("hora", ""), "nivel": dados.get("nivel", ""),
+                        "mensagem": dados.get("mensagem", "")}
+            for campo in ("ts",) + CAMPOS_ESTRUTURADOS:
+                if campo in dados:
+                    registro[campo] = dados[campo]
+            return registro
+    partes = linha.split(" - ", 2)
+    if len(partes) == 3:
+        return {"hora": partes[0], "nivel": partes[1], "mensagem": partes[2]}
+    return {"hora": "", "nivel": "", "mensagem": linha}
+
+
+def _decodificar(dados: bytes) -> str:
+    """Decodifica bytes do log em UTF-8, com fallback para cp1252 (igual a carregar_logs)."""
+    try:
+        return dados.decode("utf-8")
+    except UnicodeDecodeError:
+        return dados.decode("cp1252", errors="replace")
+
+
+def _ler_ultimas_linhas(f, tamanho: int, limite: int):
+    """Lê o arquivo de trás para frente, em blocos, até obter as últimas `limite` linhas completas.
+       O custo depende apenas de `limite`, não do tamanho do arquivo.
+       Retorna (linhas, offset_fim), onde offset_fim é a posição logo após a última quebra de linha.
+    """
+    pos = tamanho
+    buffer = b""
+    while pos > 0 and buffer.count(b"\n") <= limite:
+        passo = min(TAIL_BLOCO_BYTES, pos)
+        pos -= passo
+        f.seek(pos)
+        buffer = f.read(passo) + buffer
+
+    # Uma última linha sem '\n' ainda está a ser escrita: fica para a próxima leitura.
+    ultimo_nl = buffer.rfind(b"\n")
+    if ultimo_nl < 0:
+        return [], pos
+    fim = pos + ultimo_nl + 1
+    linhas = buffer[:ultimo_nl].split(b"\n")
+    if pos > 0:
+        # A primeira linha do buffer pode estar cortada a meio; descarta-a.
+        linhas = linhas[1:]
+    return (linhas[-limite:] if limite else []), fim
+
+
+def _ultimas_linhas_arquivadas(arquivados: list, limite: int) -> list:
+    """Últimas `limite` linhas dos segmentos rodados (do mais recente para trás)."""
+    linhas = []
+    for _, _, arquivo in reversed(arquivados):
+        if len(linhas) >= limite:
+            break
+        dados = _ler_segmento(arquivo).rstrip(b"\n")
+        if dados:
+            linhas = dados.split(b"\n")[-(limite - len(linhas)):] + linhas
+    return linhas
+
+
+def _ler_arquivado_desde(arquivados: list, cursor: int, limite: int):
+    """Linhas de um segmento rodado a partir do cursor lógico. Retorna (linhas, proximo_cursor)."""
+    for inicio, fim, arquivo in arquivados:
+        if inicio <= cursor < fim:
+            dados = _ler_segmento(arquivo)[cursor - inicio:]
+            linhas = dados.split(b"\n")
+            if linhas and not linhas[-1]:
+                linhas.pop()
+            linhas = linhas[:limite]
+            return linhas, min(fim, cursor + sum(len(l) + 1 for l in linhas))
+    return [], cursor
+
+
+def ler_logs_incremental(caminho=caminho_app, cursor=None, limite: int = TAIL_LIMITE_PADRAO):
+    """Lê apenas as linhas novas de um arquivo de log a partir de um cursor (offset em bytes).
+
+    O cursor é um offset lógico que atravessa as rotações: os segmentos rodados
+    ocupam os offsets anteriores ao início do arquivo atual.
+    - Sem cursor: devolve as últimas `limite` linhas, lidas a partir do fim do arquivo
+      (e dos segmentos rodados, se o arquivo atual tiver menos linhas).
+    - Com cursor: devolve as linhas completas escritas depois do offset (no máximo
+      `limite` linhas / TAIL_MAX_BYTES por chamada), começando no segmento rodado
+      onde o cursor cair.
+    Se o arquivo foi truncado (cursor maior que o tamanho), recomeça pelo fim.
+
+    Retorna uma tupla (logs, proximo_cursor).
+    """
+    arquivados = _segmentos_arquivados(caminho)
+    base = _base_atual(caminho, arquivados)
+    if not os.path.exists(caminho) and not arquivados:
+        return [], 0
+
+    try:
+        if cursor is not None and arquivados and arquivados[0][0] <= cursor < base:
+            linhas, proximo_cursor = _ler_arquivado_desde(arquivados, cursor, limite)
+        else:
+            linhas, proximo_cursor = _ler_atual(caminho, base, arquivados, cursor, limite)
+    except OSError as e:
+        logging.error(f"Erro ao ler o arquivo de log {caminho}: {e}")
+        return [{"hora": "", "nivel": "ERRO", "mensagem": f"Erro ao abrir arquivo de log: {e}"}], cursor or 0
+
+    logs = []
+    for linha in linhas:
+        registro = _parse_linha(_decodificar(linha))
+        if registro:
+            logs.append(registro)
+    return logs, proximo_cursor
+
+
+def _ler_atual(caminho: str, base: int, arquivados: list, cursor, limite: int):
+    """Leitura do arquivo atual (offsets locais = cursor - base). Retorna (linhas, proximo_cursor lógico)."""
+    if not os.path.exists(caminho):
+        # Acabou de rodar e ainda não foi recriado
+        return (_ultimas_linhas_arquivadas(arquivados, limite) if cursor is None else []), base
+    local = None if cursor is None else cursor - base
+    with open(caminho, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        tamanho = f.tell()
+
+        if local is None or local < 0 or local > tamanho:
+            linhas, proximo_cursor = _ler_ultimas_linhas(f, tamanho, limite)
+            if len(linhas) < limite and arquivados:
+                linhas = _ultimas_linhas_arquivadas(arquivados, limite - len(linhas)) + linhas
+        else:
+            cursor = local
+            f.seek(cursor)
+            dados = f.read(min(tamanho - cursor, TAIL_MAX_BYTES))
+            ultimo_nl = dados.rfind(b"\n")
+            if ultimo_nl < 0:
+                if len(dados) < TAIL_MAX_BYTES:
+                    return [], base + cursor
+                # Linha maior que TAIL_MAX_BYTES: entrega o bloco para não ficar preso.
+                linhas, proximo_cursor = [dados], cursor + len(dados)
+            else:
+                linhas = dados[:ultimo_nl].split(b"\n")
+                if len(linhas) > limite:
+                    # Devolve só as primeiras `limite` linhas; o resto vem na próxima chamada.
+                    linhas = linhas[:limite]
+                    proximo_cursor = cursor + sum(len(l) + 1 for l in linhas)
+                else:
+                    proximo_cursor = cursor + ultimo_nl + 1
+    return linhas, base + proximo_cursor
+
+
+# --- Consultas filtradas (nível, IP, intervalo de tempo) ---
+
+def _nivel_numerico(nivel) -> int:
+    if isinstance(nivel, int):
+        return nivel
+    valor = logging.getLevelName(str(nivel).upper())
+    return valor if isinstance(valor, int) else 0
+
+
+def _instante(registro: dict):
+    """Instante (epoch) de um registro lido: o campo ts do jsonl ou a hora do formato texto."""
+    if "ts" in registro:
+        return registro["ts"]
+    try:
+        return datetime.strptime(registro["hora"][:19], "%Y-%m-%d %H:%M:%S").timestamp()
+    except (ValueError, KeyError):
+        return None
+
+
+def corresponde(registro: dict, nivel=None, ip: str = None, de: float = None, ate: float = None) -> bool:
+    """
+    Filtro de um registro lido: nível mínimo, IP e intervalo [de, ate]. O IP é o campo
+    estruturado nas linhas jsonl (têm sempre "ts") e uma menção na mensagem nas de texto.
+    """
+    if nivel is not None and _nivel_numerico(registro.get("nivel")) < _nivel_numerico(nivel):
+        return False
+    if ip is not None:
+        if "ts" in registro:
+            if registro.get("ip") != ip:
+                return False
+        elif not re.search(_ANTES_IP + re.escape(ip) + _DEPOIS_IP, registro.get("mensagem", "")):
+            return False
+    if de is not None or ate is not None:
+        instante = _instante(registro)
+        if instante is None or (de is not None and instante < de) or (ate is not None and instante > ate):
+            return False
+    return True
+
+
+def _ler_indice(arquivo: str, tamanho: int) -> list:
+    """Entradas do índice esparso que cabem nos `tamanho` bytes do arquivo (o resto está obsoleto)."""
+    try:
+        with open(_caminho_indice(arquivo), "rb") as f:
+            dados = f.read()
+    except OSError:
+        return []
+    dados = dados[:len(dados) - len(dados) % _ENTRADA_INDICE.size]
+    return [e for e in _ENTRADA_INDICE.iter_unpack(dados) if e[3] <= tamanho]
+
+
+def _regioes(arquivo: str, tamanho: int, nivel, ip, de, ate):
+    """
+    Regiões (inicio, fim) a ler, da mais recente para a mais antiga. Blocos do índice
+    cujo resumo exclui o filtro são saltados; o final ainda não indexado é sempre lido.
+    Gera None ao chegar a um bloco anterior a `de` (tudo o que vem depois também é).
+    """
+    blocos = _ler_indice(arquivo, tamanho)
+    fim_indexado = max((b[3] for b in blocos), default=0)
+    if fim_indexado < tamanho:
+        yield fim_indexado, tamanho
+    minimo_nivel = _nivel_numerico(nivel) // 10 if nivel is not None else None
+    bits_ip = _bits_ip(ip) if ip is not None else None
+    for ts_inicio, ts_fim, inicio, fim, niveis, bloom in reversed(blocos):
+        if de is not None and ts_fim < de:
+            yield None
+            return
+        if ate is not None and ts_inicio > ate:
+            continue
+        if minimo_nivel is not None and not niveis >> minimo_nivel:
+            continue
+        if bits_ip is not None and bloom & bits_ip != bits_ip:
+            continue
+        yield inicio, fim
+
+
+def consultar_logs(caminho=caminho_app, nivel=None, ip: str = None, de: float = None, ate: float = None,
+                   limite: int = TAIL_LIMITE_PADRAO):
+    """
+    Os `limite` registros mais recentes que passam no filtro (nível mínimo, IP, intervalo),
+    procurando do arquivo atual para os segmentos rodados e lendo só as regiões que o
+    índice esparso não exclui. O filtro por IP usa o campo estruturado nas linhas jsonl
+    e procura o endereço na mensagem nas linhas de texto (ver corresponde).
+    Retorna (logs em ordem cronológica, cursor para continuar com ler_logs_incremental).
+    """
+    arquivados = _segmentos_arquivados(caminho)
+    base = _base_atual(caminho, arquivados)
+    tamanho_atual = os.path.getsize(caminho) if os.path.exists(caminho) else 0
+    segmentos = [(caminho, tamanho_atual, None)]
+    segmentos += [(arquivo, fim - inicio, arquivo) for inicio, fim, arquivo in reversed(arquivados)]
+
+    encontrados = []   # do mais recente para o mais antigo
+    try:
+        for arquivo, tamanho, comprimido in segmentos:
+            conteudo = None
+            for regiao in _regioes(arquivo, tamanho, nivel, ip, de, ate):
+                if regiao is None:
+                    return encontrados[::-1], base + tamanho_atual
+                inicio, fim = regiao
+                if comprimido:
+                    if conteudo is None:
+                        conteudo = _ler_segmento(comprimido)
+                    dados = conteudo[inicio:fim]
+                else:
+                    with open(arquivo, "rb") as f:
+                        f.seek(inicio)
+                        dados = f.read(fim - inicio)
+                for linha in reversed(dados.split(b"\n")):
+                    registro = _parse_linha(_decodificar(linha))
+                    if registro and corresponde(registro, nivel, ip, de, ate):
+                        encontrados.append(registro)
+                        if len(encontrados) >= limite:
+                            return encontrados[::-1], base + tamanho_atual
+    except OSError as e:
+        logging.error(f"Erro ao consultar o arquivo de log {caminho}: {e}")
+    return encontrados[::-1], base + tamanho_atual
+
 
 if __name__ == "__main__":
     print(carregar_logs())
\ No newline at end of file
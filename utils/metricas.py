@@ -0,0 +1,280 @@
+# utils/metricas.py
+"""
+Métricas da aplicação no formato de texto do Prometheus (rota /metrics).
+
+Sem dependências externas. Dois tipos de fonte:
+- Métricas registadas aqui (Contador, Histograma), atualizadas nos pontos
+  instrumentados; cada atualização é uma soma sob um Lock por série.
+- Coletores: funções chamadas apenas no momento do scrape, que convertem
+  contadores já existentes (estatísticas do coletor, fila, dedup, polling)
+  em amostras. Os caminhos por pacote só incrementam os contadores que já
+  mantinham, por isso sem ninguém a fazer scrape o custo é praticamente nulo.
+
+Outros processos (o scanner em clp_app/scanner/processo.py) enviam um
+instantaneo() das suas métricas; com definir_remoto() ele é somado às
+séries deste processo em exportar().
+"""
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+
+# Limites (em segundos) por omissão dos histogramas de latência
+BALDES_PADRAO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registo = {}        # nome -> métrica
+_coletores = []      # funções sem argumentos -> iterável de (nome, tipo, ajuda, [(labels, valor)])
+_remotos = {}        # origem -> último instantaneo() recebido de outro processo
+_registo_lock = Lock()
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _formatar_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in labels.items()) + "}"
+
+
+def _formatar_valor(valor) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+class _Metrica:
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, labels=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.labels = tuple(labels)
+        self._series = {}
+        self._lock = Lock()
+
+    def _chave(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def _cabecalho(self) -> list[str]:
+        return [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+
+    def instantaneo(self) -> dict:
+        """Cópia serializável (pickle) das séries, para enviar a outro processo."""
+        with self._lock:
+            series = [(chave, self._copiar(valor)) for chave, valor in self._series.items()]
+        return {"nome": self.nome, "tipo": self.tipo, "ajuda": self.ajuda, "labels": self.labels, "series": series}
+
+    def _copiar(self, valor):
+        return valor
+
+    def _somar(self, series):
+        """Acrescenta as séries de um instantaneo() às desta métrica."""
+        with self._lock:
+            for chave, valor in series:
+                self._somar_serie(tuple(chave), valor)
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor: float = 1, **labels):
+        chave = self._chave(labels)
+        with self._lock:
+            self._somar_serie(chave, valor)
+
+    def _somar_serie(self, chave: tuple, valor):
+        self._series[chave] = self._series.get(chave, 0) + valor
+
+    def exportar(self) -> list[str]:
+        with self._lock:
+            series = dict(self._series)
+        linhas = self._cabecalho()
+        for chave, valor in series.items():
+            linhas.append(f"{self.nome}{_formatar_labels(dict(zip(self.labels, chave)))} {_formatar_valor(valor)}")
+        return linhas
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, labels=(), baldes=BALDES_PADRAO):
+        super().__init__(nome, ajuda, labels)
+        self.baldes = tuple(sorted(baldes))
+
+    def observar(self, valor: float, **labels):
+        chave = self._chave(labels)
+        indice = bisect_left(self.baldes, valor)
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                # contagens por balde (não cumulativas; o último é o +Inf), soma, total
+                serie = self._series[chave] = [[0] * (len(self.baldes) + 1), 0.0, 0]
+            serie[0][indice] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def instantaneo(self) -> dict:
+        return dict(super().instantaneo(), baldes=self.baldes)
+
+    def _copiar(self, serie):
+        return list(serie[0]), serie[1], serie[2]
+
+    def _somar_serie(self, chave: tuple, valor):
+        contagens, soma, total = valor
+        if len(contagens) != len(self.baldes) + 1:
+            return  # baldes diferentes: as contagens não são comparáveis
+        serie = self._series.get(chave)
+        if serie is None:
+            serie = self._series[chave] = [[0] * (len(self.baldes) + 1), 0.0, 0]
+        serie[0] = [a + b for a, b in zip(serie[0], contagens)]
+        serie[1] += soma
+        serie[2] += total
+
+    @contextmanager
+    def cronometrar(self, **labels):
+        """Observa a duração do bloco `with`, mesmo que ele lance uma exceção."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, **labels)
+
+    def exportar(self) -> list[str]:
+        with self._lock:
+            series = {chave: (list(s[0]), s[1], s[2]) for chave, s in self._series.items()}
+        linhas = self._cabecalho()
+        for chave, (contagens, soma, total) in series.items():
+            labels = dict(zip(self.labels, chave))
+            acumulado = 0
+            for limite, n in zip(self.baldes + (float("inf"),), contagens):
+                acumulado += n
+                labels_balde = dict(labels, le=_formatar_valor(float(limite)))
+                linhas.append(f"{self.nome}_bucket{_formatar_labels(labels_balde)} {acumulado}")
+            linhas.append(f"{self.nome}_sum{_formatar_labels(labels)} {_formatar_valor(soma)}")
+            linhas.append(f"{self.nome}_count{_formatar_labels(labels)} {total}")
+        return linhas
+
+
+def _registar(metrica):
+    with _registo_lock:
+        existente = _registo.get(metrica.nome)
+        if existente is not None:
+            return existente  # reimportação do módulo: reutiliza a métrica já registada
+        _registo[metrica.nome] = metrica
+        return metrica
+
+
+def contador(nome: str, ajuda: str, labels=()) -> Contador:
+    return _registar(Contador(nome, ajuda, labels))
+
+
+def histograma(nome: str, ajuda: str, labels=(), baldes=BALDES_PADRAO) -> Histograma:
+    return _registar(Histograma(nome, ajuda, labels, baldes))
+
+
+def registar_coletor(funcao):
+    """Regista uma função chamada a cada scrape; devolve [(nome, tipo, ajuda, [(labels, valor)])]."""
+    with _registo_lock:
+        if funcao not in _coletores:
+            _coletores.append(funcao)
+    return funcao
+
+
+def _coletar(coletores) -> list:
+    familias = []
+    for coletor in coletores:
+        try:
+            familias.extend(coletor())
+        except Exception as e:
+            logging.error(f"[Metricas] Erro no coletor {getattr(coletor, '__name__', coletor)}: {e}")
+    return familias
+
+
+def instantaneo(ignorar=()) -> dict:
+    """
+    Estado das métricas deste processo, serializável, para definir_remoto() noutro.
+    `ignorar`: coletores cujas famílias o outro processo já exporta por outra via.
+    """
+    with _registo_lock:
+        metricas = list(_registo.values())
+        coletores = [c for c in _coletores if c not in ignorar]
+    familias = [(nome, tipo, ajuda, [(dict(labels), valor) for labels, valor in amostras if valor is not None])
+                for nome, tipo, ajuda, amostras in _coletar(coletores)]
+    return {"metricas": [m.instantaneo() for m in metricas], "familias": familias}
+
+
+def definir_remoto(origem: str, dados):
+    """Guarda o último instantaneo() de outro processo (None esquece-o); exportar() soma-o ao local."""
+    with _registo_lock:
+        if dados is None:
+            _remotos.pop(origem, None)
+        else:
+            _remotos[origem] = dados
+
+
+def _metrica_de(dados: dict, *outras) -> _Metrica:
+    """Métrica avulsa (fora do registo) com a soma das séries dos instantâneos dados."""
+    if dados["tipo"] == Histograma.tipo:
+        metrica = Histograma(dados["nome"], dados["ajuda"], dados["labels"], dados["baldes"])
+    else:
+        metrica = Contador(dados["nome"], dados["ajuda"], dados["labels"])
+    for parte in (dados,) + outras:
+        if parte["tipo"] == metrica.tipo:
+            metrica._somar(parte["series"])
+    return metrica
+
+
+def _somar_familias(familias: list) -> tuple:
+    """Junta famílias com o mesmo nome somando as amostras de labels iguais."""
+    nome, tipo, ajuda, _ = familias[0]
+    somas = {}
+    for _, _, _, amostras in familias:
+        for labels, valor in amostras:
+            if valor is None:
+                continue
+            chave = tuple(labels.items())
+            somas[chave] = somas.get(chave, 0) + valor
+    return nome, tipo, ajuda, [(dict(chave), valor) for chave, valor in somas.items()]
+
+
+def exportar() -> str:
+    """Texto completo para a resposta de /metrics (com as métricas dos processos remotos somadas)."""
+    with _registo_lock:
+        metricas = list(_registo.values())
+        coletores = list(_coletores)
+        remotos = list(_remotos.values())
+
+    metricas_remotas, familias_remotas = {}, {}
+    for dados in remotos:
+        for metrica in dados["metricas"]:
+            metricas_remotas.setdefault(metrica["nome"], []).append(metrica)
+        for familia in dados["familias"]:
+            familias_remotas.setdefault(familia[0], []).append(familia)
+
+    linhas = []
+    for metrica in metricas:
+        outras = metricas_remotas.pop(metrica.nome, None)
+        if outras:
+            metrica = _metrica_de(metrica.instantaneo(), *outras)
+        linhas.extend(metrica.exportar())
+    for outras in metricas_remotas.values():
+        linhas.extend(_metrica_de(*outras).exportar())
+
+    familias = []
+    for familia in _coletar(coletores):
+        outras = familias_remotas.pop(familia[0], None)
+        familias.append(_somar_familias([familia] + outras) if outras else familia)
+    familias.extend(_somar_familias(outras) for outras in familias_remotas.values())
+    for nome, tipo, ajuda, amostras in familias:
+        linhas.append(f"# HELP {nome} {ajuda}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for labels, valor in amostras:
+            if valor is None:
+                continue
+            linhas.append(f"{nome}{_formatar_labels(labels)} {_formatar_valor(valor)}")
+    return "\n".join(linhas) + "\n"
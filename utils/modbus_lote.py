@@ -0,0 +1,119 @@
+# utils/modbus_lote.py
+"""
+Leitura em lote de registradores Modbus com agrupamento de endereços.
+
+Os pedidos (endereço + tipo) são agrupados por tipo e os endereços próximos
+são juntados na menor quantidade de leituras contíguas, respeitando o limite
+do protocolo por leitura e uma tolerância de lacuna (endereços não pedidos
+que podem ser lidos "de passagem" para poupar uma transação).
+
+Se um bloco com lacunas falhar (ex.: endereço inexistente no meio do bloco),
+é repetido sem lacunas, só com os endereços pedidos.
+"""
+from . import modbus_pool
+
+# tipo -> (método do cliente pymodbus, atributo do resultado, máximo por leitura)
+TIPOS = {
+    "holding": ("read_holding_registers", "registers", 125),
+    "input": ("read_input_registers", "registers", 125),
+    "coil": ("read_coils", "bits", 2000),
+    "discrete": ("read_discrete_inputs", "bits", 2000),
+}
+TOLERANCIA_LACUNA_PADRAO = 8   # Endereços não pedidos admitidos entre dois pedidos do mesmo bloco
+MAX_ITENS_POR_PEDIDO = 5000
+ENDERECO_MAXIMO = 65535
+
+
+def normalizar_pedidos(itens) -> list[tuple[str, int]]:
+    """
+    Converte a lista recebida pela API em [(tipo, endereço)].
+    Aceita inteiros (holding) ou {"address": n, "type": "holding|input|coil|discrete"}.
+    Lança ValueError para itens inválidos.
+    """
+    if not isinstance(itens, list) or not itens:
+        raise ValueError("Informe uma lista de endereços.")
+    if len(itens) > MAX_ITENS_POR_PEDIDO:
+        raise ValueError(f"No máximo {MAX_ITENS_POR_PEDIDO} endereços por pedido.")
+
+    pedidos = []
+    for item in itens:
+        if isinstance(item, dict):
+            endereco, tipo = item.get("address"), str(item.get("type", "holding")).lower()
+        else:
+            endereco, tipo = item, "holding"
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de registrador inválido: {tipo}")
+        try:
+            endereco = int(endereco)
+        except (TypeError, ValueError):
+            raise ValueError(f"Endereço inválido: {endereco}")
+        if not 0 <= endereco <= ENDERECO_MAXIMO:
+            raise ValueError(f"Endereço fora do intervalo: {endereco}")
+        pedidos.append((tipo, endereco))
+    return pedidos
+
+
+def planear_leituras(pedidos, tolerancia: int = TOLERANCIA_LACUNA_PADRAO) -> list[tuple[str, int, int]]:
+    """Agrupa os pedidos em leituras contíguas [(tipo, início, quantidade)]."""
+    por_tipo = {}
+    for tipo, endereco in pedidos:
+        por_tipo.setdefault(tipo, set()).add(endereco)
+
+    blocos = []
+    for tipo in sorted(por_tipo):
+        limite = TIPOS[tipo][2]
+        inicio = fim = None
+        for endereco in sorted(por_tipo[tipo]):
+            if inicio is not None and endereco - fim - 1 <= tolerancia and endereco - inicio < limite:
+                fim = endereco
+                continue
+            if inicio is not None:
+                blocos.append((tipo, inicio, fim - inicio + 1))
+            inicio = fim = endereco
+        if inicio is not None:
+            blocos.append((tipo, inicio, fim - inicio + 1))
+    return blocos
+
+
+def _ler_bloco(cliente, tipo, inicio, quantidade, unidade):
+    metodo, atributo, _ = TIPOS[tipo]
+    # ModbusTcpClient em pymodbus 3.x: count por nome e o escravo em "slave" ("unit" era do 2.x)
+    resultado = getattr(cliente, metodo)(inicio, count=quantidade, slave=unidade)
+    if resultado.isError():
+        return None, f"Erro Modbus ao ler {tipo} {inicio}..{inicio + quantidade - 1}: {resultado}"
+    lidos = list(getattr(resultado, atributo))
+    if len(lidos) < quantidade:
+        return None, f"Resposta incompleta ao ler {tipo} {inicio}..{inicio + quantidade - 1}"
+    # Bits vêm arredondados para múltiplos de 8; corta ao pedido
+    return lidos[:quantidade], None
+
+
+def ler_lote(ip: str, pedidos, tolerancia: int = TOLERANCIA_LACUNA_PADRAO, unidade: int = 1) -> dict:
+    """
+    Lê todos os pedidos numa única transação do pool (o CLP fica reservado durante o lote).
+    Retorna {"valores": {(tipo, endereço): valor}, "erros": {(tipo, endereço): msg}, "transacoes": n}.
+    """
+    pedidos_por_tipo = {}
+    for tipo, endereco in pedidos:
+        pedidos_por_tipo.setdefault(tipo, set()).add(endereco)
+
+    def executar(cliente):
+        valores, erros, transacoes = {}, {}, 0
+        pendentes = [(bloco, True) for bloco in planear_leituras(pedidos, tolerancia)]
+        while pendentes:
+            (tipo, inicio, quantidade), pode_dividir = pendentes.pop(0)
+            pedidos_bloco = sorted(e for e in pedidos_por_tipo[tipo] if inicio <= e < inicio + quantidade)
+            lidos, erro = _ler_bloco(cliente, tipo, inicio, quantidade, unidade)
+            transacoes += 1
+            if erro and pode_dividir and len(pedidos_bloco) < quantidade:
+                # O bloco tinha lacunas: repete só com os endereços pedidos
+                pendentes[:0] = [(b, False) for b in planear_leituras([(tipo, e) for e in pedidos_bloco], 0)]
+                continue
+            for endereco in pedidos_bloco:
+                if erro:
+                    erros[(tipo, endereco)] = erro
+                else:
+                    valores[(tipo, endereco)] = lidos[endereco - inicio]
+        return {"valores": valores, "erros": erros, "transacoes": transacoes}
+
+    return modbus_pool.pool.executar(ip, executar)
@@ -0,0 +1,330 @@
+# utils/modbus_pool.py
+"""
+Pool de conexões Modbus TCP persistentes, uma entrada por CLP.
+
+- Número limitado de conexões por CLP; cada transação usa uma conexão em
+  exclusivo (com MAX_CONEXOES_POR_CLP = 1 as transações de um CLP são
+  serializadas, mesmo com várias abas do navegador a ler em paralelo).
+- Conexões que falham são descartadas e reabertas na transação seguinte;
+  se a reabertura falhar, as tentativas seguintes esperam um backoff
+  exponencial (BACKOFF_INICIAL .. BACKOFF_MAXIMO).
+- Conexões ociosas há mais de VERIFICAR_APOS_OCIOSO segundos são verificadas
+  antes de serem usadas, e as ociosas há mais de TEMPO_OCIOSO_MAXIMO são
+  fechadas por uma thread de limpeza (o CLP continua registado e a conexão é
+  reaberta quando for preciso).
+"""
+import logging
+import time
+from contextlib import contextmanager
+from threading import Condition, Event, Lock, Thread
+
+from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ConnectionException, ModbusIOException
+
+from utils import metricas
+
+# --- Configurações do Módulo ---
+MAX_CONEXOES_POR_CLP = 1
+TIMEOUT_AQUISICAO = 5.0       # Segundos à espera de uma conexão livre
+BACKOFF_INICIAL = 0.5
+BACKOFF_MAXIMO = 30.0
+VERIFICAR_APOS_OCIOSO = 10.0  # Conexões paradas há mais tempo são verificadas antes do uso
+TEMPO_OCIOSO_MAXIMO = 120.0   # Conexões paradas há mais tempo são fechadas
+INTERVALO_LIMPEZA = 10.0
+
+# Erros que indicam uma conexão inutilizável (a conexão é descartada)
+ERROS_CONEXAO = (ConnectionException, ModbusIOException, OSError)
+
+_latencia_transacao = metricas.histograma(
+    "clp_modbus_transacao_segundos", "Duração das transações Modbus por CLP.", ("clp",))
+_erros_transacao = metricas.contador(
+    "clp_modbus_erros_total", "Falhas de comunicação Modbus por CLP e tipo.", ("clp", "tipo"))
+
+
+class ConexaoIndisponivel(Exception):
+    """O CLP não está conectado, está em backoff ou todas as conexões estão ocupadas."""
+
+
+class _Conexao:
+    __slots__ = ("cliente", "ultimo_uso")
+
+    def __init__(self, cliente, agora):
+        self.cliente = cliente
+        self.ultimo_uso = agora
+
+
+class _Dispositivo:
+    def __init__(self, ip, porta, timeout, max_conexoes):
+        self.ip = ip
+        self.porta = porta
+        self.timeout = timeout
+        self.max_conexoes = max_conexoes
+        self.cond = Condition()
+        self.livres = []          # _Conexao ociosas (a usada mais recentemente no fim)
+        self.total = 0            # conexões abertas (livres + em uso) ou a abrir
+        self.backoff = 0.0
+        self.proxima_tentativa = 0.0
+        self.ultimo_erro = None
+        self.removido = False
+
+
+def _fechar(cliente):
+    try:
+        cliente.close()
+    except Exception:
+        pass
+
+
+class PoolModbus:
+    """Gere as conexões Modbus TCP de todos os CLPs conectados."""
+
+    def __init__(self, max_conexoes: int = MAX_CONEXOES_POR_CLP, tempo_ocioso: float = TEMPO_OCIOSO_MAXIMO,
+                 fabrica=ModbusTcpClient, relogio=time.monotonic):
+        self.max_conexoes = max_conexoes
+        self.tempo_ocioso = tempo_ocioso
+        self._fabrica = fabrica
+        self._relogio = relogio
+        self._dispositivos = {}
+        self._lock = Lock()
+        self._contadores = {"transacoes": 0, "conexoes_abertas": 0, "falhas_conexao": 0,
+                            "descartadas": 0, "fechadas_ociosas": 0}
+        self._thread_limpeza = None
+        self._parar_evt = Event()
+
+    def _contar(self, chave, n=1):
+        with self._lock:
+            self._contadores[chave] += n
+
+    # --- Registo dos CLPs ---
+
+    def registrar(self, ip: str, porta: int = 502, timeout: float = 3.0) -> bool:
+        """Regista o CLP e abre a primeira conexão. Se falhar, lança ConexaoIndisponivel e o CLP não fica registado."""
+        dispositivo = _Dispositivo(ip, int(porta), timeout, self.max_conexoes)
+        with self._lock:
+            anterior = self._dispositivos.get(ip)
+            self._dispositivos[ip] = dispositivo
+        if anterior is not None:
+            self._encerrar(anterior)
+        self._iniciar_limpeza()
+
+        try:
+            with self.transacao(ip):
+                pass
+            return True
+        except ConexaoIndisponivel:
+            self.remover(ip)
+            raise
+
+    def remover(self, ip: str) -> bool:
+        """Fecha as conexões do CLP e remove-o do pool."""
+        with self._lock:
+            dispositivo = self._dispositivos.pop(ip, None)
+        if dispositivo is None:
+            return False
+        self._encerrar(dispositivo)
+        return True
+
+    def _encerrar(self, d: _Dispositivo):
+        with d.cond:
+            d.removido = True
+            livres, d.livres = d.livres, []
+            d.total -= len(livres)
+            d.cond.notify_all()
+        for conexao in livres:
+            _fechar(conexao.cliente)
+
+    def conectado(self, ip: str) -> bool:
+        with self._lock:
+            return ip in self._dispositivos
+
+    # --- Transações ---
+
+    @contextmanager
+    def transacao(self, ip: str, timeout: float = TIMEOUT_AQUISICAO):
+        """Empresta em exclusivo um cliente conectado ao CLP (`with pool.transacao(ip) as cliente:`)."""
+        with self._lock:
+            dispositivo = self._dispositivos.get(ip)
+        if dispositivo is None:
+            raise ConexaoIndisponivel(f"CLP {ip} não conectado")
+
+        try:
+            conexao = self._adquirir(dispositivo, timeout)
+        except ConexaoIndisponivel:
+            _erros_transacao.inc(clp=ip, tipo="indisponivel")
+            raise
+        inicio = time.perf_counter()
+        try:
+            yield conexao.cliente
+        except ERROS_CONEXAO:
+            self._descartar(dispositivo, conexao)
+            _erros_transacao.inc(clp=ip, tipo="comunicacao")
+            raise
+        except BaseException:
+            self._devolver(dispositivo, conexao)
+            raise
+        else:
+            self._devolver(dispositivo, conexao)
+            self._contar("transacoes")
+            _latencia_transacao.observar(time.perf_counter() - inicio, clp=ip)
+
+    def executar(self, ip: str, operacao, tentativas: int = 2):
+        """
+        Executa `operacao(cliente)` numa conexão do pool. Se a conexão falhar, é
+        descartada e a operação repetida numa conexão nova (até `tentativas` vezes).
+        """
+        ultimo_erro = None
+        for _ in range(tentativas):
+            try:
+                with self.transacao(ip) as cliente:
+                    resultado = operacao(cliente)
+                    # Algumas versões do pymodbus devolvem o erro de E/S em vez de o lançar
+                    if isinstance(resultado, ModbusIOException):
+                        raise resultado
+                    return resultado
+            except ERROS_CONEXAO as e:
+                ultimo_erro = e
+        raise ConexaoIndisponivel(f"Falha de comunicação com o CLP {ip}: {ultimo_erro}")
+
+    def _adquirir(self, d: _Dispositivo, timeout: float) -> _Conexao:
+        limite = self._relogio() + timeout
+        conexao = None
+        with d.cond:
+            while True:
+                if d.removido:
+                    raise ConexaoIndisponivel(f"CLP {d.ip} não conectado")
+                if d.livres:
+                    conexao = d.livres.pop()
+                    break
+                if d.total < d.max_conexoes:
+                    espera = d.proxima_tentativa - self._relogio()
+                    if espera > 0:
+                        raise ConexaoIndisponivel(
+                            f"CLP {d.ip} indisponível ({d.ultimo_erro}); nova tentativa em {espera:.1f}s")
+                    d.total += 1  # reserva a vaga; a conexão é aberta fora do lock
+                    break
+                restante = limite - self._relogio()
+                if restante <= 0:
+                    raise ConexaoIndisponivel(f"Todas as conexões ao CLP {d.ip} estão ocupadas")
+                d.cond.wait(restante)
+
+        if conexao is None:
+            return self._abrir(d)
+        if self._relogio() - conexao.ultimo_uso > VERIFICAR_APOS_OCIOSO and not conexao.cliente.is_socket_open():
+            _fechar(conexao.cliente)
+            self._contar("descartadas")
+            return self._abrir(d)
+        return conexao
+
+    def _abrir(self, d: _Dispositivo) -> _Conexao:
+        """Abre uma conexão na vaga já reservada em `d.total`; em caso de falha, liberta-a e aplica o backoff."""
+        cliente = None
+        try:
+            cliente = self._fabrica(host=d.ip, port=d.porta, timeout=d.timeout)
+            if not cliente.connect():
+                raise ConnectionException(f"sem resposta em {d.ip}:{d.porta}")
+        except Exception as e:
+            if cliente is not None:
+                _fechar(cliente)
+            with d.cond:
+                d.total -= 1
+                d.backoff = min(max(d.backoff * 2, BACKOFF_INICIAL), BACKOFF_MAXIMO)
+                d.proxima_tentativa = self._relogio() + d.backoff
+                d.ultimo_erro = str(e)
+                d.cond.notify()
+            self._contar("falhas_conexao")
+            raise ConexaoIndisponivel(f"Falha ao conectar a {d.ip}:{d.porta}: {e}") from e
+
+        with d.cond:
+            d.backoff = 0.0
+            d.proxima_tentativa = 0.0
+            d.ultimo_erro = None
+        self._contar("conexoes_abertas")
+        return _Conexao(cliente, self._relogio())
+
+    def _devolver(self, d: _Dispositivo, conexao: _Conexao):
+        conexao.ultimo_uso = self._relogio()
+        with d.cond:
+            if d.removido:
+                d.total -= 1
+            else:
+                d.livres.append(conexao)
+                conexao = None
+            d.cond.notify()
+        if conexao is not None:
+            _fechar(conexao.cliente)
+
+    def _descartar(self, d: _Dispositivo, conexao: _Conexao):
+        _fechar(conexao.cliente)
+        with d.cond:
+            d.total -= 1
+            d.cond.notify()
+        self._contar("descartadas")
+
+    # --- Limpeza das conexões ociosas ---
+
+    def _iniciar_limpeza(self):
+        with self._lock:
+            if self._thread_limpeza and self._thread_limpeza.is_alive():
+                return
+            self._parar_evt.clear()
+            self._thread_limpeza = Thread(target=self._limpeza_loop, name="ModbusPoolLimpeza", daemon=True)
+            self._thread_limpeza.start()
+
+    def _limpeza_loop(self):
+        while not self._parar_evt.wait(INTERVALO_LIMPEZA):
+            try:
+                self.fechar_ociosas()
+            except Exception as e:
+                logging.error(f"[ModbusPool] Erro na limpeza de conexões ociosas: {e}")
+
+    def fechar_ociosas(self) -> int:
+        """Fecha as conexões livres paradas há mais de `tempo_ocioso` segundos."""
+        with self._lock:
+            dispositivos = list(self._dispositivos.values())
+        agora = self._relogio()
+        fechadas = []
+        for d in dispositivos:
+            with d.cond:
+                manter = [c for c in d.livres if agora - c.ultimo_uso <= self.tempo_ocioso]
+                if len(manter) != len(d.livres):
+                    fechadas.extend(c for c in d.livres if agora - c.ultimo_uso > self.tempo_ocioso)
+                    d.total -= len(d.livres) - len(manter)
+                    d.livres = manter
+        for conexao in fechadas:
+            _fechar(conexao.cliente)
+        if fechadas:
+            self._contar("fechadas_ociosas", len(fechadas))
+        return len(fechadas)
+
+    def fechar_todas(self):
+        """Fecha todas as conexões e para a thread de limpeza."""
+        self._parar_evt.set()
+        with self._lock:
+            ips = list(self._dispositivos)
+        for ip in ips:
+            self.remover(ip)
+
+    # --- Estado ---
+
+    def estatisticas(self) -> dict:
+        """Contadores globais e, por CLP, conexões abertas/livres e estado do backoff."""
+        with self._lock:
+            resultado = dict(self._contadores)
+            dispositivos = list(self._dispositivos.values())
+        agora = self._relogio()
+        por_clp = {}
+        for d in dispositivos:
+            with d.cond:
+                por_clp[d.ip] = {
+                    "porta": d.porta,
+                    "conexoes": d.total,
+                    "livres": len(d.livres),
+                    "backoff_s": max(0.0, d.proxima_tentativa - agora),
+                    "ultimo_erro": d.ultimo_erro,
+                }
+        resultado["clps"] = por_clp
+        return resultado
+
+
+# Instância única usada pela aplicação
+pool = PoolModbus()
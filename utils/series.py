@@ -0,0 +1,381 @@
+# utils/series.py
+"""
+Séries temporais dos registradores, em memória, com redução de resolução.
+
+Por (CLP, endereço) guarda-se:
+- um anel com as amostras brutas mais recentes (array('d') de instantes e
+  array('f') de valores, sem listas nem dicionários por amostra);
+- um anel por nível de resolução (NIVEIS, ex.: 10 s, 1 min, 10 min) com
+  min/max/soma/contagem por balde, atualizado a cada amostra em O(1).
+
+Consultas de intervalo escolhem o nível mais grosseiro que ainda respeita o
+passo pedido e leem só os baldes do intervalo (endereçados por índice), sem
+percorrer as amostras brutas.
+
+Periodicamente o conteúdo é gravado num segmento binário (cabeçalho JSON +
+conteúdo dos arrays, alinhado a 8 bytes). Ao recarregar, o segmento é aberto
+com mmap e cada array é copiado de uma vez a partir da memória mapeada.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from threading import Event, Lock, Thread
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAMINHO_SEGMENTO = os.path.join(BASE_DIR, "logs", "series.seg")
+
+CAPACIDADE_BRUTA = 600                          # Amostras brutas por série (10 min a 1 Hz)
+NIVEIS = ((10, 720), (60, 1440), (600, 1008))   # (resolução em s, baldes guardados): 2 h, 24 h, 7 dias
+INTERVALO_SEGMENTO = 60.0                       # Segundos entre gravações do segmento
+MAX_PONTOS = 5000                               # Pontos devolvidos no máximo por consulta
+
+_MAGIC = b"CLPSERIE1"
+_CABECALHO = struct.Struct("<I")
+
+
+def _zeros(tipo: str, n: int) -> array:
+    return array(tipo, bytes(array(tipo).itemsize * n))
+
+
+class _Anel:
+    """Amostras brutas num buffer circular (`cabeca` = próxima posição de escrita)."""
+    __slots__ = ("t", "v", "cabeca", "n")
+
+    def __init__(self, capacidade: int):
+        self.t = _zeros("d", capacidade)
+        self.v = _zeros("f", capacidade)
+        self.cabeca = 0
+        self.n = 0
+
+    def arrays(self):
+        return [self.t, self.v]
+
+    def adicionar(self, t: float, v: float):
+        capacidade = len(self.t)
+        self.t[self.cabeca] = t
+        self.v[self.cabeca] = v
+        self.cabeca = (self.cabeca + 1) % capacidade
+        if self.n < capacidade:
+            self.n += 1
+
+    def _posicao(self, i: int) -> int:
+        return (self.cabeca - self.n + i) % len(self.t)
+
+    def ultimo_instante(self):
+        return self.t[self._posicao(self.n - 1)] if self.n else None
+
+    def mais_antigo(self):
+        return self.t[self._posicao(0)] if self.n else None
+
+    def intervalo(self, de: float, ate: float):
+        """Gera (t, v) com de <= t <= ate; o início é encontrado por busca binária."""
+        baixo, alto = 0, self.n
+        while baixo < alto:
+            meio = (baixo + alto) // 2
+            if self.t[self._posicao(meio)] < de:
+                baixo = meio + 1
+            else:
+                alto = meio
+        for i in range(baixo, self.n):
+            p = self._posicao(i)
+            t = self.t[p]
+            if t > ate:
+                return
+            yield t, self.v[p]
+
+
+class _Nivel:
+    """Baldes min/max/soma/contagem de `resolucao` segundos; o slot de um balde é balde % capacidade."""
+    __slots__ = ("resolucao", "balde", "minimo", "maximo", "soma", "contagem")
+
+    def __init__(self, resolucao: float, capacidade: int):
+        self.resolucao = resolucao
+        self.balde = array("q", [-1]) * capacidade
+        self.minimo = _zeros("f", capacidade)
+        self.maximo = _zeros("f", capacidade)
+        self.soma = _zeros("d", capacidade)
+        self.contagem = _zeros("I", capacidade)
+
+    def arrays(self):
+        return [self.balde, self.minimo, self.maximo, self.soma, self.contagem]
+
+    def adicionar(self, t: float, v: float):
+        b = int(t // self.resolucao)
+        s = b % len(self.balde)
+        if self.balde[s] != b:
+            self.balde[s] = b
+            self.minimo[s] = self.maximo[s] = v
+            self.soma[s] = v
+            self.contagem[s] = 1
+        else:
+            if v < self.minimo[s]:
+                self.minimo[s] = v
+            if v > self.maximo[s]:
+                self.maximo[s] = v
+            self.soma[s] += v
+            self.contagem[s] += 1
+
+    def cobre(self, de: float, agora: float) -> bool:
+        """True se `de` ainda está dentro da retenção deste nível."""
+        return de >= agora - self.resolucao * len(self.balde)
+
+    def intervalo(self, de: float, ate: float):
+        """Gera (início, min, max, soma, contagem) dos baldes existentes entre `de` e `ate`."""
+        capacidade = len(self.balde)
+        ultimo = int(ate // self.resolucao)
+        primeiro = max(int(de // self.resolucao), ultimo - capacidade + 1)
+        for b in range(primeiro, ultimo + 1):
+            s = b % capacidade
+            if self.balde[s] == b:
+                yield b * self.resolucao, self.minimo[s], self.maximo[s], self.soma[s], self.contagem[s]
+
+
+class _Serie:
+    __slots__ = ("bruto", "niveis")
+
+    def __init__(self, capacidade_bruta, niveis):
+        self.bruto = _Anel(capacidade_bruta)
+        self.niveis = [_Nivel(res, cap) for res, cap in niveis]
+
+    def arrays(self):
+        resultado = self.bruto.arrays()
+        for nivel in self.niveis:
+            resultado.extend(nivel.arrays())
+        return resultado
+
+    def adicionar(self, t: float, v: float):
+        ultimo = self.bruto.ultimo_instante()
+        if ultimo is not None and t < ultimo:
+            return  # amostra fora de ordem: descartada
+        self.bruto.adicionar(t, v)
+        for nivel in self.niveis:
+            nivel.adicionar(t, v)
+
+
+def chave_endereco(tipo: str, endereco: int) -> str:
+    """Chave de série de um registrador, ex.: "holding:10"."""
+    return f"{tipo}:{int(endereco)}"
+
+
+class ArmazemSeries:
+    """Séries de todos os CLPs, protegidas por um único Lock (as operações são O(1) ou O(baldes))."""
+
+    def __init__(self, caminho: str = CAMINHO_SEGMENTO, capacidade_bruta: int = CAPACIDADE_BRUTA, niveis=NIVEIS):
+        self.caminho = caminho
+        self.capacidade_bruta = capacidade_bruta
+        self.niveis = tuple((float(r), int(c)) for r, c in niveis)
+        self._series = {}   # (ip, chave) -> _Serie
+        self._lock = Lock()
+        self._parar_evt = Event()
+        self._thread = None
+
+    def _serie(self, ip: str, chave: str) -> _Serie:
+        serie = self._series.get((ip, chave))
+        if serie is None:
+            serie = self._series[(ip, chave)] = _Serie(self.capacidade_bruta, self.niveis)
+        return serie
+
+    # --- Escrita ---
+
+    def adicionar(self, ip: str, chave: str, t: float, valor):
+        with self._lock:
+            self._serie(ip, chave).adicionar(t, float(valor))
+
+    def adicionar_amostras(self, ip: str, instante: float, valores: dict):
+        """Callback do motor de polling: {(tipo, endereço): valor} lidos no mesmo instante."""
+        with self._lock:
+            for (tipo, endereco), valor in valores.items():
+                self._serie(ip, chave_endereco(tipo, endereco)).adicionar(instante, float(valor))
+
+    # --- Consulta ---
+
+    def chaves(self, ip: str) -> list[str]:
+        with self._lock:
+            return sorted(chave for (i, chave) in self._series if i == ip)
+
+    def consultar(self, ip: str, chave: str, de: float, ate: float, passo: float) -> dict:
+        """
+        Pontos {"t", "min", "max", "avg", "n"} alinhados a múltiplos de `passo` entre `de` e `ate`.
+        Usa o nível mais grosseiro com resolução <= passo que ainda cubra `de`; as amostras
+        brutas só são lidas quando o passo é mais fino do que o primeiro nível.
+        """
+        passo = max(float(passo), 1e-3)
+        agora = time.time()
+        with self._lock:
+            serie = self._series.get((ip, chave))
+            if serie is None:
+                return {"resolucao": None, "pontos": []}
+
+            candidatos = [n for n in serie.niveis if n.resolucao <= passo]
+            fonte = None
+            for nivel in reversed(candidatos):      # do mais grosseiro para o mais fino
+                if nivel.cobre(de, agora):
+                    fonte = nivel
+                    break
+            if fonte is None and candidatos:
+                fonte = candidatos[-1]
+            if fonte is None:
+                # Passo mais fino do que o primeiro nível: amostras brutas, se ainda cobrirem o início
+                mais_antigo = serie.bruto.mais_antigo()
+                if mais_antigo is not None and mais_antigo <= de or not serie.niveis:
+                    fonte = serie.bruto
+                else:
+                    fonte = serie.niveis[0]
+
+            if fonte is serie.bruto:
+                resolucao = 0
+                origem = ((t, v, v, v, 1) for t, v in serie.bruto.intervalo(de, ate))
+            else:
+                resolucao = fonte.resolucao
+                origem = fonte.intervalo(de, ate)
+
+            pontos = []
+            atual = None
+            for t, mn, mx, soma, n in origem:
+                k = int(t // passo)
+                if atual is None or atual[0] != k:
+                    if len(pontos) >= MAX_PONTOS:
+                        break
+                    atual = [k, mn, mx, soma, n]
+                    pontos.append(atual)
+                else:
+                    atual[1] = min(atual[1], mn)
+                    atual[2] = max(atual[2], mx)
+                    atual[3] += soma
+                    atual[4] += n
+
+        return {
+            "resolucao": resolucao,
+            "pontos": [{"t": k * passo, "min": mn, "max": mx, "avg": soma / n, "n": n}
+                       for k, mn, mx, soma, n in pontos],
+        }
+
+    # --- Segmentos binários ---
+
+    def gravar_segmento(self) -> int:
+        """Grava todas as séries num segmento binário (substituição atómica). Retorna o nº de séries."""
+        with self._lock:
+            entradas, blocos, offset = [], [], 0
+            for (ip, chave), serie in self._series.items():
+                descritores = []
+                for arr in serie.arrays():
+                    dados = arr.tobytes()
+                    descritores.append([arr.typecode, offset, len(dados)])
+                    blocos.append(dados)
+                    offset += len(dados)
+                    resto = -offset % 8
+                    if resto:
+                        blocos.append(bytes(resto))
+                        offset += resto
+                entradas.append({"ip": ip, "chave": chave, "cabeca": serie.bruto.cabeca,
+                                 "n": serie.bruto.n, "arrays": descritores})
+
+        cabecalho = json.dumps({
+            "byteorder": sys.byteorder,
+            "capacidade_bruta": self.capacidade_bruta,
+            "niveis": self.niveis,
+            "series": entradas,
+        }).encode("utf-8")
+        inicio_dados = len(_MAGIC) + _CABECALHO.size + len(cabecalho)
+        preenchimento = bytes(-inicio_dados % 8)
+
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        temporario = f"{self.caminho}.tmp"
+        with open(temporario, "wb") as f:
+            f.write(_MAGIC)
+            f.write(_CABECALHO.pack(len(cabecalho)))
+            f.write(cabecalho)
+            f.write(preenchimento)
+            for bloco in blocos:
+                f.write(bloco)
+        os.replace(temporario, self.caminho)
+        return len(entradas)
+
+    def carregar_segmento(self) -> int:
+        """Recarrega as séries do segmento gravado (se existir e for compatível). Retorna o nº de séries."""
+        try:
+            f = open(self.caminho, "rb")
+        except FileNotFoundError:
+            return 0
+        with f:
+            if os.fstat(f.fileno()).st_size < len(_MAGIC) + _CABECALHO.size:
+                return 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+                if mapa[:len(_MAGIC)] != _MAGIC:
+                    logging.warning(f"[Series] {self.caminho} não é um segmento válido; ignorado.")
+                    return 0
+                (tamanho,) = _CABECALHO.unpack_from(mapa, len(_MAGIC))
+                inicio = len(_MAGIC) + _CABECALHO.size
+                cabecalho = json.loads(mapa[inicio:inicio + tamanho])
+                if (cabecalho["capacidade_bruta"] != self.capacidade_bruta
+                        or tuple(map(tuple, cabecalho["niveis"])) != self.niveis):
+                    logging.warning("[Series] Segmento gravado com outra configuração de níveis; ignorado.")
+                    return 0
+                inicio_dados = inicio + tamanho
+                inicio_dados += -inicio_dados % 8
+                trocar_bytes = cabecalho["byteorder"] != sys.byteorder
+
+                series = {}
+                with memoryview(mapa) as visao:
+                    for entrada in cabecalho["series"]:
+                        serie = _Serie(self.capacidade_bruta, self.niveis)
+                        for destino, (tipo, offset, nbytes) in zip(serie.arrays(), entrada["arrays"]):
+                            inicio_array = inicio_dados + offset
+                            novo = array(tipo)
+                            novo.frombytes(visao[inicio_array:inicio_array + nbytes])
+                            if trocar_bytes:
+                                novo.byteswap()
+                            destino[:] = novo
+                        serie.bruto.cabeca = entrada["cabeca"]
+                        serie.bruto.n = entrada["n"]
+                        series[(entrada["ip"], entrada["chave"])] = serie
+
+        with self._lock:
+            self._series.update(series)
+        return len(series)
+
+    # --- Gravação periódica ---
+
+    def iniciar_gravacao_periodica(self, intervalo: float = INTERVALO_SEGMENTO):
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar_evt.clear()
+        self._thread = Thread(target=self._gravacao_loop, args=(intervalo,), name="SeriesSegmentos", daemon=True)
+        self._thread.start()
+
+    def parar_gravacao_periodica(self):
+        """Para a thread e grava um último segmento."""
+        self._parar_evt.set()
+        if self._thread:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.gravar_segmento()
+
+    def _gravacao_loop(self, intervalo):
+        while not self._parar_evt.wait(intervalo):
+            try:
+                self.gravar_segmento()
+            except Exception as e:
+                logging.error(f"[Series] Erro ao gravar o segmento: {e}")
+
+
+_armazem = None
+_armazem_lock = Lock()
+
+
+def obter() -> ArmazemSeries:
+    """Armazém da aplicação, criado (e recarregado do último segmento) na primeira utilização."""
+    global _armazem
+    with _armazem_lock:
+        if _armazem is None:
+            _armazem = ArmazemSeries()
+            try:
+                _armazem.carregar_segmento()
+            except Exception as e:
+                logging.error(f"[Series] Erro ao recarregar o segmento: {e}")
+        return _armazem